@@ -1,9 +1,12 @@
 from math import log2
 import scipy.integrate as integrate
+from scipy.sparse import csr_matrix
 import numpy as np
 import abc
 from math import isclose, isinf
 from math import log2
+from typing import Tuple, Sequence
+from functools import lru_cache
 
 
 class BasisFunction(object):
@@ -23,6 +26,10 @@ class BasisFunction(object):
     def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
         pass
 
+    # returns the interval outside of which the basis function is 0; by default no local support is assumed
+    def get_boundaries(self) -> Tuple[float, float]:
+        return -np.inf, np.inf
+
 
 class BSpline(BasisFunction):
     def __init__(self, p: int, index: int, knots: np.array):
@@ -34,8 +41,70 @@ class BSpline(BasisFunction):
         assert(index <= len(knots) - p - 2)
 
     def __call__(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x)
         return self.recursive_eval(x, self.p, self.index)
 
+    # evaluates the spline (or its derivative of the given order) for an array of points with an iterative de Boor
+    # scheme; only points in the support of the spline are processed
+    def evaluate_array(self, x: np.array, derivative: int=0) -> np.array:
+        x = np.asarray(x, dtype=float)
+        result = np.zeros(x.shape)
+        start, end = self.get_boundaries()
+        in_support = np.nonzero((start <= x) & (x < end))
+        if len(in_support[0]) == 0:
+            return result
+        span, span_values = BSpline.get_span_values(x[in_support], self.knots, self.p, derivative)
+        # the values of span s belong to the splines with index s - p, ..., s
+        column = self.index - span + self.p
+        contained = (column >= 0) & (column <= self.p)
+        values = np.zeros(len(span))
+        values[contained] = span_values[np.nonzero(contained)[0], column[contained]]
+        result[in_support] = values
+        return result
+
+    # This method computes for each point in x the knot span s (knots[s] <= x < knots[s+1]) and the values of all
+    # p + 1 splines (with index s - p, ..., s) that are non-zero in this span. If derivative is set the respective
+    # derivative of the splines is returned instead. Points outside of the knot vector get a row of zeros.
+    @staticmethod
+    def get_span_values(x: np.array, knots: np.array, p: int, derivative: int=0) -> Tuple[np.array, np.array]:
+        x = np.asarray(x, dtype=float)
+        knots = np.asarray(knots, dtype=float)
+        span = np.searchsorted(knots, x, side='right') - 1
+        inside = (span >= 0) & (span < len(knots) - 1)
+        span = np.clip(span, 0, len(knots) - 2)
+        values = np.zeros((len(x), p + 1))
+        if derivative > p:
+            return span, values
+        # pad the knots at both ends so that all knots in the neighbourhood of a span exist; the additional knots
+        # only enter splines with indices outside of the knot vector
+        knots = np.concatenate((np.full(p, knots[0]), knots, np.full(p, knots[-1])))
+        s = span + p
+        values[:, 0] = 1.0
+        degree = p - derivative
+        # Cox-de Boor recursion for the non-zero splines of degree q: N_{s-q,q}, ..., N_{s,q}
+        for q in range(1, degree + 1):
+            previous = np.array(values[:, :q])
+            values[:, :q + 1] = 0.0
+            for j in range(q + 1):
+                i = s - q + j
+                if j >= 1:
+                    values[:, j] += (x - knots[i]) / (knots[i + q] - knots[i]) * previous[:, j - 1]
+                if j < q:
+                    values[:, j] += (knots[i + q + 1] - x) / (knots[i + q + 1] - knots[i + 1]) * previous[:, j]
+        # derivative recursion N'_{i,q} = q * (N_{i,q-1} / (t_{i+q} - t_i) - N_{i+1,q-1} / (t_{i+q+1} - t_{i+1}))
+        for q in range(degree + 1, p + 1):
+            previous = np.array(values[:, :q])
+            values[:, :q + 1] = 0.0
+            for j in range(q + 1):
+                i = s - q + j
+                if j >= 1:
+                    values[:, j] += q / (knots[i + q] - knots[i]) * previous[:, j - 1]
+                if j < q:
+                    values[:, j] -= q / (knots[i + q + 1] - knots[i + 1]) * previous[:, j]
+        values[~inside, :] = 0.0
+        return span, values
+
     def recursive_eval(self, x: float, p: int, k: int) -> float:
         if x < self.knots[k] or x > self.knots[k+p+1]:
             return 0.0
@@ -46,6 +115,9 @@ class BSpline(BasisFunction):
             result += (self.knots[k + p + 1] - x) / (self.knots[k + p + 1] - self.knots[k + 1]) * self.recursive_eval(x, p-1, k + 1)
             return result
 
+    def get_boundaries(self) -> Tuple[float, float]:
+        return self.knots[self.index], self.knots[self.index + self.p + 1]
+
     def chi(self, x: float, k: int) -> float:
         if self.knots[k] <= x < self.knots[k+1]:
             return 1.0
@@ -53,9 +125,13 @@ class BSpline(BasisFunction):
             return 0.0
 
     def get_first_derivative(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x, derivative=1)
         return self.get_first_derivative_recursive(x, self.p, self.index)
 
     def get_second_derivative(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x, derivative=2)
         return self.get_second_derivative_recursive(x, self.p, self.index)
 
     def get_first_derivative_recursive(self, x: float, p: int, k: int) -> float:
@@ -89,11 +165,103 @@ class BSpline(BasisFunction):
                 coords *= (right_border - left_border) / 2.0
                 coords += left_border
                 weights = np.array(weightsD) * (right_border - left_border) / 2
-                f_evals = np.array([self(coord) for coord in coords])
+                f_evals = self(coords)
                 result += np.inner(f_evals, weights)
         return result
 
 
+# this function evaluates the basis (derivative=0) or its first or second derivative at an array of points
+def evaluate_basis(basis: BasisFunction, x: Sequence[float], derivative: int=0) -> Sequence[float]:
+    if derivative == 0:
+        return basis(x)
+    if derivative == 1:
+        return basis.get_first_derivative(x)
+    assert derivative == 2
+    return basis.get_second_derivative(x)
+
+
+# this function evaluates the 1D basis functions at the points and returns the sparse (csr) matrix with entry
+# [j, i] = basis_functions[i](points[j]) (or the derivative of the given order). Each basis is only evaluated at the
+# points inside its support (get_boundaries) which are found by a binary search in the sorted points. For bases with a
+# local support of size O(p) this costs O(M * p) instead of O(M * n) for M points and n bases.
+def get_basis_evaluation_matrix(basis_functions: Sequence[BasisFunction], points: Sequence[float], derivative: int=0) -> csr_matrix:
+    points = np.asarray(points, dtype=float)
+    order = np.argsort(points, kind='stable')
+    sorted_points = points[order]
+    rows = [np.zeros(0, dtype=int)]
+    columns = [np.zeros(0, dtype=int)]
+    entries = [np.zeros(0)]
+    for i, basis in enumerate(basis_functions):
+        start, end = basis.get_boundaries()
+        first = np.searchsorted(sorted_points, start, side='left')
+        last = np.searchsorted(sorted_points, end, side='right')
+        if first == last:
+            continue
+        values = np.asarray(evaluate_basis(basis, sorted_points[first:last], derivative), dtype=float)
+        non_zero = np.flatnonzero(values)
+        rows.append(order[first + non_zero])
+        columns.append(np.full(len(non_zero), i))
+        entries.append(values[non_zero])
+    rows, columns, entries = np.concatenate(rows), np.concatenate(columns), np.concatenate(entries)
+    return csr_matrix((entries, (rows, columns)), shape=(len(points), len(basis_functions)))
+
+
+# this function returns the barycentric weights w_j = 1 / prod_{k != j} (x_j - x_k) of the knot set; the weights are
+# cached per knot set as all Lagrange bases of one knot set share them
+def get_barycentric_weights(knots: Sequence[float]) -> np.array:
+    return _get_barycentric_weights(tuple(knots))
+
+
+@lru_cache(maxsize=256)
+def _get_barycentric_weights(knots: Tuple[float, ...]) -> np.array:
+    knots = np.asarray(knots, dtype=float)
+    # the factors are multiplied in the same order as in LagrangeBasis
+    reciprocal_differences = 1.0 / (knots[:, None] - knots[None, :] + np.eye(len(knots)))
+    np.fill_diagonal(reciprocal_differences, 1.0)
+    weights = np.prod(reciprocal_differences, axis=1)
+    weights.flags.writeable = False
+    return weights
+
+
+# this function returns the differentiation matrix D of the knot set, i.e. D[i, j] is the derivative of the j-th
+# Lagrange polynomial at knot i (closed form, see Berrut and Trefethen: Barycentric Lagrange Interpolation)
+def get_lagrange_differentiation_matrix(knots: Sequence[float]) -> np.array:
+    return _get_lagrange_differentiation_matrix(tuple(knots))
+
+
+@lru_cache(maxsize=256)
+def _get_lagrange_differentiation_matrix(knots: Tuple[float, ...]) -> np.array:
+    weights = _get_barycentric_weights(knots)
+    knots = np.asarray(knots, dtype=float)
+    differences = knots[:, None] - knots[None, :]
+    np.fill_diagonal(differences, 1.0)
+    matrix = weights[None, :] / weights[:, None] / differences
+    np.fill_diagonal(matrix, 0.0)
+    np.fill_diagonal(matrix, -np.sum(matrix, axis=1))
+    matrix.flags.writeable = False
+    return matrix
+
+
+# this function evaluates all Lagrange polynomials of the knot set at the points x with the first (modified Lagrange)
+# form of the barycentric formula L_j(x) = w_j * l(x) / (x - x_j) with l(x) = prod_k (x - x_k) and returns the matrix
+# with entry [i, j] = L_j(x_i) (a vector for a scalar x). At a knot the formula is 0 / 0 so these rows are set to the
+# unit vector. Derivatives are obtained by multiplying with the differentiation matrix as the derivative of a Lagrange
+# polynomial is again interpolated exactly by the Lagrange polynomials.
+def get_lagrange_evaluation_matrix(knots: Sequence[float], x: Sequence[float], derivative: int=0) -> np.array:
+    weights = get_barycentric_weights(knots)
+    differences = np.asarray(x, dtype=float)[..., None] - np.asarray(knots, dtype=float)
+    node_polynomial = np.prod(differences, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        matrix = weights * (node_polynomial[..., None] / differences)
+    at_knot = differences == 0
+    rows_at_knot = np.any(at_knot, axis=-1)
+    if np.any(rows_at_knot):
+        matrix[rows_at_knot] = at_knot[rows_at_knot]
+    for _ in range(derivative):
+        matrix = np.dot(matrix, get_lagrange_differentiation_matrix(knots))
+    return matrix
+
+
 class LagrangeBasis(BasisFunction):
     def __init__(self, p: int, index: int, knots: np.array):
         self.p = p
@@ -108,33 +276,35 @@ class LagrangeBasis(BasisFunction):
         #assert(index <= len(knots) - p - 2)
 
     def __call__(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x)
         result = 1
         for i, knot in enumerate(self.knots):
             if self.index != i:
                 result *= (x - self.knots[i])
         return result * self.factor
 
-    def get_first_derivative(self, x: float) -> float:
-        return self.derivative_for_index(x, [self.index])
+    # evaluates the basis (or its derivative) for an array of points using the barycentric evaluation matrix
+    def evaluate_array(self, x: Sequence[float], derivative: int=0) -> Sequence[float]:
+        x = np.asarray(x, dtype=float)
+        points = x.ravel()
+        evaluation_matrix = get_lagrange_evaluation_matrix(self.knots, points, derivative)
+        return self.evaluate_with_matrix(points, evaluation_matrix, derivative).reshape(np.shape(x))
 
-    def derivative_for_index(self, x: float, indexSet: list) -> float:
-        result = 0.0
-        for i, knot in enumerate(self.knots):
-            if i not in indexSet:
-                summation_factor = 1.0
-                for j, knot in enumerate(self.knots):
-                    if j not in indexSet and i != j:
-                        summation_factor *= (x - self.knots[j]) / (self.knots[self.index] - self.knots[j])
-                summation_factor *= 1/(self.knots[self.index] - self.knots[i])
-                result += summation_factor
-        return result
+    # returns the values of this basis at the points x given the evaluation matrix of all Lagrange polynomials of
+    # the knot set at x (or of their derivatives); x can also be a scalar with the values at x as vector
+    def evaluate_with_matrix(self, x: Sequence[float], evaluation_matrix: Sequence[Sequence[float]], derivative: int=0) -> Sequence[float]:
+        return evaluation_matrix[..., self.index]
+
+    def get_first_derivative(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x, derivative=1)
+        return float(self.evaluate_with_matrix(x, get_lagrange_evaluation_matrix(self.knots, x, derivative=1), derivative=1))
 
     def get_second_derivative(self, x: float) -> float:
-        result = 0.0
-        for i, knot in enumerate(self.knots):
-            if self.index != i:
-                result += 1/(self.knots[self.index] - self.knots[i]) * self.derivative_for_index(x, [self.index, i])
-        return result
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x, derivative=2)
+        return float(self.evaluate_with_matrix(x, get_lagrange_evaluation_matrix(self.knots, x, derivative=2), derivative=2))
 
     def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
         result = 0.0
@@ -146,7 +316,7 @@ class LagrangeBasis(BasisFunction):
         coords *= (right_border - left_border) / 2.0
         coords += left_border
         weights = np.array(weightsD) * (right_border - left_border) / 2
-        f_evals = np.array([self(coord) for coord in coords])
+        f_evals = self(coords)
         #print(coordsD, a, b, weights)
         result += np.inner(f_evals, weights)
         return result
@@ -154,22 +324,15 @@ class LagrangeBasis(BasisFunction):
 
 class LagrangeBasisRestricted(LagrangeBasis):
     def __call__(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x)
         if self.point_in_support(x):
             return super().__call__(x)
         else:
             return 0.0
 
-    def get_first_derivative(self, x: float) -> float:
-        if self.point_in_support(x):
-            return super().get_first_derivative(x)
-        else:
-            return 0.0
-
-    def get_second_derivative(self, x: float) -> float:
-        if self.point_in_support(x):
-            return super().get_second_derivative(x)
-        else:
-            return 0.0
+    def evaluate_with_matrix(self, x: Sequence[float], evaluation_matrix: Sequence[Sequence[float]], derivative: int=0) -> Sequence[float]:
+        return np.where(self.point_in_support(x), evaluation_matrix[..., self.index], 0.0)
 
     def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
         result = 0.0
@@ -180,14 +343,14 @@ class LagrangeBasisRestricted(LagrangeBasis):
         coords *= (right_border - left_border) / 2.0
         coords += left_border
         weights = np.array(weightsD) * (right_border - left_border) / 2
-        f_evals = np.array([self(coord) for coord in coords])
+        f_evals = self(coords)
         #print(coordsD, a, b, weights)
         result += np.inner(f_evals, weights)
         return result
 
     def point_in_support(self, x):
         start, end = self.get_boundaries()
-        return start <= x <= end
+        return (start <= x) & (x <= end)
 
     def get_boundaries(self):
         return self.knots[max(0, self.index - 1)], self.knots[min(self.index + 1, len(self.knots) - 1)]
@@ -209,34 +372,47 @@ class LagrangeBasisRestrictedModified(LagrangeBasisRestricted):
         self.is_right_border = isclose(self.knots[self.index + 1], b)
         if self.is_left_border:
             self.basis2 = LagrangeBasis(self.p, 0, self.knots)
-        if self.is_right_border:
+            self.border_factor = self.get_border_factor(self.a, 0)
+        elif self.is_right_border:
             self.basis3 = LagrangeBasis(self.p, len(self.knots) - 1, self.knots)
+            self.border_factor = self.get_border_factor(self.b, len(self.knots) - 1)
+
+    # the modified basis at the border adds a multiple of the outermost Lagrange polynomial such that the second
+    # derivative vanishes at the boundary (for p = 1 the basis is extrapolated linearly)
+    def get_border_factor(self, border: float, border_index: int) -> float:
+        if self.level == 1:
+            return 0.0
+        if self.p > 1:
+            second_derivatives = get_lagrange_evaluation_matrix(self.knots, border, derivative=2)
+            return -second_derivatives[self.index] / second_derivatives[border_index]
+        return 2.0
 
     def __call__(self, x: float) -> float:
+        if np.ndim(x) > 0:
+            return self.evaluate_array(x)
         if self.point_in_support(x):
             if self.level == 1:
                 return 1.0
-            else:
-                result = super().__call__(x)
-
-                if self.is_left_border:
-                    #print(self.spline.get_second_derivative(self.a), self.spline2.get_second_derivative(self.a))
-                    if self.p > 1:
-                        #print(self.get_second_derivative(self.a)/ self.basis2.get_second_derivative(self.a), self.get_second_derivative(self.a), self.basis2.get_second_derivative(self.a))
-                        result -= self.get_second_derivative(self.a)/ self.basis2.get_second_derivative(self.a) * self.basis2(x)
-                    else:
-                        result += 2 * self.basis2(x)
-                elif self.is_right_border:
-                    if self.p > 1:
-                        #print(self.get_second_derivative(self.b), self.basis3.get_second_derivative(self.b))
-                        result -= self.get_second_derivative(self.b)/ self.basis3.get_second_derivative(self.b) * self.basis3(x)
-                    else:
-                        result += 2 * self.basis3(x)
-
-                return result
+            result = LagrangeBasis.__call__(self, x)
+            if self.is_left_border:
+                result += self.border_factor * self.basis2(x)
+            elif self.is_right_border:
+                result += self.border_factor * self.basis3(x)
+            return result
         else:
             return 0.0
 
+    def evaluate_with_matrix(self, x: Sequence[float], evaluation_matrix: Sequence[Sequence[float]], derivative: int=0) -> Sequence[float]:
+        if self.level == 1:
+            result = np.ones(np.shape(x)) if derivative == 0 else np.zeros(np.shape(x))
+        else:
+            result = np.array(evaluation_matrix[..., self.index])
+            if self.is_left_border:
+                result += self.border_factor * evaluation_matrix[..., 0]
+            elif self.is_right_border:
+                result += self.border_factor * evaluation_matrix[..., -1]
+        return np.where(self.point_in_support(x), result, 0.0)
+
 
 class HierarchicalNotAKnotBSpline(BasisFunction):
     def __init__(self, p: int, index: int, level: int, knots: np.array):
@@ -256,6 +432,9 @@ class HierarchicalNotAKnotBSpline(BasisFunction):
     def __call__(self, x: float) -> float:
         return self.spline(x)
 
+    def get_boundaries(self) -> Tuple[float, float]:
+        return self.spline.get_boundaries()
+
     def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
         result = 0.0
         for i in range(self.startIndex, self.endIndex):
@@ -267,7 +446,7 @@ class HierarchicalNotAKnotBSpline(BasisFunction):
                 coords *= (right_border - left_border) / 2.0
                 coords += left_border
                 weights = np.array(weightsD) * (right_border - left_border) / 2
-                f_evals = np.array([self(coord) for coord in coords])
+                f_evals = self(coords)
                 #print(coordsD, a, b, weights)
                 result += np.inner(f_evals, weights)
 
@@ -314,7 +493,7 @@ class HierarchicalNotAKnotBSplineModified(BasisFunction):
     def __call__(self, x: float) -> float:
         if self.level == 1:
             assert(self.index == 1)
-            return 1.0
+            return 1.0 if np.ndim(x) == 0 else np.ones(np.shape(x))
         elif self.level >= 2 and (self.index == 1 or self.index == 2**self.level - 1):
             result = self.spline(x)
             if self.index == 1:
@@ -332,6 +511,16 @@ class HierarchicalNotAKnotBSplineModified(BasisFunction):
         else:
             return self.spline(x)
 
+    def get_boundaries(self) -> Tuple[float, float]:
+        if self.level == 1:
+            return -np.inf, np.inf
+        start, end = self.spline.get_boundaries()
+        if self.level >= 2 and self.index == 1:
+            start = min(start, self.spline2.get_boundaries()[0])
+        elif self.level >= 2 and self.index == 2**self.level - 1:
+            end = max(end, self.spline3.get_boundaries()[1])
+        return start, end
+
     def get_integral(self, a: float, b: float, coordsD: np.array, weightsD: np.array) -> float:
         result = 0.0
         for i in range(self.startIndex, self.endIndex):
@@ -343,14 +532,14 @@ class HierarchicalNotAKnotBSplineModified(BasisFunction):
                 coords *= (right_border - left_border) / 2.0
                 coords += left_border
                 weights = np.array(weightsD) * (right_border - left_border) / 2
-                f_evals = np.array([self(coord) for coord in coords])
+                f_evals = self(coords)
                 result += np.inner(f_evals, weights)
         return result
 
     def get_first_derivative(self, x: float) -> float:
         if self.level == 1:
             assert(self.index == 1)
-            return 0
+            return 0 if np.ndim(x) == 0 else np.zeros(np.shape(x))
         elif self.level >= 2 and (self.index == 1 or self.index == 2**self.level - 1):
             derivative = self.spline.get_first_derivative(x)
             if self.index == 1:
@@ -370,7 +559,7 @@ class HierarchicalNotAKnotBSplineModified(BasisFunction):
     def get_second_derivative(self, x: float) -> float:
         if self.level == 1:
             assert(self.index == 1)
-            return 0
+            return 0 if np.ndim(x) == 0 else np.zeros(np.shape(x))
         elif self.level >= 2 and (self.index == 1 or self.index == 2**self.level - 1):
             derivative = self.spline.get_second_derivative(x)
             if self.index == 1:
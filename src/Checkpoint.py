@@ -0,0 +1,329 @@
+import gc
+import importlib
+import json
+import os
+import pickle
+import zipfile
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+from Function import Function
+from ComponentGridInfo import ComponentGridInfo
+
+
+class Checkpoint(object):
+    """This class implements the checkpoint format of combi objects (StandardCombi and its child classes). The bulk data
+    is stored in columnar form in one (uncompressed) npz file:
+
+    - metadata: json with the configuration of the combi object (class, domain, levels, grid, operation, functions)
+    - scheme: level vectors and coefficients of the component grids
+    - function caches: coordinates and values of the cached function evaluations (f_dict and old_f_dict)
+    - refinement: one array per attribute (starts, ends, levels, errors, benefits, volumes, ...) of the refinement objects
+    - state: the remaining object graph (without scheme, function caches and refinement columns) as pickle (dill if
+      available); transient caches (e.g. interpolators, evaluation plans) are not stored (see __getstate__)
+
+    A Checkpoint object loads the arrays lazily, i.e. only the arrays that are accessed are read from the file. restore
+    creates the combi object again.
+
+    """
+
+    format_version = 2
+
+    # attributes of the refinement objects that are stored as columns (column name, attribute names)
+    refinement_columns = [("starts", ["start"]), ("ends", ["end"]), ("levels", ["levelvec", "levels"]),
+                          ("coarsening", ["coarseningValue", "coarsening_level"]), ("errors", ["error"]),
+                          ("benefits", ["benefit"]), ("volumes", ["volume"]), ("values", ["value"]),
+                          ("evaluations", ["evaluations"])]
+
+    def __init__(self, filename: str):
+        """Opens a checkpoint that was written with save. The arrays are only read when they are accessed.
+
+        :param filename: Specifies filename of the checkpoint.
+        """
+        self.filename = filename
+        self.data = np.load(filename, allow_pickle=False)
+        self.metadata = json.loads(self.data["metadata"].tobytes().decode())
+        if self.metadata["format_version"] > self.format_version:
+            self.data.close()
+            raise ValueError("Checkpoint " + filename + " was written with the newer format version " + str(self.metadata["format_version"]))
+
+    @staticmethod
+    def is_checkpoint(filename: str) -> bool:
+        """Checks whether the file is a checkpoint (and not e.g. a pickled object of an older version).
+
+        :param filename: Specifies filename.
+        :return: Bool
+        """
+        if not zipfile.is_zipfile(filename):
+            return False
+        with zipfile.ZipFile(filename) as archive:
+            return "metadata.npy" in archive.namelist()
+
+    @staticmethod
+    def get_functions(combi) -> Dict[str, Function]:
+        """Returns the functions (with caches) of the operation of the combi object.
+
+        :param combi: Combi object.
+        :return: Dictionary from the attribute name in the operation to the function.
+        """
+        operation = getattr(combi, "operation", None)
+        if operation is None:
+            return {}
+        return {name: value for name, value in vars(operation).items() if isinstance(value, Function)}
+
+    @staticmethod
+    def get_refinement_containers(combi) -> List:
+        """Returns the refinement containers of the combi object (one per dimension for the single dimension scheme).
+
+        :param combi: Combi object.
+        :return: List of refinement containers.
+        """
+        refinement = getattr(combi, "refinement", None)
+        if refinement is None:
+            return []
+        if hasattr(refinement, "refinementContainers"):
+            return list(refinement.refinementContainers)
+        return [refinement]
+
+    @staticmethod
+    def _get_column(values: Sequence) -> np.ndarray:
+        # converts attribute values into a float array; missing values (None) are stored as nan
+        shape = next((np.shape(value) for value in values if value is not None), None)
+        if shape is None:
+            return None
+        try:
+            return np.array([np.full(shape, np.nan) if value is None else np.asarray(value, dtype=float) for value in values], dtype=float).reshape((len(values),) + shape)
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def _get_type(value) -> list:
+        # returns a json description of the type of an attribute value that is needed to recreate it from a column
+        # (None if the value cannot be stored in a column)
+        if type(value) in (float, int, bool):
+            return [type(value).__name__]
+        if isinstance(value, (np.ndarray, np.generic)):
+            return ["numpy", value.dtype.str] if value.dtype.kind in "biuf" else None
+        if type(value) in (list, tuple):
+            element_types = [Checkpoint._get_type(element) for element in value]
+            if element_types and element_types.count(element_types[0]) == len(element_types) and element_types[0] is not None:
+                return [type(value).__name__, element_types[0]]
+        return None
+
+    @staticmethod
+    def _get_value(row, value_type: list):
+        # recreates an attribute value of the type described by value_type (see _get_type) from a row of a column
+        if value_type[0] == "numpy":
+            value = np.array(row, dtype=value_type[1])
+            return value[()] if value.ndim == 0 else value
+        if value_type[0] in ("list", "tuple"):
+            values = [Checkpoint._get_value(element, value_type[1]) for element in row]
+            return values if value_type[0] == "list" else tuple(values)
+        return {"float": float, "int": int, "bool": bool}[value_type[0]](row)
+
+    @staticmethod
+    def _get_refinement_columns(objects: Sequence) -> Dict[str, Tuple[str, list, list, np.ndarray, np.ndarray]]:
+        # returns the columns of the refinement objects that can be restored exactly (all values have the same type and
+        # shape): column name -> attribute name, type (see _get_type), attribute values, array and mask of the missing
+        # values (None)
+        columns = {}
+        for column, attribute_names in Checkpoint.refinement_columns:
+            attribute_name = next((attribute_name for attribute_name in attribute_names if objects and hasattr(objects[0], attribute_name)), None)
+            if attribute_name is None or not all(hasattr(refinement_object, attribute_name) for refinement_object in objects):
+                continue
+            values = [getattr(refinement_object, attribute_name) for refinement_object in objects]
+            missing = np.array([value is None for value in values])
+            value_types = [Checkpoint._get_type(value) for value in values if value is not None]
+            if not value_types or value_types[0] is None or value_types.count(value_types[0]) != len(value_types):
+                continue
+            array = Checkpoint._get_column(values)
+            if array is not None:
+                columns[column] = (attribute_name, value_types[0], values, array, missing)
+        return columns
+
+    @staticmethod
+    def _get_cache_arrays(cache: dict, dim: int, output_length: int) -> Tuple[np.ndarray, np.ndarray]:
+        # converts a function cache into the coordinates (one row per point) and values (one row per point)
+        points = np.array(list(cache.keys()), dtype=float).reshape(len(cache), dim)
+        values = np.array([np.ravel(value) for value in cache.values()], dtype=float).reshape(len(cache), output_length)
+        return points, values
+
+    @staticmethod
+    def save(combi, filename: str) -> None:
+        """Writes a checkpoint of the combi object. An existing file is only replaced once the checkpoint was written
+        completely.
+
+        :param combi: Combi object (StandardCombi or child class).
+        :param filename: Specifies filename of the checkpoint.
+        :return: None
+        """
+        dim = combi.dim
+        arrays = {}
+        functions = Checkpoint.get_functions(combi)
+        # functions that are referenced by multiple attributes are stored once
+        function_names = {}
+        for name, f in functions.items():
+            function_names.setdefault(id(f), name)
+        for name, f in functions.items():
+            if function_names[id(f)] == name:
+                arrays["f_dict_points_" + name], arrays["f_dict_values_" + name] = Checkpoint._get_cache_arrays(f.f_dict, dim, f.output_length())
+                arrays["old_f_dict_points_" + name], arrays["old_f_dict_values_" + name] = Checkpoint._get_cache_arrays(f.old_f_dict, dim, f.output_length())
+        scheme = getattr(combi, "scheme", None)
+        if scheme is not None:
+            arrays["scheme_levelvectors"] = np.array([component_grid.levelvector for component_grid in scheme], dtype=int).reshape(len(scheme), dim)
+            arrays["scheme_coefficients"] = np.array([component_grid.coefficient for component_grid in scheme])
+        refinement_containers = Checkpoint.get_refinement_containers(combi)
+        refinement_objects = [refinement_container.get_objects() for refinement_container in refinement_containers]
+        refinement_columns = [Checkpoint._get_refinement_columns(objects) for objects in refinement_objects]
+        for k, columns in enumerate(refinement_columns):
+            for column, (_, _, _, values, missing) in columns.items():
+                arrays["refinement_%d_%s" % (k, column)] = values
+                if np.any(missing):
+                    arrays["refinement_missing_%d_%s" % (k, column)] = missing
+        grid = getattr(combi, "grid", None)
+        metadata = {"format_version": Checkpoint.format_version,
+                    "class": [type(combi).__module__, type(combi).__name__],
+                    "dim": dim,
+                    "a": np.asarray(combi.a, dtype=float).tolist(),
+                    "b": np.asarray(combi.b, dtype=float).tolist(),
+                    "lmin": np.asarray(getattr(combi, "lmin", []), dtype=int).tolist(),
+                    "lmax": np.asarray(getattr(combi, "lmax", []), dtype=int).tolist(),
+                    "grid": None if grid is None else {"class": type(grid).__name__, "boundary": bool(getattr(grid, "boundary", True)),
+                                                       "modified_basis": bool(getattr(grid, "modified_basis", False))},
+                    "operation": type(combi.operation).__name__,
+                    "functions": {name: function_names[id(f)] for name, f in functions.items()},
+                    "num_refinement_containers": len(refinement_containers),
+                    "refinement_columns": [{column: [attribute_name, value_type] for column, (attribute_name, value_type, _, _, _) in columns.items()} for columns in refinement_columns]}
+        arrays["metadata"] = np.frombuffer(json.dumps(metadata).encode(), dtype=np.uint8)
+        # the remaining object graph is pickled without the data that is stored in the arrays
+        caches = {id(f): (f.f_dict, f.old_f_dict) for f in functions.values()}
+        try:
+            for f in functions.values():
+                f.f_dict, f.old_f_dict = {}, {}
+            if scheme is not None:
+                combi.scheme = None
+            for objects, columns in zip(refinement_objects, refinement_columns):
+                for attribute_name, _, _, _, _ in columns.values():
+                    for refinement_object in objects:
+                        delattr(refinement_object, attribute_name)
+            arrays["state"] = np.frombuffer(Checkpoint._get_pickle_module().dumps(combi), dtype=np.uint8)
+        finally:
+            for f in functions.values():
+                f.f_dict, f.old_f_dict = caches[id(f)]
+            if scheme is not None:
+                combi.scheme = scheme
+            for objects, columns in zip(refinement_objects, refinement_columns):
+                for attribute_name, _, values, _, _ in columns.values():
+                    for refinement_object, value in zip(objects, values):
+                        setattr(refinement_object, attribute_name, value)
+        # the file is written atomically: a crash while writing leaves an existing file with this name intact
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, 'wb') as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_filename, filename)
+
+    @staticmethod
+    def _get_pickle_module():
+        # dill can store more objects (e.g. lambdas) than pickle
+        if importlib.util.find_spec("dill") is not None:
+            import dill
+            return dill
+        return pickle
+
+    def get_scheme(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the combination scheme of the checkpoint.
+
+        :return: Level vectors (one row per component grid) and coefficients or None if the object had no scheme.
+        """
+        if "scheme_levelvectors" not in self.data.files:
+            return None
+        return self.data["scheme_levelvectors"], self.data["scheme_coefficients"]
+
+    def get_function_cache(self, name: str="f", old: bool=False) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the cached function evaluations of a function of the operation.
+
+        :param name: Attribute name of the function in the operation.
+        :param old: Specifies whether the cache of previous runs (old_f_dict) is returned.
+        :return: Coordinates (one row per point) and values (one row per point).
+        """
+        prefix = "old_f_dict_" if old else "f_dict_"
+        name = self.metadata["functions"][name]
+        return self.data[prefix + "points_" + name], self.data[prefix + "values_" + name]
+
+    def get_refinement_arrays(self, k: int=0) -> Dict[str, np.ndarray]:
+        """Returns the attributes of the refinement objects of a refinement container. Missing values are nan.
+
+        :param k: Index of the refinement container (dimension for the single dimension scheme).
+        :return: Dictionary from the column name (e.g. starts, errors) to the array with one row per refinement object.
+        """
+        prefix = "refinement_%d_" % k
+        return {name[len(prefix):]: self.data[name] for name in self.data.files if name.startswith(prefix)}
+
+    def load_refinement(self, combi) -> None:
+        """Sets the attributes of the refinement objects of a restored combi object that are stored as columns.
+
+        :param combi: Combi object that was restored from this checkpoint.
+        :return: None
+        """
+        # checkpoints of version 1 store the refinement objects completely in the pickled state
+        refinement_columns = self.metadata.get("refinement_columns")
+        if refinement_columns is None:
+            return
+        for k, refinement_container in enumerate(Checkpoint.get_refinement_containers(combi)):
+            objects = refinement_container.get_objects()
+            for column, (attribute_name, value_type) in refinement_columns[k].items():
+                rows = self.data["refinement_%d_%s" % (k, column)].tolist()
+                missing_name = "refinement_missing_%d_%s" % (k, column)
+                missing = self.data[missing_name].tolist() if missing_name in self.data.files else [False] * len(objects)
+                for refinement_object, row, is_missing in zip(objects, rows, missing):
+                    setattr(refinement_object, attribute_name, None if is_missing else Checkpoint._get_value(row, value_type))
+
+    def load_function_caches(self, combi) -> None:
+        """Fills the function caches of the operation of a restored combi object with the stored evaluations.
+
+        :param combi: Combi object that was restored from this checkpoint.
+        :return: None
+        """
+        functions = Checkpoint.get_functions(combi)
+        # the garbage collector is paused while the caches are built (it would repeatedly scan all new tuples)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for name, stored_name in self.metadata["functions"].items():
+                if name == stored_name:
+                    f = functions[name]
+                    for old in [False, True]:
+                        points, values = self.get_function_cache(name, old)
+                        # the tuples of the coordinates are created column wise; scalar values are stored as floats
+                        keys = zip(*points.T.tolist()) if len(points) > 0 else []
+                        cache = dict(zip(keys, values[:, 0].tolist() if values.shape[1] == 1 else values.tolist()))
+                        if old:
+                            f.old_f_dict = cache
+                        else:
+                            f.f_dict = cache
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def restore(self, load_function_caches: bool=True):
+        """Creates the combi object of the checkpoint.
+
+        :param load_function_caches: Specifies whether the function caches are filled. Building the caches dominates
+                                     the time of the restore; if the caches are not needed (e.g. for interpolation or
+                                     plotting) they can be omitted and loaded later with load_function_caches.
+        :return: Combi object.
+        """
+        combi = Checkpoint._get_pickle_module().loads(self.data["state"].tobytes())
+        self.load_refinement(combi)
+        if load_function_caches:
+            self.load_function_caches(combi)
+        scheme = self.get_scheme()
+        if scheme is not None:
+            levelvectors, coefficients = scheme
+            levelvectors.flags.writeable = False
+            combi.scheme = [ComponentGridInfo(levelvector=levelvector, coefficient=coefficient) for levelvector, coefficient in zip(levelvectors, coefficients.tolist())]
+        return combi
+
+    def close(self) -> None:
+        self.data.close()
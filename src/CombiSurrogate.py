@@ -0,0 +1,165 @@
+import json
+import numpy as np
+from typing import Sequence, Tuple
+from MultilinearInterpolator import *
+
+
+class CombiSurrogate(object):
+    """This class is an immutable, compiled representation of a finished combination. It only stores what is needed to
+    evaluate the combination interpolant: for every component grid the 1D coordinate arrays, the values at the grid
+    points and the combination coefficient. All arrays are views into one contiguous buffer which can be written to a
+    single file and loaded again as a memory map.
+
+    """
+
+    # identifies the file format; the header (json) follows as length-prefixed string, then the aligned data buffer
+    magic = b"COMBISRG"
+    alignment = 64
+
+    def __init__(self, a: Sequence[float], b: Sequence[float], coefficients: Sequence[float], levelvectors: Sequence[Sequence[int]],
+                 num_points: Sequence[Sequence[int]], output_length: int, buffer: np.ndarray):
+        """Use from_component_grids or load to create a surrogate.
+
+        :param a: Vector of lower boundaries of domain.
+        :param b: Vector of upper boundaries of domain.
+        :param coefficients: Combination coefficient of each component grid.
+        :param levelvectors: Level vector of each component grid.
+        :param num_points: Number of points per dimension of each component grid.
+        :param output_length: Number of output components.
+        :param buffer: Contiguous buffer holding the coordinates and values of all component grids (see _get_layout).
+        """
+        self.a = tuple(float(a_d) for a_d in a)
+        self.b = tuple(float(b_d) for b_d in b)
+        self.dim = len(self.a)
+        self.coefficients = tuple(float(coefficient) for coefficient in coefficients)
+        self.levelvectors = tuple(tuple(int(l) for l in levelvector) for levelvector in levelvectors)
+        self.num_points = tuple(tuple(int(n) for n in num_points_grid) for num_points_grid in num_points)
+        self.output_length = int(output_length)
+        self.layout = self._get_layout(self.num_points, self.output_length)
+        assert len(buffer) == self.layout["size"]
+        self.buffer = buffer
+        self.buffer.flags.writeable = False
+        self.interpolators = []
+        for component_layout in self.layout["component_grids"]:
+            mesh_points_grid = [self.buffer[offset:offset + length] for offset, length in component_layout["coordinates"]]
+            offset, length = component_layout["values"]
+            self.interpolators.append(MultilinearInterpolator(mesh_points_grid, self.buffer[offset:offset + length]))
+
+    @staticmethod
+    def from_component_grids(a: Sequence[float], b: Sequence[float], coefficients: Sequence[float], levelvectors: Sequence[Sequence[int]],
+                             mesh_points_grids: Sequence[Sequence[Sequence[float]]], values: Sequence[Sequence[Sequence[float]]]) -> 'CombiSurrogate':
+        """Creates a surrogate from the data of the component grids which is copied into one contiguous buffer.
+
+        :param a: Vector of lower boundaries of domain.
+        :param b: Vector of upper boundaries of domain.
+        :param coefficients: Combination coefficient of each component grid.
+        :param levelvectors: Level vector of each component grid.
+        :param mesh_points_grids: 1D coordinate arrays of each component grid.
+        :param values: Values at the grid points of each component grid (one row per point ordered like
+                       get_cross_product, one column per output component).
+        :return: CombiSurrogate object.
+        """
+        num_points = [[len(mesh_points_1D) for mesh_points_1D in mesh_points_grid] for mesh_points_grid in mesh_points_grids]
+        output_length = int(np.size(values[0]) // np.prod(num_points[0]))
+        layout = CombiSurrogate._get_layout(num_points, output_length)
+        buffer = np.empty(layout["size"])
+        for i, component_layout in enumerate(layout["component_grids"]):
+            for d, (offset, length) in enumerate(component_layout["coordinates"]):
+                buffer[offset:offset + length] = mesh_points_grids[i][d]
+            offset, length = component_layout["values"]
+            buffer[offset:offset + length] = np.ravel(values[i])
+        return CombiSurrogate(a, b, coefficients, levelvectors, num_points, output_length, buffer)
+
+    @staticmethod
+    def _get_layout(num_points: Sequence[Sequence[int]], output_length: int) -> dict:
+        # positions (offset, length) of the coordinate arrays and value tensors of all component grids in the buffer
+        offset = 0
+        component_grids = []
+        for num_points_grid in num_points:
+            coordinates = []
+            for num_points_1D in num_points_grid:
+                coordinates.append((offset, num_points_1D))
+                offset += num_points_1D
+            num_values = int(np.prod(num_points_grid)) * output_length
+            component_grids.append({"coordinates": coordinates, "values": (offset, num_values)})
+            offset += num_values
+        return {"component_grids": component_grids, "size": offset}
+
+    def __call__(self, interpolation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
+        return self.predict(interpolation_points)
+
+    def predict(self, X: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
+        """Evaluates the combination interpolant at a batch of points.
+
+        :param X: Points at which we want to evaluate, array of shape (number of points, dim).
+        :return: Numpy array with one row per point and one column per output component.
+        """
+        X = np.asarray(X, dtype=float).reshape(-1, self.dim)
+        result = np.zeros((len(X), self.output_length))
+        for coefficient, interpolator in zip(self.coefficients, self.interpolators):
+            result += coefficient * interpolator(X)
+        return result
+
+    def gradient(self, X: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[Sequence[float]]]:
+        """Evaluates the gradient of the combination interpolant at a batch of points.
+
+        :param X: Points at which we want to evaluate, array of shape (number of points, dim).
+        :return: Numpy array of shape (number of points, output length, dim).
+        """
+        X = np.asarray(X, dtype=float).reshape(-1, self.dim)
+        result = np.zeros((len(X), self.output_length, self.dim))
+        for coefficient, interpolator in zip(self.coefficients, self.interpolators):
+            result += coefficient * interpolator.gradient(X)
+        return result
+
+    def hessian_diag(self, X: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[Sequence[float]]]:
+        """Evaluates the second derivatives d^2/dx_d^2 of the combination interpolant at a batch of points. The
+        component grid interpolants are multilinear so these vanish inside the cells.
+
+        :param X: Points at which we want to evaluate, array of shape (number of points, dim).
+        :return: Numpy array of shape (number of points, output length, dim).
+        """
+        return np.zeros((len(np.asarray(X, dtype=float).reshape(-1, self.dim)), self.output_length, self.dim))
+
+    def save(self, filename: str) -> None:
+        """Writes the surrogate to a single binary file that can be loaded (memory mapped) with load.
+
+        :param filename: Specifies filename where to store the surrogate.
+        :return: None
+        """
+        header = json.dumps({"a": self.a, "b": self.b, "coefficients": self.coefficients, "levelvectors": self.levelvectors,
+                             "num_points": self.num_points,
+                             "output_length": self.output_length}).encode()
+        data_offset = self._get_data_offset(len(header))
+        with open(filename, 'wb') as f:
+            f.write(self.magic)
+            f.write(np.array(len(header), dtype='<u8').tobytes())
+            f.write(header)
+            f.write(b"\0" * (data_offset - f.tell()))
+            f.write(np.ascontiguousarray(self.buffer, dtype='<f8').tobytes())
+
+    @staticmethod
+    def load(filename: str, mmap: bool=True) -> 'CombiSurrogate':
+        """Loads a surrogate that was written with save. By default the data is memory mapped so loading is independent
+        of the size of the surrogate and the pages are shared between processes.
+
+        :param filename: Specifies filename of the surrogate.
+        :param mmap: Specifies whether the data should be memory mapped (otherwise it is read into memory).
+        :return: CombiSurrogate object.
+        """
+        with open(filename, 'rb') as f:
+            assert f.read(len(CombiSurrogate.magic)) == CombiSurrogate.magic, "Not a CombiSurrogate file"
+            header_length = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+            header = json.loads(f.read(header_length).decode())
+        layout = CombiSurrogate._get_layout(header["num_points"], header["output_length"])
+        data_offset = CombiSurrogate._get_data_offset(header_length)
+        if mmap:
+            buffer = np.memmap(filename, dtype='<f8', mode='r', offset=data_offset, shape=(layout["size"],))
+        else:
+            buffer = np.fromfile(filename, dtype='<f8', count=layout["size"], offset=data_offset)
+        return CombiSurrogate(header["a"], header["b"], header["coefficients"], header["levelvectors"], header["num_points"], header["output_length"], buffer)
+
+    @staticmethod
+    def _get_data_offset(header_length: int) -> int:
+        offset = len(CombiSurrogate.magic) + 8 + header_length
+        return -(-offset // CombiSurrogate.alignment) * CombiSurrogate.alignment
@@ -0,0 +1,141 @@
+import numpy as np
+import multiprocessing as mp
+from typing import Dict, Hashable, Sequence, Tuple
+
+
+# function evaluated by the worker processes of the parallel evaluation; it is inherited when the pool is forked
+_worker_function = None
+
+
+def _evaluate_points_task(points: Sequence[Tuple[float, ...]]) -> list:
+    # evaluates the model at the given points (without caching)
+    return [_worker_function.eval(tuple(point)) for point in points]
+
+
+class EvaluationPlan(object):
+    """This class plans the model evaluations of a set of component grids (or areas of component grids). The union of
+    the points of all grids is computed up front and each distinct point gets an integer id. The model is then evaluated
+    once per distinct point and each grid gathers its values with an index array. For nested grids this avoids
+    evaluating (and looking up) the shared points of the grids over and over again.
+
+    """
+
+    def __init__(self, point_sets: Dict[Hashable, Sequence[Tuple[float, ...]]], dim: int):
+        """
+
+        :param point_sets: Points of each grid (keys identify the grids, e.g. the level vector).
+        :param dim: Dimension of the points.
+        """
+        self.dim = dim
+        self.keys = {}
+        offsets = [0]
+        arrays = []
+        for key, points in point_sets.items():
+            points = np.asarray(list(points), dtype=float).reshape(-1, dim)
+            self.keys[key] = len(arrays)
+            arrays.append(points)
+            offsets.append(offsets[-1] + len(points))
+        all_points = np.concatenate([np.zeros((0, dim))] + arrays)
+        # distinct points and the id of the distinct point for each occurrence
+        self.points, point_ids = np.unique(all_points, axis=0, return_inverse=True)
+        point_ids = np.ravel(point_ids)
+        self.indices = [point_ids[offsets[i]:offsets[i + 1]] for i in range(len(arrays))]
+        self.num_occurrences = len(all_points)
+        self.values = None
+
+    def get_num_points(self) -> int:
+        """Returns the number of distinct points of all grids.
+
+        :return: Number of distinct points.
+        """
+        return len(self.points)
+
+    def get_num_occurrences(self) -> int:
+        """Returns the number of points of all grids including points that appear in multiple grids.
+
+        :return: Number of point occurrences.
+        """
+        return self.num_occurrences
+
+    def get_points_to_evaluate(self, f) -> Sequence[int]:
+        """Returns the ids of the distinct points whose values are not yet cached by the function.
+
+        :param f: Function (see Function) that is evaluated.
+        :return: List of point ids.
+        """
+        if not f.do_cache:
+            return list(range(len(self.points)))
+        return [i for i, point in enumerate(map(tuple, self.points.tolist())) if point not in f.f_dict and point not in f.old_f_dict]
+
+    def get_num_model_calls(self, f) -> int:
+        """Returns the number of model calls that the evaluation of the plan will perform.
+
+        :param f: Function (see Function) that is evaluated.
+        :return: Number of model calls.
+        """
+        return len(self.get_points_to_evaluate(f))
+
+    def evaluate(self, f, num_processes: int=1, chunk_size: int=256) -> Sequence[Sequence[float]]:
+        """Evaluates the model once at every distinct point that is not cached yet. The new values are stored in the
+        cache of the function so that later calls of f at these points do not call the model again.
+
+        :param f: Function (see Function) that is evaluated.
+        :param num_processes: Number of (forked) processes for the model calls.
+        :param chunk_size: Number of points that are evaluated in one task of the parallel evaluation.
+        :return: Numpy array with the values at all distinct points (one row per point).
+        """
+        global _worker_function
+        points = list(map(tuple, self.points.tolist()))
+        self.values = np.empty((len(points), f.output_length()))
+        if f.do_cache:
+            # the cached values are gathered in one pass over the points (values of previous runs are moved into the
+            # cache like in Function.__call__); only the remaining points are evaluated
+            to_evaluate = []
+            cached_ids = []
+            cached_values = []
+            for i, point in enumerate(points):
+                value = f.f_dict.get(point)
+                if value is None:
+                    value = f.old_f_dict.get(point)
+                    if value is None:
+                        to_evaluate.append(i)
+                        continue
+                    f.f_dict[point] = value
+                cached_ids.append(i)
+                cached_values.append(value)
+            if cached_ids:
+                self.values[cached_ids] = np.array(cached_values, dtype=float).reshape(len(cached_ids), -1)
+        else:
+            to_evaluate = list(range(len(points)))
+        if num_processes > 1 and len(to_evaluate) > chunk_size and "fork" in mp.get_all_start_methods():
+            _worker_function = f
+            chunks = [[points[i] for i in to_evaluate[start:start + chunk_size]] for start in range(0, len(to_evaluate), chunk_size)]
+            with mp.get_context("fork").Pool(num_processes) as pool:
+                new_values = [value for values in pool.map(_evaluate_points_task, chunks) for value in values]
+        else:
+            new_values = [f.eval(points[i]) for i in to_evaluate]
+        if to_evaluate:
+            self.values[to_evaluate] = np.array([np.reshape(value, -1) for value in new_values], dtype=float).reshape(len(to_evaluate), -1)
+        if f.do_cache:
+            for i, value in zip(to_evaluate, new_values):
+                f.f_dict[points[i]] = value
+        return self.values
+
+    def get_indices(self, key: Hashable) -> Sequence[int]:
+        """Returns the ids of the points of the specified grid.
+
+        :param key: Key of the grid.
+        :return: Integer array with one id per point of the grid.
+        """
+        return self.indices[self.keys[key]]
+
+    def get_values(self, key: Hashable) -> Sequence[Sequence[float]]:
+        """Gathers the values of the points of the specified grid from the evaluated plan.
+
+        :param key: Key of the grid.
+        :return: Numpy array with one row per point of the grid or None if the grid is not part of the plan or the
+                 plan was not evaluated yet.
+        """
+        if self.values is None or key not in self.keys:
+            return None
+        return self.values[self.get_indices(key)]
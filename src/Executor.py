@@ -0,0 +1,139 @@
+import abc
+import multiprocessing as mp
+from typing import Callable, List, Sequence
+
+
+class Executor(abc.ABC):
+    """This class defines the interface of the executors that run the ranks of the distributed combination technique.
+    Each rank holds its own copy of a context object (e.g. the combi object with the operation and its function cache)
+    which is distributed once by start. Afterwards run executes a function on all ranks and returns the result of each
+    rank. A backend for a cluster (e.g. based on MPI) has to implement start, run and close; the reduction of the rank
+    results can be overwritten if the backend offers a collective reduction.
+
+    """
+
+    def __init__(self, num_ranks: int):
+        """
+
+        :param num_ranks: Number of ranks.
+        """
+        assert num_ranks > 0
+        self.num_ranks = num_ranks
+
+    def get_num_ranks(self) -> int:
+        return self.num_ranks
+
+    @abc.abstractmethod
+    def is_started(self) -> bool:
+        """Indicates whether the ranks were started and hold a context.
+
+        :return: Bool
+        """
+        pass
+
+    @abc.abstractmethod
+    def start(self, context) -> None:
+        """Starts the ranks and gives each rank its own copy of the context.
+
+        :param context: Object that is passed to the functions executed on the ranks.
+        :return: None
+        """
+        pass
+
+    @abc.abstractmethod
+    def run(self, function: Callable, arguments: Sequence) -> List:
+        """Executes function(context, rank, arguments[rank]) on all ranks.
+
+        :param function: Function that is executed (has to be defined at module level).
+        :param arguments: Argument for each rank.
+        :return: List with the result of each rank (in rank order).
+        """
+        pass
+
+    def reduce(self, values: Sequence, merge: Callable[[Sequence], object]):
+        """Reduces the results of the ranks along a binary tree, i.e. in each level the results of neighbouring ranks
+        are merged. The order of the ranks is preserved.
+
+        :param values: Result of each rank.
+        :param merge: Function that merges a list of results into one result.
+        :return: Reduced result.
+        """
+        values = list(values)
+        while len(values) > 1:
+            values = [merge(values[i:i + 2]) for i in range(0, len(values), 2)]
+        return values[0]
+
+    def close(self) -> None:
+        """Stops the ranks.
+
+        :return: None
+        """
+        pass
+
+
+def _run_rank(context, rank: int, connection) -> None:
+    # loop of a rank of the LocalExecutor: executes the received functions until None is received
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        function, argument = task
+        try:
+            result = function(context, rank, argument)
+        except Exception as exception:
+            result = exception
+        connection.send(result)
+    connection.close()
+
+
+class LocalExecutor(Executor):
+    """This executor emulates the ranks on one machine. Each rank is a forked process that inherits its copy of the
+    context, so all state of a rank (e.g. cached function values) stays local to the rank and is kept between runs.
+
+    """
+
+    def __init__(self, num_ranks: int=None):
+        """
+
+        :param num_ranks: Number of ranks (default: number of cpus).
+        """
+        super().__init__(num_ranks if num_ranks is not None else mp.cpu_count())
+        self.processes = []
+        self.connections = []
+
+    def is_started(self) -> bool:
+        return len(self.processes) > 0
+
+    def start(self, context) -> None:
+        assert "fork" in mp.get_all_start_methods(), "LocalExecutor requires the fork start method"
+        self.close()
+        fork_context = mp.get_context("fork")
+        for rank in range(self.num_ranks):
+            connection, rank_connection = fork_context.Pipe()
+            process = fork_context.Process(target=_run_rank, args=(context, rank, rank_connection), daemon=True)
+            process.start()
+            rank_connection.close()
+            self.processes.append(process)
+            self.connections.append(connection)
+
+    def run(self, function: Callable, arguments: Sequence) -> List:
+        assert self.is_started() and len(arguments) == self.num_ranks
+        for connection, argument in zip(self.connections, arguments):
+            connection.send((function, argument))
+        results = [connection.recv() for connection in self.connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def close(self) -> None:
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.connections = []
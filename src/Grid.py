@@ -26,6 +26,13 @@ class Grid(object):
             self.setCurrentArea(start, end, levelvec)
         return self.integrator(f, self.levelToNumPoints(levelvec), start, end)
 
+    # integrates the grid on the specified area with the given function values at the grid points (one row per point
+    # ordered like getPoints); requires an integrator that supports this (see IntegratorBase.integrate_values)
+    def integrate_values(self, values: Sequence[Sequence[float]], levelvec: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        if not self.is_global():
+            self.setCurrentArea(start, end, levelvec)
+        return self.integrator.integrate_values(values, self.levelToNumPoints(levelvec), start, end)
+
     # def integrate_point(self, f, levelvec, start, end, point):
     #    if not self.isGlobal():
     #        self.setCurrentArea(start, end, levelvec)
@@ -294,51 +301,40 @@ class BasisGrid(Grid):
         self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))] = self.integrator.get_surplusses()
         return integral
 
+    def integrate_values(self, values: Sequence[Sequence[float]], levelvec: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        if not self.is_global():
+            self.setCurrentArea(start, end, levelvec)
+        integral = self.integrator.integrate_values(values, self.levelToNumPoints(levelvec), start, end)
+        self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))] = self.integrator.get_surplusses()
+        return integral
+
+    # this method evaluates all 1D basis functions of dimension d (or their derivatives) at the points and returns the
+    # sparse (csr) matrix with entry [j, i] = basis_i(points_d[j])
+    def get_basis_evaluations_1D(self, d: int, points_d: Sequence[float], derivative: int=0) -> csr_matrix:
+        return get_basis_evaluation_matrix(self.grids[d].splines, points_d, derivative)
+
     def interpolate_grid(self, grid_points_for_dims: Sequence[Sequence[float]], start: Sequence[float], end: Sequence[float], levelvec: Sequence[int]) -> Sequence[Sequence[float]]:
         surplusses = self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))]
-        num_points = np.prod([len(grid_d) for grid_d in grid_points_for_dims])
-        num_points_grid = [len(grid_d) for grid_d in grid_points_for_dims]
-        results = np.zeros((num_points, np.shape(surplusses)[0]))
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = grid_points_for_dims[d]
-            evaluations1D = np.zeros((len(points_d), (len(self.splines[d]))))
-            for i, spline in enumerate(self.grids[d].splines):
-                for j, p in enumerate(points_d):
-                    evaluations1D[j, i] = spline(p)
-            evaluations[d] = evaluations1D
-
-        pointIndexList = get_cross_product_range(num_points_grid)
-        for n, p in enumerate(pointIndexList):
-            indexList = get_cross_product_range(self.numPoints)
-            for i, index in enumerate(indexList):
-                intermediate_result = np.array(surplusses[:,i])
-                for d in range(self.dim):
-                    for j in range(np.shape(surplusses)[0]):
-                        intermediate_result *= evaluations[d][p[d], index[d]]
-                results[n,:] += intermediate_result
-        return results
+        evaluations = [self.get_basis_evaluations_1D(d, grid_points_for_dims[d]) for d in range(self.dim)]
+        return get_mode_n_product(surplusses, evaluations)
 
     def interpolate(self, evaluation_points: Sequence[Tuple[float, ...]], start: Sequence[float], end: Sequence[float], levelvec: Sequence[int]) -> Sequence[Sequence[float]]:
         surplusses = self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))]
-        results = np.zeros((len(evaluation_points), np.shape(surplusses)[0]))
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = np.array([evaluation_point[d] for evaluation_point in evaluation_points])
-            evaluations1D = np.zeros((len(evaluation_points), len(self.grids[d].splines)))
-            for i, basis in enumerate(self.grids[d].splines):
-                for j, p in enumerate(points_d):
-                    evaluations1D[j, i] = basis(p)
-            evaluations[d] = evaluations1D
-        indexList = get_cross_product_range(self.numPoints)
-        for i, index in enumerate(indexList):
-            intermediate_result = np.ones((len(evaluation_points), np.shape(surplusses)[0]))
-            intermediate_result *= np.array(surplusses[:,i])
-            for d in range(self.dim):
-                for j in range(np.shape(surplusses)[0]):
-                    intermediate_result[:, j] *= evaluations[d][:, index[d]]
-            results[:,:] += intermediate_result
-        return results
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)
+        evaluations = [self.get_basis_evaluations_1D(d, evaluation_points[:, d]) for d in range(self.dim)]
+        return get_khatri_rao_contraction(evaluations, surplusses)
+
+    # this method returns the gradient of the interpolant at the points as array of shape
+    # (number of points, output length, dim)
+    def gradient(self, evaluation_points: Sequence[Tuple[float, ...]], start: Sequence[float], end: Sequence[float], levelvec: Sequence[int]) -> Sequence[Sequence[Sequence[float]]]:
+        surplusses = self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))]
+        return get_partial_derivatives(self, surplusses, evaluation_points, 1)
+
+    # this method returns the second derivatives d^2/dx_d^2 of the interpolant at the points as array of shape
+    # (number of points, output length, dim)
+    def hessian_diag(self, evaluation_points: Sequence[Tuple[float, ...]], start: Sequence[float], end: Sequence[float], levelvec: Sequence[int]) -> Sequence[Sequence[Sequence[float]]]:
+        surplusses = self.surplus_values[tuple((tuple(start), tuple(end), tuple(levelvec)))]
+        return get_partial_derivatives(self, surplusses, evaluation_points, 2)
 
     def get_basis(self, d: int, index: int):
         return self.grids[d].splines[index]
@@ -1142,74 +1138,42 @@ class GlobalBasisGrid(GlobalGrid):
         self.surplus_values[tuple(levelvec)] = self.integrator.get_surplusses()
         return integral
 
+    def integrate_values(self, values: Sequence[Sequence[float]], levelvec: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        integral = self.integrator.integrate_values(values, self.levelToNumPoints(levelvec), start, end)
+        self.surplus_values[tuple(levelvec)] = self.integrator.get_surplusses()
+        return integral
+
+    # this method evaluates all 1D basis functions of dimension d (or their derivatives) at the points and returns the
+    # sparse (csr) matrix with entry [j, i] = basis_i(points_d[j]); only the bases whose support contains a point are
+    # evaluated
+    def get_basis_evaluations_1D(self, d: int, points_d: Sequence[float], derivative: int=0) -> csr_matrix:
+        return get_basis_evaluation_matrix(self.basis[d], points_d, derivative)
+
     def interpolate(self, evaluation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo) -> Sequence[Sequence[float]]:
         levelvec = component_grid.levelvector
         surplusses = self.surplus_values[tuple(levelvec)]
-        #print(surplusses)
-        results = np.zeros((len(evaluation_points), np.shape(surplusses)[0]))
-        #print(np.shape(results))
-        #for n, evaluation_point in enumerate(evaluation_points):
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = np.array([evaluation_point[d] for evaluation_point in evaluation_points])
-            evaluations1D = np.zeros((len(evaluation_points), len(self.basis[d])))
-            for i, basis in enumerate(self.basis[d]):
-                for j, p in enumerate(points_d):
-                    evaluations1D[j, i] = basis(p)
-            evaluations[d] = evaluations1D
-        #print(evaluations)
-        indexList = get_cross_product_range(self.numPoints)
-        #print(indexList)
-        for i, index in enumerate(indexList):
-            intermediate_result = np.ones((len(evaluation_points), np.shape(surplusses)[0]))
-            intermediate_result *= np.array(surplusses[:,i])
-            for d in range(self.dim):
-                for j in range(np.shape(surplusses)[0]):
-                    intermediate_result[:, j] *= evaluations[d][:, index[d]]
-            #print(intermediate_result)
-            results[:,:] += intermediate_result
-            #print(results[n,:])
-        #print(results)
-        return results
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)
+        evaluations = [self.get_basis_evaluations_1D(d, evaluation_points[:, d]) for d in range(self.dim)]
+        # the tensor product bases evaluated at the points are the row-wise Khatri-Rao product of the sparse 1D
+        # evaluation matrices (ordered like get_cross_product_range(self.numPoints))
+        return get_khatri_rao_contraction(evaluations, surplusses)
+
+    # this method returns the gradient of the interpolant at the points as array of shape
+    # (number of points, output length, dim)
+    def gradient(self, evaluation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo) -> Sequence[Sequence[Sequence[float]]]:
+        return get_partial_derivatives(self, self.surplus_values[tuple(component_grid.levelvector)], evaluation_points, 1)
+
+    # this method returns the second derivatives d^2/dx_d^2 of the interpolant at the points as array of shape
+    # (number of points, output length, dim)
+    def hessian_diag(self, evaluation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo) -> Sequence[Sequence[Sequence[float]]]:
+        return get_partial_derivatives(self, self.surplus_values[tuple(component_grid.levelvector)], evaluation_points, 2)
 
     def interpolate_grid(self, grid_points_for_dims: Sequence[Sequence[float]], component_grid: ComponentGridInfo) -> Sequence[Sequence[float]]:
         levelvec = component_grid.levelvector
         surplusses = self.surplus_values[tuple(levelvec)]
-        num_points = np.prod([len(grid_d) for grid_d in grid_points_for_dims])
-        num_points_grid = [len(grid_d) for grid_d in grid_points_for_dims]
-        #print(surplusses)
-        results = np.zeros((num_points, np.shape(surplusses)[0]))
-        #print(np.shape(results))
-        #for n, evaluation_point in enumerate(evaluation_points):
-        evaluations = np.empty(self.dim, dtype=object)
-        for d in range(self.dim):
-            points_d = grid_points_for_dims[d]
-            evaluations1D = np.zeros((len(points_d), (len(self.splines[d]))))
-            for i, spline in enumerate(self.splines[d]):
-                for j, p in enumerate(points_d):
-                    #print(p, spline(p))
-                    evaluations1D[j, i] = spline(p)
-            evaluations[d] = evaluations1D
-        #print(evaluations)
-
-        #print(indexList)
-        pointIndexList = get_cross_product_range(num_points_grid)
-        for n, p in enumerate(pointIndexList):
-            indexList = get_cross_product_range(self.numPoints)
-            for i, index in enumerate(indexList):
-                intermediate_result = np.array(surplusses[:,i])
-                for d in range(self.dim):
-                    for j in range(np.shape(surplusses)[0]):
-                        intermediate_result *= evaluations[d][p[d], index[d]]
-                    #print(intermediate_result, surplusses[:,i], evaluations[d][p[d],:], grid[d], grid[d][p[d]], p[d])
-                #print(intermediate_result)
-                results[n,:] += intermediate_result
-            #print(results[n,:])
-        #print(results)
-        #print(list(pointIndexList))
-
-        #print(results)
-        return results
+        # the surplus tensor is multiplied with the 1D evaluation matrix of each dimension (mode-n products)
+        evaluations = [self.get_basis_evaluations_1D(d, grid_points_for_dims[d]) for d in range(self.dim)]
+        return get_mode_n_product(surplusses, evaluations)
 
 
 class GlobalBSplineGrid(GlobalBasisGrid):
@@ -2377,3 +2341,15 @@ class TruncatedNormalDistributionGrid1D(Grid1d):
         return True
 
 
+# this function evaluates the partial derivatives of the given order of the interpolant of a basis grid (with the
+# surplusses of the component grid) in each dimension at once. The partial derivative in dimension d only differs from
+# the interpolation in the 1D evaluation matrix of dimension d, so the other evaluation matrices are shared.
+def get_partial_derivatives(grid, surplusses: Sequence[Sequence[float]], evaluation_points: Sequence[Tuple[float, ...]], derivative: int) -> Sequence[Sequence[Sequence[float]]]:
+    evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, grid.dim)
+    evaluations = [grid.get_basis_evaluations_1D(d, evaluation_points[:, d]) for d in range(grid.dim)]
+    result = np.zeros((len(evaluation_points), len(surplusses), grid.dim))
+    for d in range(grid.dim):
+        factors = list(evaluations)
+        factors[d] = grid.get_basis_evaluations_1D(d, evaluation_points[:, d], derivative)
+        result[:, :, d] = get_khatri_rao_contraction(factors, surplusses)
+    return result
@@ -1,9 +1,12 @@
 from numpy import linalg as LA
 from math import isclose, isinf
+from itertools import islice
 from Grid import *
 from BasisFunctions import *
 from RefinementContainer import RefinementContainer
 from RefinementObject import RefinementObject
+from MultilinearInterpolator import *
+from EvaluationPlan import *
 
 
 class GridOperation(object):
@@ -97,6 +100,15 @@ class GridOperation(object):
         """
         pass
 
+    def initialize_result(self) -> None:
+        """This method resets the combined result of the operation but keeps all other state (e.g. cached function
+        values). It is used instead of initialize when the stored partial results of the component grids are combined
+        again (see StandardCombi.set_incremental_operation).
+
+        :return: None
+        """
+        self.initialize()
+
     def compute_difference(self, first_value: Sequence[float], second_value: Sequence[float], norm) -> float:
         """This method calculates the difference measure (e.g error measure) between the combi result and the reference
         solution as a scalar value. Can be changed by Operation.
@@ -144,6 +156,16 @@ class GridOperation(object):
         """
         return Interpolation.interpolate_points(values, self.dim, self.grid, mesh_points_grid, evaluation_points)
 
+    def get_interpolator(self, values: Sequence[Sequence[float]], mesh_points_grid: Sequence[Sequence[float]]) -> 'MultilinearInterpolator':
+        """Returns a reusable interpolator for the values that are on the mesh_points_grid. Calling the interpolator
+        with evaluation points gives the same result as interpolate_points.
+
+        :param values: Numpy array with values at grid points. Each value is again a numpy array.
+        :param mesh_points_grid: Grid definition where values are placed. List of 1D arrays.
+        :return: Interpolator that can be called with a list of points.
+        """
+        return MultilinearInterpolator(mesh_points_grid, values)
+
     @abc.abstractmethod
     def eval_analytic(self, coordinate: Tuple[float, ...]) -> Sequence[float]:
         """This method evaluates the analytic model at the given coordinate.
@@ -161,6 +183,14 @@ class GridOperation(object):
         """
         pass
 
+    def get_cached_points(self) -> Sequence[Tuple[float, ...]]:
+        """This method returns the points at which the operation cached model evaluations (e.g. to merge the distinct
+        points of several ranks, see StandardCombi.get_total_num_points).
+
+        :return: Array with one row per point or None if the operation does not cache points.
+        """
+        return None
+
     @abc.abstractmethod
     def get_component_grid_values(self, component_grid: ComponentGridInfo, mesh_points_grid: Sequence[Sequence[float]]) -> Sequence[Sequence[float]]:
         """This method returns the grid values for the specified component grid on the specified mesh.
@@ -181,6 +211,143 @@ class GridOperation(object):
         """
         pass
 
+    def supports_partial_results(self) -> bool:
+        """This method indicates whether the operation implements evaluate_levelvec_partial and add_partial_result,
+        i.e. whether the component grids can be evaluated independently (e.g. in different processes) and their
+        contributions combined afterwards.
+
+        :return: Bool
+        """
+        return False
+
+    def evaluate_levelvec_partial(self, component_grid: ComponentGridInfo):
+        """This method evaluates the operation on a specified component grid like evaluate_levelvec but returns the
+        contribution of the component grid instead of adding it to the combined result. The result has to be picklable
+        and must not depend on the combination coefficient (it is applied in add_partial_result) so that it can be
+        reused in other combination schemes.
+
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :return: Partial result of the component grid.
+        """
+        pass
+
+    def add_partial_result(self, component_grid: ComponentGridInfo, partial_result) -> None:
+        """This method adds the partial result of a component grid (see evaluate_levelvec_partial) to the combined
+        result. Adding the partial results of all grids in the order of the scheme gives the same result as calling
+        evaluate_levelvec for all grids.
+
+        :param component_grid: ComponentGridInfo of the component grid.
+        :param partial_result: Partial result of the component grid.
+        :return: None
+        """
+        pass
+
+    def compact_partial_result(self, partial_result):
+        """This method returns the part of a partial result that has to be kept after it was added with
+        add_partial_result, e.g. without function values that were merged into the function cache. Adding the compact
+        partial result again gives the same combined result.
+
+        :param partial_result: Partial result of a component grid.
+        :return: Compact partial result.
+        """
+        return partial_result
+
+    def supports_evaluation_planning(self) -> bool:
+        """This method indicates whether the operation implements evaluate_plan, i.e. whether the model evaluations of
+        all component grids can be planned (see EvaluationPlan) and performed before the grids are evaluated.
+
+        :return: Bool
+        """
+        return False
+
+    def get_num_model_calls(self, evaluation_plan: EvaluationPlan) -> int:
+        """This method returns the number of model calls that the evaluation of the plan will perform.
+
+        :param evaluation_plan: EvaluationPlan with the points of the component grids.
+        :return: Number of model calls.
+        """
+        pass
+
+    def evaluate_plan(self, evaluation_plan: EvaluationPlan, num_processes: int=1) -> None:
+        """This method evaluates the model at all distinct points of the plan. The values are used (or cached) for the
+        following evaluations of the component grids.
+
+        :param evaluation_plan: EvaluationPlan with the points of the component grids.
+        :param num_processes: Number of processes for the model calls.
+        :return: None
+        """
+        pass
+
+    def supports_distributed_operation(self) -> bool:
+        """This method indicates whether the operation implements the reduction of partial results
+        (get_reduced_result, merge_reduced_results and add_reduced_result) that is used by the distributed combination
+        (see StandardCombi.set_executor). This requires the support of partial results as well.
+
+        :return: Bool
+        """
+        return False
+
+    def get_reduced_result(self, component_grids: Sequence[ComponentGridInfo], partial_results: Sequence) -> object:
+        """This method combines the partial results of several component grids (see evaluate_levelvec_partial) into one
+        reduced result. The reduced result has to be picklable and should only contain what is needed for the combined
+        result (e.g. no function values).
+
+        :param component_grids: ComponentGridInfos of the component grids.
+        :param partial_results: Partial result of each component grid.
+        :return: Reduced result.
+        """
+        pass
+
+    def merge_reduced_results(self, reduced_results: Sequence) -> object:
+        """This method merges reduced results of disjoint sets of component grids into one reduced result.
+
+        :param reduced_results: List of reduced results.
+        :return: Reduced result.
+        """
+        pass
+
+    def add_reduced_result(self, reduced_result) -> None:
+        """This method adds a reduced result to the combined result.
+
+        :param reduced_result: Reduced result (see get_reduced_result).
+        :return: None
+        """
+        pass
+
+    def supports_partial_area_results(self) -> bool:
+        """This method indicates whether the operation implements evaluate_area_partial and add_partial_area_result,
+        i.e. whether the evaluations of the (component grid, area) pairs of the spatially adaptive schemes can be
+        performed independently (e.g. in different processes) and their contributions combined afterwards.
+
+        :return: Bool
+        """
+        return False
+
+    def evaluate_area_partial(self, area, levelvector: Sequence[int], componentgrid_info: ComponentGridInfo):
+        """This method evaluates the operation on a subarea like evaluate_area but returns the contribution instead of
+        adding it to the area, the refinement and the combined result. It must not modify the area. The result has to be
+        picklable.
+
+        :param area: RefinementObject (or RefinementContainer) that defines the subarea.
+        :param levelvector: Level vector of the (coarsened) component grid on the subarea.
+        :param componentgrid_info: ComponentGridInfo of the component grid.
+        :return: Partial result of the subarea.
+        """
+        pass
+
+    def add_partial_area_result(self, area, componentgrid_info: ComponentGridInfo, refinement_container: RefinementContainer, partial_area_result) -> int:
+        """This method adds the partial result of a subarea (see evaluate_area_partial) to the area, the refinement and
+        the combined result. Adding the partial results in the order of the serial evaluation gives the same result as
+        calling evaluate_area for all pairs.
+
+        :param area: RefinementObject (or RefinementContainer) that defines the subarea.
+        :param componentgrid_info: ComponentGridInfo of the component grid.
+        :param refinement_container: RefinementContainer of the refinement.
+        :param partial_area_result: Partial result of the subarea.
+        :return: Number of evaluations performed on the subarea.
+        """
+        pass
+
     def calculate_operation_dimension_wise(self, gridPointCoordsAsStripes: Sequence[Sequence[float]], grid_point_levels: Sequence[Sequence[int]],
                                            component_grid: ComponentGridInfo) -> None:
         """This method is used to compute the operation in the dimension-wise refinement strategy.
@@ -327,11 +494,38 @@ class DensityEstimation(AreaOperation):
         :param component_grid: ComponentGridInfo of the specified component grid
         :return: Surpluses of the component grid
         """
-        self.grid.setCurrentArea(np.zeros(len(component_grid.levelvector)), np.ones(len(component_grid.levelvector)), component_grid.levelvector)
-        surpluses = self.calculate_surpluses(component_grid.levelvector)
-        self.surpluses.update({tuple(component_grid.levelvector): surpluses})
+        surpluses = self.evaluate_levelvec_partial(component_grid)
+        self.add_partial_result(component_grid, surpluses)
         return surpluses
 
+    def supports_partial_results(self) -> bool:
+        return True
+
+    def evaluate_levelvec_partial(self, component_grid: ComponentGridInfo) -> Sequence[float]:
+        self.grid.setCurrentArea(np.zeros(len(component_grid.levelvector)), np.ones(len(component_grid.levelvector)), component_grid.levelvector)
+        return self.calculate_surpluses(component_grid.levelvector)
+
+    def initialize_result(self) -> None:
+        self.surpluses = {}
+
+    def supports_distributed_operation(self) -> bool:
+        return True
+
+    def get_reduced_result(self, component_grids: Sequence[ComponentGridInfo], partial_results: Sequence[Sequence[float]]) -> Dict[Sequence[int], Sequence[float]]:
+        return {tuple(component_grid.levelvector): partial_result for component_grid, partial_result in zip(component_grids, partial_results)}
+
+    def merge_reduced_results(self, reduced_results: Sequence[Dict[Sequence[int], Sequence[float]]]) -> Dict[Sequence[int], Sequence[float]]:
+        merged_result = {}
+        for reduced_result in reduced_results:
+            merged_result.update(reduced_result)
+        return merged_result
+
+    def add_reduced_result(self, reduced_result: Dict[Sequence[int], Sequence[float]]) -> None:
+        self.surpluses.update(reduced_result)
+
+    def add_partial_result(self, component_grid: ComponentGridInfo, partial_result: Sequence[float]) -> None:
+        self.surpluses.update({tuple(component_grid.levelvector): partial_result})
+
     def get_component_grid_values(self, component_grid: ComponentGridInfo, mesh_points_grid: Sequence[Sequence[float]]) -> Sequence[float]:
         """
         This method fills up the surplus array with zeros for the points on the boundary so it can be properly used when interpolating
@@ -567,10 +761,14 @@ class Integration(AreaOperation):
         self.dict_integral = {}
         self.dict_points = {}
         self.integral = np.zeros(f.output_length())
+        self.evaluation_plan = None
 
     def get_distinct_points(self):
         return self.f.get_f_dict_size()
 
+    def get_cached_points(self) -> Sequence[Tuple[float, ...]]:
+        return np.array(self.f.get_f_dict_points(), dtype=float).reshape(-1, self.dim)
+
     def get_point_values_component_grid(self, points, component_grid) -> Sequence[Sequence[float]]:
         """This method returns the values in the component grid at the given points.
 
@@ -609,6 +807,17 @@ class Integration(AreaOperation):
     def initialize(self):
         self.f.reset_dictionary()
         self.integral = np.zeros(self.f.output_length())
+        self.evaluation_plan = None
+
+    def initialize_result(self):
+        self.integral = np.zeros(self.f.output_length())
+        self.evaluation_plan = None
+
+    def __getstate__(self):
+        # the evaluation plan is only needed during perform_operation and is not stored
+        state = self.__dict__.copy()
+        state["evaluation_plan"] = None
+        return state
 
     def eval_analytic(self, coordinate: Tuple[float, ...]) -> Sequence[float]:
         return self.f.eval(coordinate)
@@ -617,7 +826,7 @@ class Integration(AreaOperation):
         return combined_solution + component_grid_info.coefficient * new_solution
 
     def evaluate_area(self, area, levelvector, componentgrid_info, refinement_container, additional_info):
-        partial_integral = self.grid.integrate(self.f, levelvector, area.start, area.end)
+        partial_integral = self.integrate_area(levelvector, area.start, area.end)
         if area.value is None:
             area.value = partial_integral * componentgrid_info.coefficient
         else:
@@ -628,11 +837,121 @@ class Integration(AreaOperation):
         self.integral += partial_integral * componentgrid_info.coefficient
         return evaluations
 
+    def supports_partial_area_results(self) -> bool:
+        return True
+
+    def evaluate_area_partial(self, area, levelvector, componentgrid_info) -> Tuple[Sequence[float], int, List[Tuple[Tuple[float, ...], Sequence[float]]]]:
+        num_cached_values = self.f.get_f_dict_size()
+        partial_integral = self.integrate_area(levelvector, area.start, area.end)
+        evaluations = np.prod(self.grid.levelToNumPoints(levelvector))
+        # the new function values are returned so that the cache of the combining process contains all points
+        function_values = list(islice(self.f.f_dict.items(), num_cached_values, None))
+        return partial_integral, evaluations, function_values
+
+    def add_partial_area_result(self, area, componentgrid_info, refinement_container, partial_area_result) -> int:
+        partial_integral, evaluations, function_values = partial_area_result
+        self.f.f_dict.update(function_values)
+        if area.value is None:
+            area.value = partial_integral * componentgrid_info.coefficient
+        else:
+            area.value += partial_integral * componentgrid_info.coefficient
+        if refinement_container is not None:
+            refinement_container.value += partial_integral * componentgrid_info.coefficient
+        self.integral += partial_integral * componentgrid_info.coefficient
+        return evaluations
+
     def evaluate_levelvec(self, component_grid: ComponentGridInfo):
-        levelvector = component_grid.levelvector
-        partial_integral = self.grid.integrate(self.f, levelvector, self.grid.a, self.grid.b)
+        self.integral += self.integrate_levelvec(component_grid.levelvector) * component_grid.coefficient
+
+    def integrate_levelvec(self, levelvector: Sequence[int]) -> Sequence[float]:
+        """This method integrates the component grid with the specified level vector over the whole domain.
+
+        :param levelvector: Level vector of the component grid.
+        :return: Integral of the component grid.
+        """
+        return self.integrate_area(levelvector, self.grid.a, self.grid.b, tuple(levelvector))
+
+    def integrate_area(self, levelvector: Sequence[int], start: Sequence[float], end: Sequence[float], plan_key: Hashable=None) -> Sequence[float]:
+        """This method integrates the component grid with the specified level vector on the specified area. If the
+        points of the grid are part of the evaluated EvaluationPlan the function values are gathered from the plan by
+        their indices (see IntegratorBase.integrate_values); otherwise the function is evaluated at each point.
+
+        :param levelvector: Level vector of the component grid.
+        :param start: Lower bounds of the area.
+        :param end: Upper bounds of the area.
+        :param plan_key: Key of the grid in the EvaluationPlan (default: level vector, start and end of the area).
+        :return: Integral of the component grid on the area.
+        """
+        evaluation_plan = getattr(self, "evaluation_plan", None)
+        if evaluation_plan is not None and self.grid.integrator.supports_value_integration():
+            if plan_key is None:
+                plan_key = Integration.get_plan_key(levelvector, start, end)
+            values = evaluation_plan.get_values(plan_key)
+            if values is not None:
+                return self.grid.integrate_values(values, levelvector, start, end)
+        return self.grid.integrate(self.f, levelvector, start, end)
+
+    @staticmethod
+    def get_plan_key(levelvector: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Hashable:
+        """Returns the key of a component grid on an area in the EvaluationPlan of the spatially adaptive schemes.
+
+        :param levelvector: Level vector of the component grid (after a potential coarsening).
+        :param start: Lower bounds of the area.
+        :param end: Upper bounds of the area.
+        :return: Key
+        """
+        return tuple(int(l) for l in levelvector), tuple(float(x) for x in start), tuple(float(x) for x in end)
+
+    def supports_evaluation_planning(self) -> bool:
+        return True
+
+    def get_num_model_calls(self, evaluation_plan: EvaluationPlan) -> int:
+        return evaluation_plan.get_num_model_calls(self.f)
+
+    def evaluate_plan(self, evaluation_plan: EvaluationPlan, num_processes: int=1) -> None:
+        evaluation_plan.evaluate(self.f, num_processes)
+        self.evaluation_plan = evaluation_plan
+
+    def supports_partial_results(self) -> bool:
+        return True
+
+    def evaluate_levelvec_partial(self, component_grid: ComponentGridInfo) -> Tuple[Sequence[float], List[Tuple[Tuple[float, ...], Sequence[float]]]]:
+        num_cached_values = self.f.get_f_dict_size()
+        partial_integral = self.integrate_levelvec(component_grid.levelvector)
+        # the function values that were added to the cache (in insertion order) are returned as well so that the cache
+        # of the combining process contains all points of the combination
+        function_values = list(islice(self.f.f_dict.items(), num_cached_values, None))
+        return partial_integral, function_values
+
+    def add_partial_result(self, component_grid: ComponentGridInfo, partial_result: Tuple[Sequence[float], List[Tuple[Tuple[float, ...], Sequence[float]]]]) -> None:
+        partial_integral, function_values = partial_result
+        self.f.f_dict.update(function_values)
         self.integral += partial_integral * component_grid.coefficient
 
+    def compact_partial_result(self, partial_result: Tuple[Sequence[float], List[Tuple[Tuple[float, ...], Sequence[float]]]]) -> Tuple[Sequence[float], List[Tuple[Tuple[float, ...], Sequence[float]]]]:
+        # the function values are in the function cache once the partial result was added
+        partial_integral, _ = partial_result
+        return partial_integral, []
+
+    def supports_distributed_operation(self) -> bool:
+        return True
+
+    def get_reduced_result(self, component_grids: Sequence[ComponentGridInfo], partial_results: Sequence[Tuple[Sequence[float], List[Tuple[Tuple[float, ...], Sequence[float]]]]]) -> Sequence[float]:
+        # the function values stay in the cache of the process that computed them
+        reduced_integral = np.zeros(self.f.output_length())
+        for component_grid, (partial_integral, _) in zip(component_grids, partial_results):
+            reduced_integral += partial_integral * component_grid.coefficient
+        return reduced_integral
+
+    def merge_reduced_results(self, reduced_results: Sequence[Sequence[float]]) -> Sequence[float]:
+        merged_integral = np.zeros(self.f.output_length())
+        for reduced_integral in reduced_results:
+            merged_integral += reduced_integral
+        return merged_integral
+
+    def add_reduced_result(self, reduced_result: Sequence[float]) -> None:
+        self.integral += reduced_result
+
     def evaluate_area_for_error_estimates(self, area, levelvector, componentgrid_info, refinement_container, additional_info):
         if additional_info.error_name == "extend_parent":
             assert additional_info.filter_area is None
@@ -800,7 +1119,7 @@ class Integration(AreaOperation):
         else:
             self.grid_surplusses.set_grid(gridPointCoordsAsStripes, grid_point_levels)
             self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
-            integral = self.grid.integrate(self.f, component_grid.levelvector, self.a, self.b)
+            integral = self.integrate_area(component_grid.levelvector, self.a, self.b)
         self.refinement_container.value += integral * component_grid.coefficient
         self.integral += integral * component_grid.coefficient
         if reuse_old_values:
@@ -978,24 +1297,12 @@ class Integration(AreaOperation):
 
 
 class Interpolation(Integration):
-    # interpolates mesh_points_grid at the given  evaluation_points using bilinear interpolation
+    # interpolates mesh_points_grid at the given  evaluation_points using multilinear interpolation
     @staticmethod
     def interpolate_points(values: Sequence[Sequence[float]], dim: int, grid: Grid, mesh_points_grid: Sequence[Sequence[float]],
                            evaluation_points: Sequence[Tuple[float, ...]]):
-        # constructing all points from mesh definition
-        function_value_dim = len(values[0])
-        interpolated_values_array = []
-        for d in range(function_value_dim):
-            values_1D = np.asarray([value[d] for value in values])
-
-            values_1D = values_1D.reshape(*[len(mesh_points_grid[d]) for d in (range(dim))])
-
-            # interpolate evaluation points from mesh points with bilinear interpolation
-            interpolated_values = interpn(mesh_points_grid, values_1D, evaluation_points, method='linear')
-
-            interpolated_values = np.asarray([[value] for value in interpolated_values])
-            interpolated_values_array.append(interpolated_values)
-        return np.hstack(interpolated_values_array)
+        assert len(mesh_points_grid) == dim
+        return MultilinearInterpolator(mesh_points_grid, values)(evaluation_points)
 
 
 import chaospy as cp
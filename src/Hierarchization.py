@@ -3,11 +3,16 @@ from Utils import *
 import Grid
 from typing import Tuple, Sequence, Callable
 from Function import *
-from scipy.linalg import solve_triangular
+from BasisFunctions import *
+from scipy.linalg import solve_triangular, lu_factor, lu_solve
+from scipy.sparse import issparse
+from scipy.sparse.linalg import splu
 
 class HierarchizationLSG(object):
-    def __init__(self, grid):
+    def __init__(self, grid, sparsity_threshold: float=0.25):
         self.grid = grid
+        # matrices with less than this fraction of non-zero entries are factorized in sparse format
+        self.sparsity_threshold = sparsity_threshold
 
     def __call__(self, grid_values: Sequence[Sequence[float]], numPoints: Sequence[int], grid: Grid) -> Sequence[Sequence[float]]:
         self.grid = grid
@@ -25,61 +30,48 @@ class HierarchizationLSG(object):
             assert math.isclose(self.grid.get_basis(d, 0)(self.grid.get_coordinates_dim(d)[0]), 1.0)
             return grid_values
         self.dim = len(numPoints)
-        offsets = np.array([int(np.prod(numPoints[d+1:])) for d in range(self.dim)])
-        numPoints_slice = np.array(numPoints)
-        numPoints_slice[d] = 1
         value_length = np.shape(grid_values)[0]
-        # create all indeces in d-1 dimensional slice
-        point_indeces = get_cross_product_range(numPoints_slice)
-        # in the first dimension we need to fill it with the actual function values
 
         # create and fill matrix for linear system of equations
         # evaluate all basis functions at all grid points
-        matrix = np.empty((numPoints[d], numPoints[d]))
-        for i in range(numPoints[d]):
-            for j in range(numPoints[d]):
-                matrix[i, j] = self.grid.get_basis(d, j)(self.grid.get_coordinates_dim(d)[i])
-        if numPoints[d] >= 15:
-            Q, R = np.linalg.qr(matrix)
-        #M_inv = np.linalg.inv(matrix)
+        matrix = self.get_basis_matrix(d, numPoints[d])
+        solve = self.get_solver(matrix)
 
-        pole_coordinates_base = np.empty(numPoints[d], dtype=int)
-        for i in range(numPoints[d]):
-            pole_index = np.zeros(self.dim, dtype=int)
-            pole_index[d] = i
-            pole_coordinates_base[i] = self.get_1D_coordinate(pole_index, offsets)
+        # all poles in dimension d are solved at once: the values are reshaped so that dimension d is the leading
+        # axis and every other index (output component and remaining dimensions) forms one right hand side
+        num_points_before = int(np.prod(numPoints[:d]))
+        num_points_after = int(np.prod(numPoints[d+1:]))
+        pole_values = np.reshape(grid_values, (value_length, num_points_before, numPoints[d], num_points_after))
+        pole_values = np.moveaxis(pole_values, 2, 0).reshape(numPoints[d], -1)
+        hierarchized_values = solve(pole_values)
+        hierarchized_values = np.moveaxis(hierarchized_values.reshape(numPoints[d], value_length, num_points_before, num_points_after), 0, 2)
+        # use previous surplusses for every consecutive dimension (unidirectional principle)
+        grid_values[:, :] = hierarchized_values.reshape(value_length, -1)
+        return grid_values
 
-        # iterate over all indeces in slice (0 at dimension d)
-        for point_index in point_indeces:
-            # create array of function values through pole
-            pole_values = np.zeros((value_length, numPoints[d]))
-            #print(pole_coordinates_base)
-            pole_coordinates = pole_coordinates_base + int(self.get_1D_coordinate(np.asarray(point_index), offsets))
-            #print(pole_coordinates)
-            # fill pole_values with function or surplus values of pole through current index
-            for i in range(numPoints[d]):
-                # use previous surplusses for every consecutive dimension (unidirectional principle)
-                pole_values[:, i] = grid_values[:, pole_coordinates[i]]
+    # this function evaluates all 1D basis functions of dimension d at the grid points of dimension d. Each basis is
+    # only evaluated at the points inside its support. If the bases have a local support the matrix is returned in
+    # sparse (csc) format, otherwise a dense numpy array is returned.
+    def get_basis_matrix(self, d: int, num_points: int):
+        basis_functions = [self.grid.get_basis(d, j) for j in range(num_points)]
+        matrix = get_basis_evaluation_matrix(basis_functions, self.grid.get_coordinates_dim(d))
+        if num_points >= 15 and matrix.nnz < self.sparsity_threshold * num_points**2:
+            return matrix.tocsc()
+        return matrix.toarray()
 
-            # solve system of linear equations for all components of our function values (typically scalar -> output.length = 1)
-            # if the function outputs vectors then we have to iterate over all components individually
-            # toDo replace by LU factorization to save time
-            #(matrix, self.grid.get_coordinates_dim(d), d)
-            for n in range(value_length):
-                #hierarchized_values = np.linalg.solve(matrix, pole_values[n,:])
-                #print(hierarchized_values)
-                if numPoints[d] >= 15:
-                    hierarchized_values = solve_triangular(R, np.inner(Q.T, pole_values[n, :]), check_finite=False)
-                else:
-                    hierarchized_values = np.linalg.solve(matrix, pole_values[n, :])
-                #hierarchized_values = (np.inner(M_inv, pole_values[n,:]))
-                #print(hierarchized_values - hierarchized_values2)
-                #if (np.sum(hierarchized_values - hierarchized_values2) > 10**-7):
-                #    print(hierarchized_values, hierarchized_values2)
-                for i in range(numPoints[d]):
-                    #pole_index = point_index[:d] + (i,) + point_index[d+1:]
-                    grid_values[n,pole_coordinates[i]] = hierarchized_values[i]
-        return grid_values
+    # this function returns a function that solves the linear system with the given matrix for a 2D array of right hand
+    # sides (one per column). The factorization is only computed once per matrix.
+    @staticmethod
+    def get_solver(matrix) -> Callable[[Sequence[Sequence[float]]], Sequence[Sequence[float]]]:
+        if issparse(matrix):
+            # sparse LU factorization; for local (B-spline) bases the fill in stays close to the banded structure
+            factorization = splu(matrix)
+            return lambda rhs: factorization.solve(np.asarray(rhs, dtype=float))
+        if len(matrix) >= 15:
+            Q, R = np.linalg.qr(matrix)
+            return lambda rhs: solve_triangular(R, np.dot(Q.T, rhs), check_finite=False)
+        factorization = lu_factor(matrix, check_finite=False)
+        return lambda rhs: lu_solve(factorization, rhs, check_finite=False)
 
     # this function maps the d-dimensional index to a one-dimensional array index
     def get_1D_coordinate(self, index_vector: Sequence[int], offsets: Sequence[int]) -> int:
@@ -0,0 +1,190 @@
+import numpy as np
+from typing import Iterable, Iterator, Sequence, Tuple
+
+
+class IndexSet(object):
+    """This class stores a set of level vectors in compact form. Each level vector is packed into one fixed-width
+    integer with one byte per dimension (big-endian, so the integer order equals the lexicographic order of the level
+    vectors). Neighbours are obtained by adding or subtracting the unit key of a dimension, so probes do not build any
+    intermediate tuples. For vectorized queries the keys are additionally kept as a sorted array which is rebuilt lazily
+    after the set was modified.
+
+    The class can be used like a set of tuples (iteration yields tuples).
+
+    """
+
+    # levels are stored in one byte per dimension; the largest level is kept free so that forward neighbours never carry
+    max_level = 254
+
+    def __init__(self, dim: int, levelvectors: Iterable[Sequence[int]]=()):
+        """
+
+        :param dim: Dimension of the level vectors.
+        :param levelvectors: Initial level vectors of the set.
+        """
+        self.dim = dim
+        self.keys = set()
+        # key offset of a unit step in each dimension
+        self.unit_keys = [1 << 8 * (dim - 1 - d) for d in range(dim)]
+        self.key_array = None
+        self.update(levelvectors)
+
+    def pack(self, levelvec: Sequence[int]) -> int:
+        """Packs a level vector into its integer key.
+
+        :param levelvec: Level vector.
+        :return: Integer key.
+        """
+        if isinstance(levelvec, np.ndarray):
+            return int.from_bytes(levelvec.astype(np.uint8).tobytes(), 'big')
+        return int.from_bytes(bytes(levelvec), 'big')
+
+    def unpack(self, key: int) -> Tuple[int, ...]:
+        """Restores the level vector of an integer key.
+
+        :param key: Integer key.
+        :return: Level vector as tuple.
+        """
+        return tuple(key.to_bytes(self.dim, 'big'))
+
+    def pack_array(self, levelvectors: Sequence[Sequence[int]]) -> np.ndarray:
+        """Packs an array of level vectors into (sortable) fixed-width byte records with the same order as the keys.
+
+        :param levelvectors: Array of level vectors with shape (number of level vectors, dim).
+        :return: Numpy array of packed records.
+        """
+        levelvectors = np.asarray(levelvectors, dtype=int).reshape(-1, self.dim)
+        assert np.all(levelvectors >= 0) and np.all(levelvectors <= self.max_level)
+        return np.ascontiguousarray(levelvectors, dtype=np.uint8).view(np.dtype((np.void, self.dim))).ravel()
+
+    def has_key(self, key: int) -> bool:
+        return key in self.keys
+
+    def add_key(self, key: int) -> None:
+        if key not in self.keys:
+            self.keys.add(key)
+            self.key_array = None
+
+    def remove_key(self, key: int) -> None:
+        self.keys.remove(key)
+        self.key_array = None
+
+    def add(self, levelvec: Sequence[int]) -> None:
+        assert all(0 <= l <= self.max_level for l in levelvec)
+        self.add_key(self.pack(levelvec))
+
+    def remove(self, levelvec: Sequence[int]) -> None:
+        self.remove_key(self.pack(levelvec))
+
+    def discard(self, levelvec: Sequence[int]) -> None:
+        if levelvec in self:
+            self.remove(levelvec)
+
+    def update(self, levelvectors: Iterable[Sequence[int]]) -> None:
+        if isinstance(levelvectors, IndexSet):
+            self.keys.update(levelvectors.keys)
+        elif isinstance(levelvectors, np.ndarray):
+            self.keys.update(int.from_bytes(record, 'big') for record in self.pack_array(levelvectors).tolist())
+        else:
+            for levelvec in levelvectors:
+                self.add(levelvec)
+        self.key_array = None
+
+    def copy(self) -> 'IndexSet':
+        index_set = IndexSet(self.dim)
+        index_set.keys = set(self.keys)
+        return index_set
+
+    def __or__(self, other: Iterable[Sequence[int]]) -> 'IndexSet':
+        index_set = self.copy()
+        index_set.update(other)
+        return index_set
+
+    def __contains__(self, levelvec: Sequence[int]) -> bool:
+        if len(levelvec) != self.dim or not all(0 <= l <= self.max_level for l in levelvec):
+            return False
+        return self.pack(levelvec) in self.keys
+
+    def __iter__(self) -> Iterator[Tuple[int, ...]]:
+        return map(self.unpack, list(self.keys))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, IndexSet):
+            return self.keys == other.keys
+        return set(self) == set(other)
+
+    def get_key_array(self) -> np.ndarray:
+        """Returns the sorted packed records of all level vectors in the set (rebuilt only after modifications).
+
+        :return: Numpy array of packed records.
+        """
+        if self.key_array is None:
+            records = b"".join(key.to_bytes(self.dim, 'big') for key in sorted(self.keys))
+            self.key_array = np.frombuffer(records, dtype=np.dtype((np.void, self.dim))).copy()
+        return self.key_array
+
+    def get_levelvectors(self) -> np.ndarray:
+        """Returns all level vectors of the set in lexicographic order.
+
+        :return: Integer array of shape (number of level vectors, dim).
+        """
+        return self.get_key_array().view(np.uint8).reshape(-1, self.dim).astype(int)
+
+    def contains(self, levelvectors: Sequence[Sequence[int]]) -> np.ndarray:
+        """Vectorized membership test.
+
+        :param levelvectors: Array of level vectors with shape (number of level vectors, dim).
+        :return: Boolean array which is True for the level vectors contained in the set.
+        """
+        levelvectors = np.asarray(levelvectors, dtype=int).reshape(-1, self.dim)
+        # level vectors that cannot be packed are never contained
+        valid = np.all((levelvectors >= 0) & (levelvectors <= self.max_level), axis=1)
+        result = np.zeros(len(levelvectors), dtype=bool)
+        key_array = self.get_key_array()
+        if len(key_array) == 0 or not np.any(valid):
+            return result
+        records = self.pack_array(levelvectors[valid])
+        positions = np.minimum(np.searchsorted(key_array, records), len(key_array) - 1)
+        result[valid] = key_array[positions] == records
+        return result
+
+    def has_forward_neighbours(self, levelvectors: Sequence[Sequence[int]]) -> np.ndarray:
+        """Checks for each level vector if at least one of its forward neighbours (l + e_d) is in the set.
+
+        :param levelvectors: Array of level vectors with shape (number of level vectors, dim).
+        :return: Boolean array with the result for each level vector.
+        """
+        levelvectors = np.asarray(levelvectors, dtype=int).reshape(-1, self.dim)
+        result = np.zeros(len(levelvectors), dtype=bool)
+        for d in range(self.dim):
+            neighbours = levelvectors.copy()
+            neighbours[:, d] += 1
+            result |= self.contains(neighbours)
+        return result
+
+    def is_backward_closed(self, levelvectors: Sequence[Sequence[int]], lmin: int) -> np.ndarray:
+        """Checks for each level vector if all of its backward neighbours (l - e_d with l_d > lmin) are in the set.
+
+        :param levelvectors: Array of level vectors with shape (number of level vectors, dim).
+        :param lmin: Minimum level of the scheme (integer or level vector).
+        :return: Boolean array with the result for each level vector.
+        """
+        levelvectors = np.asarray(levelvectors, dtype=int).reshape(-1, self.dim)
+        lmin = np.broadcast_to(lmin, self.dim)
+        result = np.ones(len(levelvectors), dtype=bool)
+        for d in range(self.dim):
+            neighbours = levelvectors.copy()
+            neighbours[:, d] -= 1
+            result &= (levelvectors[:, d] <= lmin[d]) | self.contains(neighbours)
+        return result
+
+    def is_downward_closed(self, lmin: int) -> bool:
+        """Checks if the set is downward closed, i.e. all backward neighbours of all level vectors are in the set.
+
+        :param lmin: Minimum level of the scheme (integer or level vector).
+        :return: True if the set is downward closed.
+        """
+        return bool(np.all(self.is_backward_closed(self.get_levelvectors(), lmin)))
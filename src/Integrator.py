@@ -10,6 +10,15 @@ class IntegratorBase(object):
     def __call__(self, f: Callable[[Tuple[int, ...]], float], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
         pass
 
+    # indicates whether the integrator can integrate given function values at the grid points (see integrate_values)
+    def supports_value_integration(self) -> bool:
+        return False
+
+    # integrates the function values at the points of the grid (one row per point ordered like grid.getPoints());
+    # this is used if the values are already known (e.g. gathered from an EvaluationPlan)
+    def integrate_values(self, values: Sequence[Sequence[float]], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        raise NotImplementedError("The integrator has to evaluate the function itself")
+
 # This integrator computes the trapezoidal rule for the given interval without constructing the grid explicitly
 class IntegratorTrapezoidalFast(IntegratorBase):
     def __call__(self, f: Callable[[Tuple[float, ...]], float], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
@@ -116,6 +125,15 @@ class IntegratorArbitraryGrid(IntegratorBase):
         position = self.grid.getCoordinate(indexvector)
         return f(position) * weight
 
+    def supports_value_integration(self) -> bool:
+        return True
+
+    def integrate_values(self, values: Sequence[Sequence[float]], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        # the weights are ordered like the points of the grid
+        if len(values) == 0:
+            return 0.0
+        return np.inner(np.transpose(values), self.grid.get_weights())
+
 
 # This integrator computes the integral of an arbitrary grid from the Grid class
 # using the predefined interfaces and weights. The grid is explicitly constructed and efficiently evaluated using numpy.
@@ -139,6 +157,14 @@ class IntegratorArbitraryGridScalarProduct(IntegratorBase):
         else:
             return np.inner(f_values, weights)
 
+    def supports_value_integration(self) -> bool:
+        return True
+
+    def integrate_values(self, values: Sequence[Sequence[float]], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        if len(values) == 0:
+            return 0.0
+        return np.inner(np.transpose(values), self.grid.get_weights())
+
 '''
 #This integrator computes the integral of an arbitrary grid from the Grid class
 #using the predefined interfaces and weights. The grid is not explicitly constructed.
@@ -265,6 +291,17 @@ class IntegratorHierarchicalBasisFunctions(IntegratorBase):
             v = f(point)
             assert len(v) == output_dim, "The Function returned a wrong output length"
             grid_values[:, i] = v
+        return self.integrate_grid_values(grid_values, numPoints)
+
+    def supports_value_integration(self) -> bool:
+        return True
+
+    def integrate_values(self, values: Sequence[Sequence[float]], numPoints: Sequence[int], start: Sequence[float], end: Sequence[float]) -> Sequence[float]:
+        # the values are hierarchized in place so a copy with one row per output component is used
+        grid_values = np.array(np.transpose(values), dtype=float).reshape(-1, int(np.prod(numPoints)))
+        return self.integrate_grid_values(grid_values, numPoints)
+
+    def integrate_grid_values(self, grid_values: Sequence[Sequence[float]], numPoints: Sequence[int]) -> Sequence[float]:
         self.surplus_values = self.hierarchization(grid_values, numPoints, self.grid)
         weights = self.grid.get_weights()
         #print(sum(weights), np.prod(np.array(end) - np.array(start)), start,end, weights, self.grid.weights)
@@ -0,0 +1,105 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from typing import Sequence, Tuple
+
+
+class MultilinearInterpolator(object):
+    """This class interpolates values given on a full tensor product mesh with multilinear interpolation. All output
+    components are interpolated at once: for each evaluation point the enclosing cell is located once per dimension
+    (binary search) and the 2^d corner weights are applied to all components in one sparse matrix product. The
+    interpolator can be kept and reused for repeated queries on the same component grid.
+
+    """
+
+    def __init__(self, mesh_points_grid: Sequence[Sequence[float]], values: Sequence[Sequence[float]]):
+        """
+
+        :param mesh_points_grid: Grid definition where values are placed. List of (strictly ascending) 1D arrays.
+        :param values: Values at the mesh points (ordered like get_cross_product). Each value is again a numpy array.
+        """
+        self.mesh_points_grid = [np.asarray(mesh_points_1D, dtype=float) for mesh_points_1D in mesh_points_grid]
+        self.dim = len(self.mesh_points_grid)
+        self.num_points = [len(mesh_points_1D) for mesh_points_1D in self.mesh_points_grid]
+        self.values = np.asarray(values, dtype=float).reshape(int(np.prod(self.num_points)), -1)
+        # offsets of the dimensions in the flattened (row-major) mesh
+        self.strides = [int(np.prod(self.num_points[d + 1:])) for d in range(self.dim)]
+
+    def __call__(self, evaluation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
+        """Interpolates all output components at the evaluation points.
+
+        :param evaluation_points: Points at which we want to evaluate. List of points.
+        :return: Numpy array with one row per evaluation point and one column per output component.
+        """
+        return np.asarray(self.get_weight_matrix(evaluation_points).dot(self.values))
+
+    def gradient(self, evaluation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[Sequence[float]]]:
+        """Computes the gradient of the (piecewise) multilinear interpolant of all output components at the evaluation
+        points. At mesh points the derivative of the cell to the right is returned (one-sided derivative).
+
+        :param evaluation_points: Points at which we want to evaluate. List of points.
+        :return: Numpy array of shape (number of evaluation points, number of output components, dim).
+        """
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)
+        gradient = np.zeros((len(evaluation_points), self.values.shape[1], self.dim))
+        for d in range(self.dim):
+            gradient[:, :, d] = self.get_weight_matrix(evaluation_points, derivative_dim=d).dot(self.values)
+        return gradient
+
+    def hessian_diag(self, evaluation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[Sequence[float]]]:
+        """Computes the second derivatives d^2/dx_d^2 of the interpolant. The interpolant is linear in each coordinate
+        inside a cell so they vanish (apart from the kinks at the mesh points).
+
+        :param evaluation_points: Points at which we want to evaluate. List of points.
+        :return: Numpy array of shape (number of evaluation points, number of output components, dim).
+        """
+        return np.zeros((len(np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)), self.values.shape[1], self.dim))
+
+    def get_weight_matrix(self, evaluation_points: Sequence[Tuple[float, ...]], derivative_dim: int=None) -> csr_matrix:
+        """Computes the sparse matrix that maps the values at the mesh points to the interpolated values at the
+        evaluation points. Each row contains the 2^d weights of the corners of the cell enclosing the point.
+
+        :param evaluation_points: Points at which we want to evaluate. List of points.
+        :param derivative_dim: If specified, the weights of the partial derivative in this dimension are computed.
+        :return: Sparse matrix with shape (number of evaluation points, number of mesh points).
+        """
+        evaluation_points = np.asarray(evaluation_points, dtype=float).reshape(-1, self.dim)
+        num_evaluation_points = len(evaluation_points)
+        lower_indices = []
+        upper_indices = []
+        upper_weights = []
+        lower_weights = []
+        for d in range(self.dim):
+            mesh_points_1D = self.mesh_points_grid[d]
+            points_d = evaluation_points[:, d]
+            if np.any(points_d < mesh_points_1D[0]) or np.any(points_d > mesh_points_1D[-1]):
+                raise ValueError("One of the requested xi is out of bounds in dimension %d" % d)
+            if len(mesh_points_1D) == 1:
+                lower_indices.append(np.zeros(num_evaluation_points, dtype=int))
+                upper_indices.append(np.zeros(num_evaluation_points, dtype=int))
+                upper_weights.append(np.zeros(num_evaluation_points))
+                lower_weights.append(np.zeros(num_evaluation_points) if d == derivative_dim else np.ones(num_evaluation_points))
+                continue
+            cell_indices = np.clip(np.searchsorted(mesh_points_1D, points_d, side='right') - 1, 0, len(mesh_points_1D) - 2)
+            left = mesh_points_1D[cell_indices]
+            right = mesh_points_1D[cell_indices + 1]
+            lower_indices.append(cell_indices)
+            upper_indices.append(cell_indices + 1)
+            if d == derivative_dim:
+                upper_weights.append(1 / (right - left))
+                lower_weights.append(-1 / (right - left))
+            else:
+                upper_weights.append((points_d - left) / (right - left))
+                lower_weights.append(1 - upper_weights[-1])
+        num_corners = 2 ** self.dim
+        columns = np.zeros((num_evaluation_points, num_corners), dtype=np.int64)
+        weights = np.ones((num_evaluation_points, num_corners))
+        for corner in range(num_corners):
+            for d in range(self.dim):
+                if (corner >> (self.dim - 1 - d)) & 1:
+                    columns[:, corner] += upper_indices[d] * self.strides[d]
+                    weights[:, corner] *= upper_weights[d]
+                else:
+                    columns[:, corner] += lower_indices[d] * self.strides[d]
+                    weights[:, corner] *= lower_weights[d]
+        rows = np.repeat(np.arange(num_evaluation_points), num_corners)
+        return csr_matrix((weights.ravel(), (rows, columns.ravel())), shape=(num_evaluation_points, len(self.values)))
@@ -8,6 +8,8 @@ def performTestStandard(f, a, b, grid, lmin, maxLmax, dim, reference_solution, e
     distinctFEvalArray = []
     operation = Integration(f, grid, dim, reference_solution)
     standardCombi = StandardCombi(a, b, operation=operation)
+    # component grids of smaller lmax are reused; for nested grids the distinct points are the same as for a new run
+    standardCombi.set_incremental_operation(grid.isNested())
     interpolation_errorL2 = []
     interpolation_errorMax = []
     for i in range(lmin + 1, lmin + maxLmax):
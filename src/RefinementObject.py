@@ -324,6 +324,11 @@ class RefinementObjectExtendSplit(RefinementObject):
                 contained_points.append(p)
         return contained_points
 
+    # returns a boolean mask which marks the points (array of shape (number of points, dim)) that lie in the area
+    def contains_points(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, self.dim)
+        return np.all((points >= np.asarray(self.start)) & (points <= np.asarray(self.end)), axis=1)
+
 
 # This is the special class for the RefinementObject defined in the split extend scheme
 class RefinementObjectCell(RefinementObject):
@@ -337,10 +342,12 @@ class RefinementObjectCell(RefinementObject):
         self.start = start
         # end of subarea
         self.end = end
-        self.cell_dict = cell_dict
-        self.cell_dict[self.get_key()] = self
         self.dim = len(start)
         self.levelvec = np.array(levelvec, dtype=int)
+        # integer position of the cell among the cells with the same level vector
+        self.index = CellIndex.get_cell_index(self.start, self.end, self.a, self.b)[1]
+        self.cell_dict = cell_dict
+        self.cell_dict[self.get_key()] = self
         # print("levelvec", self.levelvec)
         self.level = sum(levelvec) - self.dim + 1
         # self.father = father
@@ -352,14 +359,12 @@ class RefinementObjectCell(RefinementObject):
         self.sub_integrals = []
         self.value = None
         for d in range(self.dim):
-            parent = RefinementObjectCell.parent_cell_arbitrary_dim(d, self.levelvec, self.start, self.end, self.a,
-                                                                    self.b, self.lmin)
-            if parent is not None:
-                self.parents.append(parent)
-                if parent != father:
-                    # print(parent, RefinementObjectCell.cell_dict.items(), self.get_key(), father, self.levelvec)
-                    parent_object = self.cell_dict[parent]
-                    parent_object.add_child(self)
+            if self.levelvec[d] <= self.lmin[d]:
+                continue
+            parent_object = self.cell_dict.get_cell(*CellIndex.get_parent_index(self.get_index(), d))
+            self.parents.append(parent_object.get_key())
+            if parent_object.get_key() != father:
+                parent_object.add_child(self)
 
     def add_child(self, child):
         self.children.append(child)
@@ -367,6 +372,10 @@ class RefinementObjectCell(RefinementObject):
     def get_key(self):
         return tuple((tuple(self.start), tuple(self.end)))
 
+    # returns the integer key (levelvec, index) of the cell in the CellIndex
+    def get_index(self):
+        return tuple(int(l) for l in self.levelvec), tuple(self.index)
+
     def isActive(self):
         return self.active
 
@@ -385,6 +394,11 @@ class RefinementObjectCell(RefinementObject):
                 contained_points.append(p)
         return contained_points
 
+    # returns a boolean mask which marks the points (array of shape (number of points, dim)) that lie in the area
+    def contains_points(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, self.dim)
+        return np.all((points >= np.asarray(self.start)) & (points <= np.asarray(self.end)), axis=1)
+
     def is_corner(self, point):
         is_corner = True
         for d in range(self.dim):
@@ -398,24 +412,22 @@ class RefinementObjectCell(RefinementObject):
         self.active = False
         new_objects = []
         for d in range(self.dim):
-            levelvec_copy = list(self.levelvec)
-            levelvec_copy[d] += 1
-            possible_candidates_d = RefinementObjectCell.children_cell_arbitrary_dim(d, self.start, self.end, self.dim)
-            for candidate in possible_candidates_d:
-                if candidate in self.cell_dict:
+            for child_index in CellIndex.get_children_index(self.get_index(), d):
+                if child_index in self.cell_dict.cells:
                     continue
-                # print("candidate", candidate)
-                # key = candidate.get_key()
+                # a cell can only be created if all its parents exist and are refined
                 can_be_refined = True
-                for parent in RefinementObjectCell.get_parents(levelvec_copy, candidate[0], candidate[1], self.a,
-                                                               self.b, self.dim, self.lmin):
-                    if parent not in self.cell_dict or self.cell_dict[
-                            parent].isActive():
+                for d2 in range(self.dim):
+                    if child_index[0][d2] <= self.lmin[d2]:
+                        continue
+                    parent = self.cell_dict.get_cell(*CellIndex.get_parent_index(child_index, d2))
+                    if parent is None or parent.isActive():
                         can_be_refined = False
                         break
                 if can_be_refined:
+                    start, end = self.cell_dict.get_start_end(*child_index)
                     new_objects.append(
-                        RefinementObjectCell(candidate[0], candidate[1], list(levelvec_copy), self.a, self.b, self.lmin, cell_dict=self.cell_dict,
+                        RefinementObjectCell(start, end, list(child_index[0]), self.a, self.b, self.lmin, cell_dict=self.cell_dict,
                                              father=self.get_key()))
 
         self.children.extend(new_objects)
@@ -463,7 +475,7 @@ class RefinementObjectCell(RefinementObject):
         levelvec_parent[d] = levelvec_parent[d] - 1
         parent_start = np.array(start)
         parent_end = np.array(end)
-        index_of_start = start[d] * 2 ** levelvec[d]
+        index_of_start = int(round((start[d] - a[d]) / (b[d] - a[d]) * 2 ** levelvec[d]))
         if index_of_start % 2 == 1:  # start needs to be changed
             parent_start[d] = parent_end[d] - (b[d] - a[d]) / 2 ** levelvec_parent[d]
         else:  # end needs to be changed
@@ -605,3 +617,149 @@ class RefinementObjectSingleDimension(RefinementObject):
         #coordinate = (coordinate + 1 + self.a[d]) / (2 * (self.b[d] - self.a[d]))
         print("Transformed", coordinate, coordinate_normalized)
         return coordinate
+
+
+# This class is the hierarchical index of the dyadic cells of the cell based schemes. Each cell is addressed by the
+# integer key (levelvec, index) where index is the position of the cell in the regular grid of cells with the same
+# level vector. For compatibility the cells can also be accessed with their geometric key (start, end).
+class CellIndex(object):
+    def __init__(self, a, b):
+        self.a = np.array(a, dtype=float)
+        self.b = np.array(b, dtype=float)
+        self.dim = len(self.a)
+        # (levelvec, index) -> cell
+        self.cells = {}
+        # levelvec -> {index: cell}
+        self.levels = {}
+        # levelvec -> sorted linear indices and corresponding cells (built lazily for the batched queries)
+        self.level_arrays = {}
+
+    # computes the integer key (levelvec, index) of the cell [start, end] in the domain [a, b]
+    @staticmethod
+    def get_cell_index(start, end, a, b):
+        width = np.asarray(end, dtype=float) - np.asarray(start, dtype=float)
+        levelvec = np.rint(np.log2((np.asarray(b, dtype=float) - np.asarray(a, dtype=float)) / width)).astype(int)
+        index = np.rint((np.asarray(start, dtype=float) - np.asarray(a, dtype=float)) / width).astype(int)
+        return tuple(int(l) for l in levelvec), tuple(int(i) for i in index)
+
+    # returns the keys of the two children of the cell with the given key in dimension d
+    @staticmethod
+    def get_children_index(cell_index, d):
+        levelvec, index = cell_index
+        levelvec_child = levelvec[:d] + (levelvec[d] + 1,) + levelvec[d+1:]
+        return [(levelvec_child, index[:d] + (2 * index[d] + i,) + index[d+1:]) for i in range(2)]
+
+    # returns the key of the parent of the cell with the given key in dimension d
+    @staticmethod
+    def get_parent_index(cell_index, d):
+        levelvec, index = cell_index
+        return levelvec[:d] + (levelvec[d] - 1,) + levelvec[d+1:], index[:d] + (index[d] // 2,) + index[d+1:]
+
+    def get_start_end(self, levelvec, index):
+        width = (self.b - self.a) / 2.0 ** np.asarray(levelvec)
+        start = self.a + np.asarray(index) * width
+        return start, start + width
+
+    def get_cell(self, levelvec, index):
+        return self.cells.get((tuple(levelvec), tuple(index)), None)
+
+    def add_cell(self, cell):
+        levelvec, index = cell.get_index()
+        self.cells[(levelvec, index)] = cell
+        self.levels.setdefault(levelvec, {})[index] = cell
+        self.level_arrays.pop(levelvec, None)
+
+    # mapping interface with the geometric keys (start, end)
+    def __getitem__(self, key):
+        return self.cells[CellIndex.get_cell_index(key[0], key[1], self.a, self.b)]
+
+    def __setitem__(self, key, cell):
+        assert CellIndex.get_cell_index(key[0], key[1], self.a, self.b) == cell.get_index()
+        self.add_cell(cell)
+
+    def __contains__(self, key):
+        return CellIndex.get_cell_index(key[0], key[1], self.a, self.b) in self.cells
+
+    def __iter__(self):
+        return (cell.get_key() for cell in self.cells.values())
+
+    def __len__(self):
+        return len(self.cells)
+
+    def values(self):
+        return self.cells.values()
+
+    def items(self):
+        return ((cell.get_key(), cell) for cell in self.cells.values())
+
+    # returns all cells that contain the point (points on the boundary are contained in all adjacent cells). The cells
+    # are found by descending from the root cell where in each dimension only the (at most two) children containing
+    # the point are visited.
+    def get_cells_to_point(self, point):
+        position = (np.asarray(point, dtype=float) - self.a) / (self.b - self.a)
+        if np.any(position < 0) or np.any(position > 1):
+            return []
+        root_index = (tuple([0] * self.dim), tuple([0] * self.dim))
+        if root_index not in self.cells:
+            return []
+        stack = [root_index]
+        visited = set(stack)
+        cells = []
+        while stack:
+            cell_index = stack.pop()
+            cells.append(self.cells[cell_index])
+            for d in range(self.dim):
+                for child_index in CellIndex.get_children_index(cell_index, d):
+                    if child_index in visited or child_index not in self.cells:
+                        continue
+                    # position of the point relative to the child cell in dimension d
+                    position_d = position[d] * 2 ** child_index[0][d] - child_index[1][d]
+                    if 0 <= position_d <= 1:
+                        visited.add(child_index)
+                        stack.append(child_index)
+        return cells
+
+    # assigns all points to cells for each level vector at once. For each level vector the result contains the array
+    # with the position of the cell of every point in the list of cells of this level vector (-1 if there is no such
+    # cell). Each point is assigned to at most one cell per level vector; points on a common boundary of several cells
+    # are assigned to one of the existing cells.
+    def get_cells_to_points(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, self.dim)
+        position = (points - self.a) / (self.b - self.a)
+        in_domain = np.all((position >= 0) & (position <= 1), axis=1)
+        result = {}
+        for levelvec in self.levels:
+            num_cells = 2 ** np.asarray(levelvec)
+            # the cells with the lower and upper index only differ for points on a cell boundary
+            lower_index = np.clip(np.ceil(position * num_cells).astype(int) - 1, 0, num_cells - 1)
+            upper_index = np.clip(np.floor(position * num_cells).astype(int), 0, num_cells - 1)
+            labels = self.get_labels(levelvec, lower_index)
+            labels[~in_domain] = -1
+            missing = np.flatnonzero((labels == -1) & in_domain & np.any(lower_index != upper_index, axis=1))
+            for choice in list(product([False, True], repeat=self.dim))[1:]:
+                if len(missing) == 0:
+                    break
+                labels[missing] = self.get_labels(levelvec, np.where(choice, upper_index[missing], lower_index[missing]))
+                missing = missing[labels[missing] == -1]
+            result[levelvec] = (labels, self.get_level_arrays(levelvec)[1])
+        return result
+
+    # returns the position of the cells with the given indices (array of shape (number of cells, dim)) in the list of
+    # cells of the level vector (-1 if the cell does not exist)
+    def get_labels(self, levelvec, indices):
+        linear_indices, cells = self.get_level_arrays(levelvec)
+        if len(indices) == 0:
+            return np.zeros(0, dtype=int)
+        linear_index = np.ravel_multi_index(indices.T, 2 ** np.asarray(levelvec))
+        labels = np.minimum(np.searchsorted(linear_indices, linear_index), len(linear_indices) - 1)
+        labels[linear_indices[labels] != linear_index] = -1
+        return labels
+
+    def get_level_arrays(self, levelvec):
+        if levelvec not in self.level_arrays:
+            num_cells = 2 ** np.asarray(levelvec)
+            indices = list(self.levels[levelvec].keys())
+            linear_indices = np.array([np.ravel_multi_index(index, num_cells) for index in indices], dtype=np.int64)
+            order = np.argsort(linear_indices)
+            self.level_arrays[levelvec] = (linear_indices[order], [self.levels[levelvec][indices[i]] for i in order])
+        return self.level_arrays[levelvec]
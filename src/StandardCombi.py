@@ -2,11 +2,66 @@ import matplotlib.pyplot as plt
 from matplotlib import cm
 from combiScheme import *
 from GridOperation import *
+from CombiSurrogate import *
+from Executor import *
+from Checkpoint import *
 import importlib
+import heapq
+import time
 import multiprocessing as mp
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 
+# combi object evaluated by the worker processes of the parallel evaluation; it is inherited (copy-on-write) when the
+# worker pool is forked so that the component grid data is shipped only once
+_worker_combi = None
+
+
+def _evaluate_task(shared_memory_name: str, shape: Tuple[int, int], start: int, end: int, component_grid_indices: Sequence[int]) -> Sequence[Sequence[float]]:
+    # evaluates the component grids with the given indices at the query points start:end which are read from shared
+    # memory and returns the sum of the results weighted with the combination coefficients
+    from multiprocessing import shared_memory
+    points_memory = shared_memory.SharedMemory(name=shared_memory_name)
+    try:
+        points = np.ndarray(shape, dtype=float, buffer=points_memory.buf)[start:end]
+        result = np.zeros((end - start, _worker_combi.operation.point_output_length()))
+        for i in component_grid_indices:
+            component_grid = _worker_combi.scheme[i]
+            result += _worker_combi.interpolate_points(points, component_grid) * component_grid.coefficient
+        del points
+    finally:
+        points_memory.close()
+    return result
+
+
+def _evaluate_operation_task(component_grid_indices: Sequence[int]) -> List[Tuple[int, object]]:
+    # applies the operation to the component grids with the given indices and returns their partial results
+    return [(i, _worker_combi.operation.evaluate_levelvec_partial(_worker_combi.scheme[i])) for i in component_grid_indices]
+
+
+def _evaluate_component_grid_task(component_grid: ComponentGridInfo) -> object:
+    # applies the operation to a single component grid and returns its partial result
+    return _worker_combi.operation.evaluate_levelvec_partial(component_grid)
+
+
+def _evaluate_rank_task(combi: 'StandardCombi', rank: int, component_grids: Sequence[ComponentGridInfo]) -> object:
+    # applies the operation of the rank to its component grids and reduces their partial results; only the combined
+    # result is reset so the state of the rank (e.g. cached function values) is kept
+    combi.operation.initialize_result()
+    partial_results = [combi.operation.evaluate_levelvec_partial(component_grid) for component_grid in component_grids]
+    return combi.operation.get_reduced_result(component_grids, partial_results)
+
+
+def _get_distinct_points_rank_task(combi: 'StandardCombi', rank: int, argument) -> int:
+    # returns the number of distinct points cached by the operation of the rank
+    return combi.operation.get_distinct_points()
+
+
+def _get_cached_points_rank_task(combi: 'StandardCombi', rank: int, argument) -> Sequence[Tuple[float, ...]]:
+    # returns the points cached by the operation of the rank
+    return combi.operation.get_cached_points()
+
+
 class StandardCombi(object):
     """This class implements the standard combination technique.
 
@@ -30,29 +85,467 @@ class StandardCombi(object):
         self.print_output = print_output
         assert (len(a) == len(b))
         self.operation = operation
-        self.do_parallel = True
         self.norm = norm
+        self.interpolators = {}
+        self.set_parallel_evaluation(False)
+        self.set_parallel_operation(False)
+        self.set_evaluation_planning(False)
+        self.set_incremental_operation(False)
+        self.executor = None
+        self.set_fault_tolerance(False)
 
     def __call__(self, interpolation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
         """This method evaluates the model at the specified interpolation points using the Combination Technique.
 
+        :param interpolation_points: List of points at which we want to evaluate/interpolate.
+        :return: List of values (each a numpy array)
+        """
+        if getattr(self, "do_parallel", False) and len(interpolation_points) > self.chunk_size:
+            return self.evaluate_parallel(interpolation_points)
+        return self.evaluate_serial(interpolation_points)
+
+    def evaluate_serial(self, interpolation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
+        """This method evaluates the model at the specified interpolation points in this process.
+
         :param interpolation_points: List of points at which we want to evaluate/interpolate.
         :return: List of values (each a numpy array)
         """
         interpolation = np.zeros((len(interpolation_points), self.operation.point_output_length()))
-        self.do_parallel = False
-        if self.do_parallel:
-            pool = mp.Pool(4)
-            interpolation_results = pool.starmap_async(self.get_multiplied_interpolation, [(interpolation_points, component_grid) for component_grid in self.scheme]).get()
-            pool.close()
-            pool.join()
-            for result in interpolation_results:
-                interpolation += result
+        for component_grid in self.scheme:
+            interpolation += self.interpolate_points(interpolation_points, component_grid) * component_grid.coefficient
+        return interpolation
+
+    def set_parallel_evaluation(self, do_parallel: bool=True, num_processes: int=None, chunk_size: int=4096) -> None:
+        """Configures the parallel evaluation of the combination (__call__). The evaluation uses a long-lived pool of
+        forked worker processes that is created on first use and reused until the combination scheme changes.
+
+        :param do_parallel: Specifies whether calls with more than chunk_size points are evaluated in parallel.
+        :param num_processes: Number of worker processes (default: number of cpus).
+        :param chunk_size: Number of points that are evaluated in one task.
+        :return: None
+        """
+        self.close_pool()
+        # the workers inherit the combi object by forking which is not available on all platforms
+        self.do_parallel = do_parallel and "fork" in mp.get_all_start_methods()
+        self.num_processes = num_processes if num_processes is not None else mp.cpu_count()
+        self.chunk_size = chunk_size
+
+    def set_parallel_operation(self, do_parallel: bool=True, num_processes: int=None) -> None:
+        """Configures the parallel execution of perform_operation. The component grids are distributed over a pool of
+        forked worker processes and the partial results are combined in the order of the scheme so the result is the
+        same as for the serial execution. This requires an operation that supports partial results (see
+        GridOperation.supports_partial_results); otherwise the operation is performed serially. The spatially adaptive
+        schemes evaluate the (component grid, area) pairs of each refinement step in parallel instead (see
+        SpatiallyAdaptivBase.compute_solutions_parallel).
+
+        :param do_parallel: Specifies whether the component grids are evaluated in parallel.
+        :param num_processes: Number of worker processes (default: number of cpus).
+        :return: None
+        """
+        self.do_parallel_operation = do_parallel and "fork" in mp.get_all_start_methods()
+        self.num_processes_operation = num_processes if num_processes is not None else mp.cpu_count()
+
+    def set_evaluation_planning(self, do_plan: bool=True, num_processes: int=1) -> None:
+        """Configures the planning of the model evaluations in perform_operation. The points of all component grids are
+        collected before the operation is performed, the model is evaluated once at each distinct point and the
+        component grids gather their values from the evaluated plan (see EvaluationPlan). This requires an operation that
+        supports evaluation planning (see GridOperation.supports_evaluation_planning).
+
+        :param do_plan: Specifies whether the model evaluations are planned.
+        :param num_processes: Number of (forked) processes for the model calls.
+        :return: None
+        """
+        self.do_evaluation_planning = do_plan
+        self.num_processes_evaluation = num_processes
+
+    def get_evaluation_plan(self, component_grids: Sequence[ComponentGridInfo]=None) -> EvaluationPlan:
+        """Collects the points of the component grids into an EvaluationPlan. The plan uses the level vectors (as
+        tuples) as keys.
+
+        :param component_grids: Component grids that are planned (default: all component grids of the scheme).
+        :return: EvaluationPlan of the component grids.
+        """
+        if component_grids is None:
+            component_grids = self.scheme
+        point_sets = {}
+        for component_grid in component_grids:
+            levelvector = tuple(component_grid.levelvector)
+            if levelvector not in point_sets:
+                self.grid.setCurrentArea(self.grid.a, self.grid.b, levelvector)
+                point_sets[levelvector] = self.grid.getPoints()
+        return EvaluationPlan(point_sets, self.dim)
+
+    def plan_operation(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> EvaluationPlan:
+        """Sets up the combination scheme and returns the plan of the model evaluations without evaluating the model.
+        This can be used to get the number of model calls of a combination in advance.
+
+        :param lmin: Minimum level of combination technique (integer or level vector).
+        :param lmax: Maximum level of combination technique (integer or level vector).
+        :param weights: Optional weights for a weighted combination scheme (see set_combi_parameters).
+        :return: EvaluationPlan of the scheme.
+        """
+        self.set_combi_parameters(lmin, lmax, weights)
+        return self.get_evaluation_plan()
+
+    def set_incremental_operation(self, do_incremental: bool=True) -> None:
+        """Configures perform_operation to store the partial result of each component grid keyed by its level vector
+        (see GridOperation.supports_partial_results). Later calls, e.g. with increasing lmax, only evaluate the
+        component grids that were not evaluated before and combine the stored results with the coefficients of the new
+        scheme. The operation is only initialized in the first call; afterwards only its combined result is reset (see
+        GridOperation.initialize_result), so cached function values are kept. Calling this method discards the stored
+        results which is necessary if the operation (e.g. the function) changed.
+
+        :param do_incremental: Specifies whether the partial results of the component grids are stored and reused.
+        :return: None
+        """
+        self.do_incremental_operation = do_incremental
+        self.partial_results = {}
+
+    def set_fault_tolerance(self, do_fault_tolerant: bool=True, timeout: float=None) -> None:
+        """Configures the fault-tolerant execution of perform_operation. Component grids whose evaluation raises an
+        exception or does not finish within timeout seconds after the start of the operation are skipped. The
+        combination coefficients are then recomputed for the largest downward closed subset of the index set of the
+        scheme that contains no skipped grid; component grids of this subset that get a non-zero coefficient are
+        evaluated as well. The skipped grids and the reasons are stored in skipped_component_grids. Slow grids can only
+        be abandoned if the grids are evaluated in parallel (see set_parallel_operation); in the serial execution grids
+        that are not started before the deadline are skipped. This requires an operation that supports partial results
+        (see GridOperation.supports_partial_results).
+
+        :param do_fault_tolerant: Specifies whether failing component grids are skipped.
+        :param timeout: Time in seconds after which the remaining component grids are skipped (None: no deadline).
+        :return: None
+        """
+        self.do_fault_tolerant_operation = do_fault_tolerant
+        self.fault_tolerance_timeout = timeout
+        self.skipped_component_grids = {}
+
+    def get_partial_results_fault_tolerant(self, component_grids: Sequence[ComponentGridInfo], deadline: float=None) -> Tuple[Dict[Tuple[int, ...], object], Dict[Tuple[int, ...], str]]:
+        """Computes the partial results of the specified component grids. Grids that raise an exception or are not
+        finished before the deadline are reported as failed instead.
+
+        :param component_grids: ComponentGridInfos of the component grids.
+        :param deadline: Time (see time.time) after which the remaining grids fail (None: no deadline).
+        :return: Partial results and failure reasons, each a dictionary with the level vectors (as tuples) as keys.
+        """
+        global _worker_combi
+        partial_results = {}
+        failures = {}
+        if getattr(self, "do_parallel_operation", False) and len(component_grids) > 1:
+            _worker_combi = self
+            pool = mp.get_context("fork").Pool(min(self.num_processes_operation, len(component_grids)))
+            try:
+                tasks = [(component_grid, pool.apply_async(_evaluate_component_grid_task, (component_grid,))) for component_grid in component_grids]
+                for component_grid, task in tasks:
+                    levelvector = tuple(component_grid.levelvector)
+                    try:
+                        partial_results[levelvector] = task.get(None if deadline is None else max(deadline - time.time(), 0))
+                    except mp.TimeoutError:
+                        failures[levelvector] = "deadline exceeded"
+                    except Exception as exception:
+                        failures[levelvector] = repr(exception)
+            finally:
+                # stragglers are abandoned
+                pool.terminate()
+                pool.join()
         else:
-            for component_grid in self.scheme:
-                interpolation += self.interpolate_points(interpolation_points, component_grid) * component_grid.coefficient
+            for component_grid in component_grids:
+                levelvector = tuple(component_grid.levelvector)
+                if deadline is not None and time.time() > deadline:
+                    failures[levelvector] = "deadline exceeded"
+                    continue
+                try:
+                    partial_results[levelvector] = self.operation.evaluate_levelvec_partial(component_grid)
+                except Exception as exception:
+                    failures[levelvector] = repr(exception)
+        return partial_results, failures
+
+    def evaluate_operation_fault_tolerant(self) -> None:
+        """Applies the operation to the component grids of the scheme (see set_fault_tolerance). If component grids fail,
+        they and all grids above them are removed from the index set and the scheme is replaced by the combination of
+        the remaining downward closed index set.
+
+        :return: None
+        """
+        deadline = None if self.fault_tolerance_timeout is None else time.time() + self.fault_tolerance_timeout
+        index_set = self.combischeme.get_downward_closure([component_grid.levelvector for component_grid in self.scheme], self.lmin)
+        self.skipped_component_grids = {}
+        partial_results = {}
+        scheme = self.scheme
+        while True:
+            new_grids = [component_grid for component_grid in scheme if tuple(component_grid.levelvector) not in partial_results]
+            if not new_grids:
+                break
+            new_results, failures = self.get_partial_results_fault_tolerant(new_grids, deadline)
+            partial_results.update(new_results)
+            if failures:
+                self.skipped_component_grids.update(failures)
+                # remove the failed grids and all grids above them -> the index set stays downward closed
+                levelvectors = index_set.get_levelvectors()
+                failed_levelvectors = np.array(list(failures), dtype=int)
+                is_above_failure = np.any(np.all(levelvectors[:, None, :] >= failed_levelvectors[None, :, :], axis=2), axis=1)
+                index_set = IndexSet(self.dim, levelvectors[~is_above_failure])
+                if len(index_set) == 0:
+                    raise RuntimeError("All component grids failed: " + str(self.skipped_component_grids))
+                scheme = sorted(self.combischeme.get_coefficients_to_index_set(index_set, self.lmin), key=lambda component_grid: tuple(component_grid.levelvector))
+        if self.skipped_component_grids:
+            self.scheme = scheme
+            self.interpolators = {}
+            self.close_pool()
+            if self.print_output:
+                print("Skipped component grids", self.skipped_component_grids)
+        for component_grid in self.scheme:
+            self.operation.add_partial_result(component_grid, partial_results[tuple(component_grid.levelvector)])
+
+    def set_executor(self, executor: Executor=None) -> None:
+        """Configures the distributed execution of perform_operation with an executor (e.g. LocalExecutor). The ranks of
+        the executor are started on first use with a copy of this combi object and keep their own operation, i.e. the
+        function values stay in the cache of the rank that computed them. The component grids are partitioned across the
+        ranks by their cost, each rank reduces the partial results of its grids and the rank results are reduced along
+        a tree. get_total_num_points counts the distinct points of the caches of all ranks. This requires an operation
+        that supports distributed operation (see GridOperation.supports_distributed_operation); otherwise the operation
+        is performed serially. The executor has to be set again if the operation is changed.
+
+        :param executor: Executor that runs the ranks or None to disable the distributed execution.
+        :return: None
+        """
+        if getattr(self, "executor", None) is not None and self.executor is not executor:
+            self.executor.close()
+        if executor is not None and executor.is_started():
+            executor.close()
+        self.executor = executor
+
+    def get_rank_partition(self, num_ranks: int) -> List[List[int]]:
+        """Partitions the component grids of the scheme across the ranks. The grids are assigned in order of decreasing
+        cost to the rank with the smallest load so far (longest processing time first). The grids of each rank are
+        ordered like the scheme.
+
+        :param num_ranks: Number of ranks.
+        :return: List with the indices of the component grids of each rank.
+        """
+        costs = [self.get_component_grid_cost(component_grid) for component_grid in self.scheme]
+        loads = [(0, rank) for rank in range(num_ranks)]
+        partition = [[] for _ in range(num_ranks)]
+        for i in sorted(range(len(self.scheme)), key=lambda i: (-costs[i], i)):
+            load, rank = heapq.heappop(loads)
+            partition[rank].append(i)
+            heapq.heappush(loads, (load + costs[i], rank))
+        return [sorted(indices) for indices in partition]
+
+    def evaluate_operation_distributed(self) -> None:
+        """Applies the operation to all component grids of the scheme on the ranks of the executor (see set_executor)
+        and adds the reduced result to the operation of this process.
+
+        :return: None
+        """
+        if not self.executor.is_started():
+            self.executor.start(self)
+        partition = self.get_rank_partition(self.executor.get_num_ranks())
+        rank_results = self.executor.run(_evaluate_rank_task, [[self.scheme[i] for i in indices] for indices in partition])
+        self.operation.add_reduced_result(self.executor.reduce(rank_results, self.operation.merge_reduced_results))
+
+    def get_rank_distinct_points(self) -> List[int]:
+        """Returns the number of distinct points in the function cache of each rank of the executor.
+
+        :return: List with the number of distinct points of each rank.
+        """
+        if self.executor is None or not self.executor.is_started():
+            return []
+        return self.executor.run(_get_distinct_points_rank_task, [None] * self.executor.get_num_ranks())
+
+    def get_distributed_distinct_points(self) -> int:
+        """Returns the number of distinct points in the function caches of all ranks of the executor and of this
+        process. Points that are cached on several ranks are counted once. If the operation does not provide its cached
+        points (see GridOperation.get_cached_points), the sum of the counts of the ranks is returned (upper bound).
+
+        :return: Number of distinct points.
+        """
+        rank_points = self.executor.run(_get_cached_points_rank_task, [None] * self.executor.get_num_ranks())
+        own_points = self.operation.get_cached_points()
+        if own_points is None or any(points is None for points in rank_points):
+            return sum(self.get_rank_distinct_points()) + self.operation.get_distinct_points()
+        return len(np.unique(np.vstack(rank_points + [own_points]), axis=0))
+
+    def get_component_grid_cost(self, component_grid: ComponentGridInfo) -> int:
+        """Returns the estimated cost of applying the operation to a component grid, i.e. its number of points. The
+        number of points of a (nested) grid with boundary points is used as it does not depend on the state of the grid.
+
+        :param component_grid: ComponentGridInfo of the component grid.
+        :return: Cost of the component grid.
+        """
+        return int(np.prod([2 ** int(l) + 1 for l in component_grid.levelvector]))
+
+    def get_operation_tasks(self, num_processes: int, component_grid_indices: Sequence[int]=None) -> List[List[int]]:
+        """Partitions the component grids of the scheme into tasks for the parallel operation. The grids are sorted by
+        decreasing cost and collected into tasks of at least a quarter of the average cost per process. The tasks are
+        returned in order of decreasing cost so the expensive grids are scheduled first and the cheap grids fill the
+        remaining gaps (longest processing time first).
+
+        :param num_processes: Number of worker processes.
+        :param component_grid_indices: Indices of the component grids that are evaluated (default: all grids).
+        :return: List of tasks, each a list of indices into the scheme.
+        """
+        if component_grid_indices is None:
+            component_grid_indices = range(len(self.scheme))
+        costs = {i: self.get_component_grid_cost(self.scheme[i]) for i in component_grid_indices}
+        order = sorted(costs, key=lambda i: (-costs[i], i))
+        target_cost = sum(costs.values()) / (4 * num_processes)
+        tasks = []
+        task = []
+        task_cost = 0
+        for i in order:
+            task.append(i)
+            task_cost += costs[i]
+            if task_cost >= target_cost:
+                tasks.append(task)
+                task = []
+                task_cost = 0
+        if task:
+            tasks.append(task)
+        return tasks
+
+    def evaluate_operation_parallel(self) -> None:
+        """Applies the operation to all component grids of the scheme with a pool of forked worker processes (see
+        set_parallel_operation). Each worker works on its own copy of the operation; the partial results are added to
+        the operation of this process in the order of the scheme.
+
+        :return: None
+        """
+        partial_results = self.get_partial_results_parallel(range(len(self.scheme)))
+        # deterministic reduction: same summation order as the serial evaluation
+        for i, component_grid in enumerate(self.scheme):
+            self.operation.add_partial_result(component_grid, partial_results[i])
+
+    def get_partial_results_parallel(self, component_grid_indices: Sequence[int]) -> Dict[int, object]:
+        """Computes the partial results of the specified component grids with a pool of forked worker processes.
+
+        :param component_grid_indices: Indices of the component grids in the scheme.
+        :return: Dictionary that maps the index of each component grid to its partial result.
+        """
+        global _worker_combi
+        tasks = self.get_operation_tasks(self.num_processes_operation, component_grid_indices)
+        partial_results = {}
+        if not tasks:
+            return partial_results
+        _worker_combi = self
+        with mp.get_context("fork").Pool(min(self.num_processes_operation, len(tasks))) as pool:
+            for results in pool.imap_unordered(_evaluate_operation_task, tasks):
+                for i, partial_result in results:
+                    partial_results[i] = partial_result
+        return partial_results
+
+    def evaluate_operation_incremental(self) -> None:
+        """Applies the operation to the component grids of the scheme that have no stored partial result yet (see
+        set_incremental_operation) and combines the stored partial results of all component grids in the order of the
+        scheme.
+
+        :return: None
+        """
+        new_grids = [i for i, component_grid in enumerate(self.scheme) if tuple(component_grid.levelvector) not in self.partial_results]
+        if getattr(self, "do_parallel_operation", False) and len(new_grids) > 1:
+            partial_results = self.get_partial_results_parallel(new_grids)
+        else:
+            partial_results = {i: self.operation.evaluate_levelvec_partial(self.scheme[i]) for i in new_grids}
+        new_partial_results = {tuple(self.scheme[i].levelvector): partial_result for i, partial_result in partial_results.items()}
+        for component_grid in self.scheme:
+            levelvector = tuple(component_grid.levelvector)
+            if levelvector in new_partial_results:
+                self.operation.add_partial_result(component_grid, new_partial_results[levelvector])
+                # only the part that is not contained in the operation (e.g. in the function cache) is stored
+                self.partial_results[levelvector] = self.operation.compact_partial_result(new_partial_results[levelvector])
+            else:
+                self.operation.add_partial_result(component_grid, self.partial_results[levelvector])
+
+    def close_pool(self) -> None:
+        """Terminates the worker pool of the parallel evaluation. It has to be called (or is called automatically)
+        whenever the combination changes after the pool was created.
+
+        :return: None
+        """
+        pool = getattr(self, "pool", None)
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        self.pool = None
+        self.pool_scheme = None
+
+    def get_pool(self) -> mp.pool.Pool:
+        """Returns the worker pool of the parallel evaluation. A new pool is forked if the combination scheme changed
+        since the last pool was created.
+
+        :return: Worker pool.
+        """
+        global _worker_combi
+        pool_scheme = tuple((tuple(component_grid.levelvector), component_grid.coefficient) for component_grid in self.scheme)
+        if getattr(self, "pool", None) is None or self.pool_scheme != pool_scheme:
+            self.close_pool()
+            # everything the workers need is prepared before forking so that it is shared with all workers
+            self.prepare_interpolators()
+            _worker_combi = self
+            # the workers share the resource tracker of this process which then handles the shared memory segments
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+            self.pool = mp.get_context("fork").Pool(self.num_processes)
+            self.pool_scheme = pool_scheme
+        return self.pool
+
+    def prepare_interpolators(self) -> None:
+        """Creates the interpolators of all component grids of the scheme.
+
+        :return: None
+        """
+        for component_grid in self.scheme:
+            self.get_component_grid_interpolator(component_grid)
+
+    def evaluate_parallel(self, interpolation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[float]]:
+        """This method evaluates the model at the specified interpolation points with the worker pool. The points are
+        placed in shared memory and the work is partitioned into point chunks and blocks of component grids. The partial
+        results are reduced in a fixed order so the result does not depend on the scheduling of the tasks. Without
+        shared memory (Python < 3.8) the points are evaluated serially.
+
+        :param interpolation_points: List of points at which we want to evaluate/interpolate.
+        :return: List of values (each a numpy array)
+        """
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            return self.evaluate_serial(interpolation_points)
+        points = np.asarray(interpolation_points, dtype=float).reshape(len(interpolation_points), self.dim)
+        pool = self.get_pool()
+        chunks = [(start, min(start + self.chunk_size, len(points))) for start in range(0, len(points), self.chunk_size)]
+        # if there are fewer chunks than processes the component grids are distributed as well
+        num_blocks = max(1, min(len(self.scheme), -(-self.num_processes // len(chunks))))
+        blocks = [list(block) for block in np.array_split(np.arange(len(self.scheme)), num_blocks)]
+        points_memory = shared_memory.SharedMemory(create=True, size=max(points.nbytes, 1))
+        try:
+            shared_points = np.ndarray(points.shape, dtype=float, buffer=points_memory.buf)
+            shared_points[:] = points
+            tasks = [(points_memory.name, points.shape, start, end, block) for start, end in chunks for block in blocks]
+            results = pool.starmap(_evaluate_task, tasks)
+            del shared_points
+        finally:
+            points_memory.close()
+            points_memory.unlink()
+        interpolation = np.zeros((len(points), self.operation.point_output_length()))
+        for task, result in zip(tasks, results):
+            interpolation[task[2]:task[3]] += result
         return interpolation
 
+    def __getstate__(self):
+        # the worker pool and the ranks of the executor cannot be pickled (e.g. when storing the object with
+        # save_to_file); a stored executor has to be set again. The transient caches (interpolators, partial results
+        # and interpolated evaluation points) are not stored; they are rebuilt when they are needed.
+        state = self.__dict__.copy()
+        state["pool"] = None
+        state["pool_scheme"] = None
+        if state.get("executor") is not None:
+            state["executor"] = None
+        state["interpolators"] = {}
+        if "partial_results" in state:
+            state["partial_results"] = {}
+        if "evaluation_contributions" in state:
+            state["evaluation_contributions"] = None
+        return state
+
     def interpolate_points(self, interpolation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo):
         """This method evaluates the model at the specified interpolation points on the specified component grid.
 
@@ -60,21 +553,126 @@ class StandardCombi(object):
         :param component_grid: ComponentGridInfo of the specified component grid.
         :return: List of values (each a numpy array)
         """
+        return self.get_component_grid_interpolator(component_grid)(interpolation_points)
+
+    def gradient(self, interpolation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[Sequence[float]]]:
+        """This method evaluates the gradient of the combination interpolant at the specified points. The derivatives
+        are computed analytically from the component grid interpolants (piecewise linear derivatives for d-linear
+        interpolation and basis function derivatives for basis grids).
+
+        :param interpolation_points: Points at which we want to evaluate the gradient. Array of shape
+                                     (number of points, dim).
+        :return: Numpy array of shape (number of points, output length, dim)
+        """
+        return self.get_combined_derivatives(interpolation_points, 1)
+
+    def hessian_diag(self, interpolation_points: Sequence[Tuple[float, ...]]) -> Sequence[Sequence[Sequence[float]]]:
+        """This method evaluates the diagonal of the Hessian (second derivatives d^2/dx_d^2) of the combination
+        interpolant at the specified points.
+
+        :param interpolation_points: Points at which we want to evaluate the derivatives. Array of shape
+                                     (number of points, dim).
+        :return: Numpy array of shape (number of points, output length, dim)
+        """
+        return self.get_combined_derivatives(interpolation_points, 2)
+
+    def get_combined_derivatives(self, interpolation_points: Sequence[Tuple[float, ...]], derivative: int) -> Sequence[Sequence[Sequence[float]]]:
+        interpolation_points = np.asarray(interpolation_points, dtype=float).reshape(-1, self.dim)
+        result = np.zeros((len(interpolation_points), self.operation.point_output_length(), self.dim))
+        for component_grid in self.scheme:
+            result += self.interpolate_points_derivative(interpolation_points, component_grid, derivative) * component_grid.coefficient
+        return result
+
+    def interpolate_points_derivative(self, interpolation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo, derivative: int) -> Sequence[Sequence[Sequence[float]]]:
+        """This method evaluates the partial derivatives of the interpolant of the specified component grid.
+
+        :param interpolation_points: Points at which we want to evaluate the derivatives.
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :param derivative: Order of the partial derivatives (1: gradient, 2: diagonal of the Hessian).
+        :return: Numpy array of shape (number of points, output length, dim)
+        """
+        interpolator = self.get_component_grid_interpolator(component_grid)
+        if derivative == 1:
+            return interpolator.gradient(interpolation_points)
+        assert derivative == 2
+        return interpolator.hessian_diag(interpolation_points)
+
+    def get_component_grid_interpolator(self, component_grid: ComponentGridInfo) -> MultilinearInterpolator:
+        """This method returns the interpolator of the specified component grid. Interpolators are cached per component
+        grid so that repeated queries neither reevaluate the grid values nor rebuild the interpolator.
+
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :return: Interpolator that can be called with a list of points.
+        """
         self.grid.setCurrentArea(self.a, self.b, component_grid.levelvector)
-        return self.operation.interpolate_points(self.operation.get_component_grid_values(component_grid, self.grid.coordinate_array_with_boundary), mesh_points_grid=self.grid.coordinate_array_with_boundary,
-                                                 evaluation_points=interpolation_points)
+        mesh_points_grid = self.grid.coordinate_array_with_boundary
+        if not hasattr(self, "interpolators"):
+            self.interpolators = {}
+        key = (tuple(component_grid.levelvector), tuple(tuple(mesh_points_1D) for mesh_points_1D in mesh_points_grid))
+        if key not in self.interpolators:
+            values = self.operation.get_component_grid_values(component_grid, mesh_points_grid)
+            self.interpolators[key] = self.operation.get_interpolator(values, mesh_points_grid)
+        return self.interpolators[key]
+
+    def get_component_grid_mesh_and_values(self, component_grid: ComponentGridInfo) -> Tuple[Sequence[Sequence[float]], Sequence[Sequence[float]]]:
+        """This method returns the 1D coordinate arrays of the specified component grid and the values at its points
+        that define the (multilinear) interpolant of the component grid.
+
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :return: List of 1D coordinate arrays and array of values (ordered like get_cross_product).
+        """
+        interpolator = self.get_component_grid_interpolator(component_grid)
+        return interpolator.mesh_points_grid, interpolator.values
+
+    def supports_surrogate_export(self) -> bool:
+        """This method indicates whether the combination interpolant can be exported with export_surrogate. This
+        requires that every component grid is interpolated d-linearly on a single tensor product mesh (see
+        get_component_grid_mesh_and_values).
+
+        :return: Bool
+        """
+        return True
+
+    def export_surrogate(self) -> CombiSurrogate:
+        """This method freezes the combination into an immutable surrogate that only supports evaluating the combination
+        interpolant (see CombiSurrogate). The surrogate can be stored in a single memory mappable file. Only schemes
+        whose component grids are interpolated d-linearly on a single tensor product mesh are supported (see
+        supports_surrogate_export), i.e. not the area or cell based spatially adaptive schemes and not grids with
+        dedicated basis functions in the single dimension scheme.
+
+        :return: CombiSurrogate object.
+        """
+        if not self.supports_surrogate_export():
+            raise NotImplementedError("export_surrogate does not support the interpolation of " + type(self).__name__)
+        mesh_points_grids = []
+        values = []
+        for component_grid in self.scheme:
+            mesh_points_grid, values_component_grid = self.get_component_grid_mesh_and_values(component_grid)
+            mesh_points_grids.append(mesh_points_grid)
+            values.append(values_component_grid)
+        return CombiSurrogate.from_component_grids(self.a, self.b, [component_grid.coefficient for component_grid in self.scheme],
+                                                   [component_grid.levelvector for component_grid in self.scheme], mesh_points_grids, values)
 
-    def interpolate_grid(self, grid_coordinates: Sequence[Sequence[float]]) -> Sequence[Sequence[float]]:
-        """This method evaluates the model at the specified interpolation grid using the Combination Technique.
+    def interpolate_grid(self, grid_coordinates: Sequence[Sequence[float]], out: np.ndarray=None, chunk_size: int=2**16) -> Sequence[Sequence[float]]:
+        """This method evaluates the model at the specified interpolation grid using the Combination Technique. The grid
+        is processed in sub grids of at most chunk_size points so that only the result has to fit into memory.
 
         :param grid_coordinates: 1D grid coordinates where we want to evaluate/interpolate the model
+        :param out: Optional array (e.g. numpy memmap) of shape (number of grid points, output length) the result is
+                    written to.
+        :param chunk_size: Maximum number of grid points that are evaluated at once.
         :return: List of values (each a numpy array)
         """
-        num_points = np.prod([len(grid_d) for grid_d in grid_coordinates])
-        interpolation = np.zeros((num_points, self.operation.point_output_length()))
-        for component_grid in self.scheme:
-            interpolation += self.interpolate_grid_component(grid_coordinates, component_grid) * component_grid.coefficient
-        return interpolation
+        num_points = int(np.prod([len(grid_d) for grid_d in grid_coordinates]))
+        if out is None:
+            out = np.zeros((num_points, self.operation.point_output_length()))
+        for offset, block in get_grid_blocks(grid_coordinates, chunk_size):
+            num_points_block = int(np.prod([len(grid_d) for grid_d in block]))
+            interpolation = np.zeros((num_points_block, self.operation.point_output_length()))
+            for component_grid in self.scheme:
+                interpolation += self.interpolate_grid_component(block, component_grid) * component_grid.coefficient
+            out[offset:offset + num_points_block] = interpolation
+        return out
 
     def interpolate_grid_component(self, grid_coordinates: Sequence[Sequence[float]], component_grid: ComponentGridInfo) -> Sequence[Sequence[float]]:
         """This method evaluates the model at the specified interpolation grid on the specified component grid.
@@ -83,9 +681,40 @@ class StandardCombi(object):
         :param component_grid: ComponentGridInfo of the specified component grid.
         :return: List of values (each a numpy array)
         """
-        grid_points = list(get_cross_product(grid_coordinates))
+        grid_points = get_cross_product_array(grid_coordinates)
         return self.interpolate_points(grid_points, component_grid)
 
+    def evaluate_in_chunks(self, interpolation_points, chunk_size: int=2**16) -> Generator[Sequence[Sequence[float]], None, None]:
+        """This method evaluates the model at the interpolation points in chunks and yields the values chunk by chunk.
+        Only one chunk of points and values is held in memory at a time.
+
+        :param interpolation_points: Points at which we want to evaluate/interpolate. Array (or numpy memmap) of
+                                     shape (number of points, dim) or any iterable of points (e.g. a generator).
+        :param chunk_size: Maximum number of points that are evaluated at once.
+        :return: Generator of value arrays (one row per point of the chunk)
+        """
+        for chunk in get_point_chunks(interpolation_points, chunk_size):
+            yield self(chunk)
+
+    def evaluate_to_array(self, interpolation_points, out: np.ndarray=None, chunk_size: int=2**16) -> Sequence[Sequence[float]]:
+        """This method evaluates the model at the interpolation points in chunks and writes the values to out.
+
+        :param interpolation_points: Points at which we want to evaluate/interpolate. Array (or numpy memmap) of
+                                     shape (number of points, dim) or any iterable of points (e.g. a generator).
+        :param out: Optional array (e.g. numpy memmap) of shape (number of points, output length) the values are
+                    written to. If None, a new array is created (requires the number of points).
+        :param chunk_size: Maximum number of points that are evaluated at once.
+        :return: Array with the values
+        """
+        if out is None:
+            out = np.zeros((len(interpolation_points), self.operation.point_output_length()))
+        offset = 0
+        for values in self.evaluate_in_chunks(interpolation_points, chunk_size):
+            out[offset:offset + len(values)] = values
+            offset += len(values)
+        assert offset == len(out)
+        return out
+
     def get_multiplied_interpolation(self, interpolation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo):
         """Returns the interpolation result on specified component grid at interpolation points and multiplied by  combi
         coefficient.
@@ -158,37 +787,71 @@ class StandardCombi(object):
         # reset fontsize to default so it does not affect other figures
         plt.rcParams.update({'font.size': plt.rcParamsDefault.get('font.size')})
 
-    def set_combi_parameters(self, lmin: int, lmax: int) -> None:
-        """Initializes the combi parameters according to minimum and maximum level.
+    def set_combi_parameters(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> None:
+        """Initializes the combi parameters according to minimum and maximum level. If the levels differ between the
+        dimensions or weights are given an anisotropic or weighted scheme is used (see
+        CombiScheme.get_weighted_scheme_parameters).
 
-        :param lmin: Minimum level of combination technique.
-        :param lmax: Maximum level of combination technique.
+        :param lmin: Minimum level of combination technique (integer or level vector).
+        :param lmax: Maximum level of combination technique (integer or level vector).
+        :param weights: Optional weights w of the weighted index set sum_d w_d * (l_d - lmin_d) <= max(lmax - lmin).
         :return: None
         """
         # compute minimum and target level vector
-        self.lmin = [lmin for i in range(self.dim)]
-        self.lmax = [lmax for i in range(self.dim)]
+        self.lmin = [int(l) for l in np.broadcast_to(lmin, self.dim)]
+        self.lmax = [int(l) for l in np.broadcast_to(lmax, self.dim)]
         # get combi scheme
-        self.scheme = self.combischeme.getCombiScheme(lmin, lmax, self.print_output)
+        self.scheme = self.combischeme.getCombiScheme(lmin, lmax, self.print_output, weights=weights)
+        self.interpolators = {}
+        self.close_pool()
 
 
     # lmin = minimum level; lmax = target level
-    def perform_operation(self, lmin: int, lmax: int, plot:bool=False) -> Tuple[Sequence[ComponentGridInfo], float, Sequence[float]]:
+    def perform_operation(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], plot:bool=False, weights: Sequence[float]=None) -> Tuple[Sequence[ComponentGridInfo], float, Sequence[float]]:
         """This method performs the standard combination scheme for the chosen operation.
 
-        :param lmin: Minimum level of combination technique.
-        :param lmax: Maximum level of combination technique.
+        :param lmin: Minimum level of combination technique (integer or level vector).
+        :param lmax: Maximum level of combination technique (integer or level vector).
+        :param plot: Specifies whether the combination scheme and the sparse grid should be plotted.
+        :param weights: Optional weights for a weighted combination scheme (see set_combi_parameters).
         :return: Combination scheme, error, and combination result.
         """
         assert self.operation is not None
 
         # initializtation
-        self.set_combi_parameters(lmin, lmax)
-        self.operation.initialize()
+        self.set_combi_parameters(lmin, lmax, weights)
+        do_fault_tolerant = getattr(self, "do_fault_tolerant_operation", False) and self.operation.supports_partial_results()
+        do_distributed = not do_fault_tolerant and getattr(self, "executor", None) is not None and self.operation.supports_partial_results() and self.operation.supports_distributed_operation()
+        do_incremental = not do_fault_tolerant and not do_distributed and getattr(self, "do_incremental_operation", False) and self.operation.supports_partial_results()
+        if do_incremental and self.partial_results:
+            # stored partial results are reused -> only the combined result is reset
+            self.operation.initialize_result()
+        else:
+            self.operation.initialize()
+
+        # evaluate the model once at all distinct points of the (new) component grids
+        if getattr(self, "do_evaluation_planning", False) and self.operation.supports_evaluation_planning() and not do_distributed and not do_fault_tolerant:
+            if do_incremental:
+                evaluation_plan = self.get_evaluation_plan([component_grid for component_grid in self.scheme if tuple(component_grid.levelvector) not in self.partial_results])
+            else:
+                evaluation_plan = self.get_evaluation_plan()
+            num_model_calls = self.operation.get_num_model_calls(evaluation_plan)
+            if self.print_output:
+                print("Number of model calls", num_model_calls)
+            self.operation.evaluate_plan(evaluation_plan, self.num_processes_evaluation)
 
         # iterate over all component_grids and perform operation
-        for component_grid in self.scheme:  # iterate over component grids
-            self.operation.evaluate_levelvec(component_grid)
+        if do_fault_tolerant:
+            self.evaluate_operation_fault_tolerant()
+        elif do_distributed:
+            self.evaluate_operation_distributed()
+        elif do_incremental:
+            self.evaluate_operation_incremental()
+        elif getattr(self, "do_parallel_operation", False) and self.operation.supports_partial_results() and len(self.scheme) > 1:
+            self.evaluate_operation_parallel()
+        else:
+            for component_grid in self.scheme:  # iterate over component grids
+                self.operation.evaluate_levelvec(component_grid)
 
         # potential post processing after processing all component grids
         self.operation.post_processing()
@@ -236,6 +899,9 @@ class StandardCombi(object):
         :return: Total number of points.
         """
         if distinct_function_evals:
+            # in the distributed execution the function values are cached on the ranks
+            if getattr(self, "executor", None) is not None and self.executor.is_started():
+                return self.get_distributed_distinct_points()
             return self.operation.get_distinct_points()
         numpoints = 0
         for component_grid in self.scheme:
@@ -488,16 +1154,17 @@ class StandardCombi(object):
             for i in range(lmax[0] - lmin[0] + 1):
                 for j in range(lmax[1] - lmin[1] + 1):
                     ax[j, i].axis('off')
+            # subspaces of the sparse grid (this also covers anisotropic and weighted schemes)
+            if self.combischeme.initialized_adaptive:
+                sparse_index_set = self.combischeme.get_index_set()
+            else:
+                sparse_index_set = self.combischeme.get_downward_closure([component_grid.levelvector for component_grid in scheme], self.lmin)
             if sparse_grid_spaces:
-                if self.combischeme.initialized_adaptive:
-                    combischeme = self.combischeme
-                else:
-                    combischeme = CombiScheme(self.dim)
-                    combischeme.init_adaptive_combi_scheme(self.lmax[0], self.lmin[0])
+                levelvectors = sparse_index_set
             else:
                 combischeme = CombiScheme(self.dim)
-                combischeme.init_full_grid(self.lmax[0], self.lmin[0])
-            levelvectors = combischeme.get_index_set()
+                combischeme.init_full_grid(self.lmax, self.lmin)
+                levelvectors = combischeme.get_index_set()
             for levelvector in levelvectors:
                 points = self.get_points_component_grid(levelvector)
                 points_not_null = self.get_points_component_grid_not_null(levelvector)
@@ -544,7 +1211,7 @@ class StandardCombi(object):
                     points_y1 = self.get_points_component_grid(levelvector_y_1)
                     points_not_null = set(points_not_null) - set(points_y1)
                     points = set(points) - set(points_y1)
-                if sum(levelvector) > self.lmax[0] + (self.dim - 1) * self.lmin[0] and fade_full_grid:
+                if levelvector not in sparse_index_set and fade_full_grid:
                     color = 'lightgrey'
                 else:
                     color = 'black'
@@ -813,12 +1480,21 @@ class StandardCombi(object):
         pass
 
     @staticmethod
-    def restore_from_file(filename: str) -> 'StandardCombi':
-        """This method can be used to load a StandardCombi object (or a child class) from a file.
+    def restore_from_file(filename: str, load_function_caches: bool=True) -> 'StandardCombi':
+        """This method can be used to load a StandardCombi object (or a child class) from a file. Files in the
+        checkpoint format (see Checkpoint) and pickled objects of older versions are supported.
 
         :param filename: Specifies filename of combi object.
+        :param load_function_caches: Specifies whether the cached function evaluations are restored (only for the
+                                     checkpoint format).
         :return: StandardCombi object.
         """
+        if Checkpoint.is_checkpoint(filename):
+            checkpoint = Checkpoint(filename)
+            try:
+                return checkpoint.restore(load_function_caches)
+            finally:
+                checkpoint.close()
         spam_spec = importlib.util.find_spec("dill")
         found = spam_spec is not None
         if found:
@@ -829,16 +1505,10 @@ class StandardCombi(object):
             print("Dill library not found! Please install dill using pip3 install dill.")
 
     def save_to_file(self, filename: str) -> None:
-        """This method can be used to store a StandardCombi object (or child class) in a file.
-        
+        """This method can be used to store a StandardCombi object (or child class) in a file. The file uses the
+        checkpoint format (see Checkpoint), i.e. the scheme, the function caches and the refinement are stored as arrays.
+
         :param filename: Specifies filename where to store combi object.
         :return: None
         """
-        spam_spec = importlib.util.find_spec("dill")
-        found = spam_spec is not None
-        if found:
-            import dill
-            with open(filename, 'wb') as f:
-                dill.dump(self, f)
-        else:
-            print("Dill library not found! Please install dill using pip3 install dill.")
+        Checkpoint.save(self, filename)
@@ -1,6 +1,7 @@
 import numpy as np
 from typing import List, Set, Dict, Tuple, Optional, Union, Sequence, Generator
-from itertools import product
+from itertools import product, islice
+from scipy.sparse import csr_matrix
 
 def get_cross_product(one_d_arrays: Sequence[Sequence[Union[float, int]]]) -> Generator[Tuple[Union[float, int], ...], None, None]:
     #dim = len(one_d_arrays)
@@ -20,3 +21,103 @@ def get_cross_product_range(one_d_arrays: Sequence[Sequence[int]]) -> Generator[
 def get_cross_product_range_list(one_d_arrays: Sequence[Sequence[int]]) -> List[Tuple[int, ...]]:
     return get_cross_product_list([range(one_d_array) for one_d_array in one_d_arrays])
 
+
+
+# this function computes the row-wise Khatri-Rao (face-splitting) product of sparse matrices: row j of the result is the
+# Kronecker product of the rows j of all factors. The column ordering matches get_cross_product_range, i.e. the last
+# factor varies fastest. Only the non-zero entries of each row are combined.
+def get_row_wise_khatri_rao_product(factors: Sequence[csr_matrix]) -> csr_matrix:
+    result = csr_matrix(factors[0])
+    for factor in factors[1:]:
+        factor = csr_matrix(factor)
+        num_rows = result.shape[0]
+        assert factor.shape[0] == num_rows
+        counts_result = np.diff(result.indptr)
+        counts_factor = np.diff(factor.indptr)
+        # every entry of the current result is combined with every entry in the same row of the factor
+        entry_rows = np.repeat(np.arange(num_rows), counts_result)
+        repetitions = counts_factor[entry_rows]
+        left = np.repeat(np.arange(result.nnz), repetitions)
+        group_starts = np.cumsum(repetitions) - repetitions
+        right = factor.indptr[entry_rows[left]] + np.arange(len(left)) - np.repeat(group_starts, repetitions)
+        data = result.data[left] * factor.data[right]
+        indices = result.indices[left].astype(np.int64) * factor.shape[1] + factor.indices[right]
+        indptr = np.concatenate(([0], np.cumsum(counts_result * counts_factor)))
+        result = csr_matrix((data, indices, indptr), shape=(num_rows, result.shape[1] * factor.shape[1]))
+    return result
+
+
+# this function contracts the values (one row per output component, one column per tensor product basis ordered like
+# get_cross_product_range) with the row-wise Khatri-Rao product of the factors, i.e. it evaluates the tensor product
+# interpolant at scattered points given the 1D basis evaluations of each dimension (one row per point). The points are
+# processed in batches such that the Khatri-Rao product of a batch has at most max_entries non-zero entries.
+def get_khatri_rao_contraction(factors: Sequence[csr_matrix], values: Sequence[Sequence[float]], max_entries: int=2**22) -> Sequence[Sequence[float]]:
+    factors = [csr_matrix(factor) for factor in factors]
+    values = np.asarray(values)
+    num_rows = factors[0].shape[0]
+    result = np.zeros((num_rows, np.shape(values)[0]))
+    entries_per_row = np.prod([np.diff(factor.indptr).astype(np.int64) for factor in factors], axis=0)
+    cumulative_entries = np.cumsum(entries_per_row)
+    start = 0
+    while start < num_rows:
+        offset = cumulative_entries[start - 1] if start > 0 else 0
+        end = max(start + 1, int(np.searchsorted(cumulative_entries, offset + max_entries, side='right')))
+        product = get_row_wise_khatri_rao_product([factor[start:end] for factor in factors])
+        result[start:end] = product.dot(values.T)
+        start = end
+    return result
+
+
+# this function evaluates the tensor product interpolant on a full grid by sequential mode-n products: the values (one
+# row per output component, one column per tensor product basis ordered like get_cross_product_range) are reshaped to
+# a tensor that is multiplied in every dimension d with the (dense or sparse) 1D evaluation matrix factors[d] of shape
+# (number of points in d, number of bases in d). The result has one row per grid point (ordered like get_cross_product)
+# and one column per output component.
+def get_mode_n_product(values: Sequence[Sequence[float]], factors: Sequence[Sequence[Sequence[float]]]) -> Sequence[Sequence[float]]:
+    num_outputs = np.shape(values)[0]
+    tensor = np.reshape(values, [num_outputs] + [np.shape(factor)[1] for factor in factors])
+    for d, factor in enumerate(factors):
+        tensor = np.moveaxis(tensor, d + 1, 0)
+        shape = np.shape(tensor)
+        tensor = np.asarray(factor.dot(np.reshape(tensor, (shape[0], -1))))
+        tensor = np.moveaxis(np.reshape(tensor, (np.shape(factor)[0],) + shape[1:]), 0, d + 1)
+    return np.reshape(tensor, (num_outputs, -1)).T
+
+
+# this function returns the points of the tensor product grid as array of shape (number of points, dim) ordered like
+# get_cross_product
+def get_cross_product_array(one_d_arrays: Sequence[Sequence[float]]) -> np.ndarray:
+    if len(one_d_arrays) == 0:
+        return np.zeros((1, 0))
+    mesh = np.meshgrid(*[np.asarray(one_d_array, dtype=float) for one_d_array in one_d_arrays], indexing="ij")
+    return np.stack([mesh_d.ravel() for mesh_d in mesh], axis=-1)
+
+
+# this function splits the tensor product grid into sub grids with at most max_points points (if possible). It yields
+# the sub grids together with the offset of their first point; the points of each sub grid form the contiguous range
+# offset:offset + size of the points of the whole grid ordered like get_cross_product.
+def get_grid_blocks(one_d_arrays: Sequence[Sequence[float]], max_points: int, offset: int=0) -> Generator[Tuple[int, List[Sequence[float]]], None, None]:
+    points_per_slice = int(np.prod([len(one_d_array) for one_d_array in one_d_arrays[1:]]))
+    if points_per_slice > max_points and len(one_d_arrays) > 1:
+        for i in range(len(one_d_arrays[0])):
+            for block_offset, block in get_grid_blocks(one_d_arrays[1:], max_points, offset + i * points_per_slice):
+                yield block_offset, [one_d_arrays[0][i:i + 1]] + block
+    else:
+        slices_per_block = max(1, max_points // max(points_per_slice, 1))
+        for start in range(0, len(one_d_arrays[0]), slices_per_block):
+            yield offset + start * points_per_slice, [one_d_arrays[0][start:start + slices_per_block]] + list(one_d_arrays[1:])
+
+
+# this function splits the points into chunks of at most chunk_size points. Arrays (including memory maps) are sliced
+# without copying, other iterables (e.g. generators) are consumed lazily.
+def get_point_chunks(points, chunk_size: int) -> Generator[Sequence[Tuple[float, ...]], None, None]:
+    if isinstance(points, np.ndarray):
+        for start in range(0, len(points), chunk_size):
+            yield points[start:start + chunk_size]
+    else:
+        iterator = iter(points)
+        while True:
+            chunk = list(islice(iterator, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield np.asarray(chunk, dtype=float)
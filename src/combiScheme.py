@@ -1,44 +1,99 @@
 import numpy as np
 import math
+import os
+from functools import lru_cache, reduce
 from ComponentGridInfo import ComponentGridInfo
-from typing import List, Set, Tuple
+from IndexSet import IndexSet
+from typing import List, Set, Tuple, Callable, Generator, Dict, Sequence, Union
 from Utils import *
 
 class CombiScheme:
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, cache_directory: str=None):
         self.initialized_adaptive = False
-        self.active_index_set = set()
-        self.old_index_set = set()
         self.dim = dim
+        self.active_index_set = IndexSet(dim)
+        self.old_index_set = IndexSet(dim)
+        # union of the old and active index set
+        self.index_set = IndexSet(dim)
+        # combination coefficients of the adaptive scheme; updated locally whenever an index is added
+        self.coefficients = {}  # type: Dict[Tuple[int, ...], int]
+        self.scheme_cache = None
+        # if specified, the standard combination schemes are stored in (and loaded from) this directory
+        self.cache_directory = cache_directory
 
     # This method initializes the adaptive combination scheme. Here we create the old and the active index set
-    # for the standard scheme with specified maximum and minimum level.
-    def init_adaptive_combi_scheme(self, lmax: int, lmin: int) -> None:
-        assert lmax >= lmin
-        assert lmax >= 0
-        assert lmin >= 0
+    # for the standard scheme with specified maximum and minimum level. lmin and lmax can also be level vectors and
+    # weights can be specified to start from an anisotropic or weighted scheme (see get_weighted_scheme_parameters).
+    def init_adaptive_combi_scheme(self, lmax: Union[int, Sequence[int]], lmin: Union[int, Sequence[int]], weights: Sequence[float]=None) -> None:
+        lmin_vector, lmax_vector, _, _ = self.get_weighted_scheme_parameters(lmin, lmax, weights)
         self.lmin = lmin
         self.lmax = lmax
+        self.lmin_vector = lmin_vector  # type: List[int]
         self.initialized_adaptive = True  # type: bool
-        self.active_index_set = CombiScheme.init_active_index_set(lmax, lmin, self.dim)  # type: Set[Tuple[int, ...]]
-        self.old_index_set = CombiScheme.init_old_index_set(lmax, lmin, self.dim)  # type: Set[Tuple[int, ...]]
-        self.lmax_adaptive = lmax  # type: int
+        if self.is_standard_scheme(lmin, lmax, weights):
+            self.active_index_set = CombiScheme.init_active_index_set(lmax_vector[0], lmin_vector[0], self.dim)  # type: IndexSet
+            self.old_index_set = CombiScheme.init_old_index_set(lmax_vector[0], lmin_vector[0], self.dim)  # type: IndexSet
+        else:
+            # the active indices are the indices without forward neighbour in the index set
+            index_set = IndexSet(self.dim, self.get_weighted_index_set_array(lmin, lmax, weights))
+            levelvectors = index_set.get_levelvectors()
+            has_forward_neighbour = index_set.has_forward_neighbours(levelvectors)
+            self.active_index_set = IndexSet(self.dim, levelvectors[np.logical_not(has_forward_neighbour)])
+            self.old_index_set = IndexSet(self.dim, levelvectors[has_forward_neighbour])
+        self.index_set = self.old_index_set | self.active_index_set  # type: IndexSet
+        self.lmax_adaptive = max(lmax_vector)  # type: int
+        self.init_coefficients()
 
     # This method initializes the subspaces for a full grid. This method should only be used for plotting as it violates
     # the basic properties of the index sets for adaptation.
-    def init_full_grid(self, lmax: int, lmin: int) -> None:
-        assert lmax >= lmin
-        assert lmax >= 0
-        assert lmin >= 0
+    def init_full_grid(self, lmax: Union[int, Sequence[int]], lmin: Union[int, Sequence[int]]) -> None:
+        lmin_vector, lmax_vector, _, _ = self.get_weighted_scheme_parameters(lmin, lmax)
         self.lmin = lmin
         self.lmax = lmax
+        self.lmin_vector = lmin_vector  # type: List[int]
         self.initialized_adaptive = True  # type: bool
 
-        self.active_index_set = set()
-        self.old_index_set = CombiScheme.init_old_index_set(lmax, lmin, self.dim)  # type: Set[Tuple[int, ...]]
-        for i in range(1+lmax-lmin):
-            self.old_index_set = self.old_index_set | CombiScheme.init_active_index_set(lmax, lmin+i, self.dim)  # type: Set[Tuple[int, ...]]
-        self.lmax_adaptive = lmax  # type: int
+        self.active_index_set = IndexSet(self.dim)
+        if self.is_standard_scheme(lmin, lmax):
+            lmin, lmax = lmin_vector[0], lmax_vector[0]
+            self.old_index_set = CombiScheme.init_old_index_set(lmax, lmin, self.dim)  # type: IndexSet
+            for i in range(1+lmax-lmin):
+                self.old_index_set.update(CombiScheme.init_active_index_set(lmax, lmin+i, self.dim))
+        else:
+            self.old_index_set = IndexSet(self.dim, get_cross_product([range(lmin_vector[d], lmax_vector[d] + 1) for d in range(self.dim)]))
+        self.index_set = self.old_index_set.copy()  # type: IndexSet
+        self.lmax_adaptive = max(lmax_vector)  # type: int
+        self.init_coefficients()
+
+    # This method computes the coefficients of the current index set from scratch. Afterwards they are only updated
+    # locally when indices are added (see add_index_to_coefficients).
+    def init_coefficients(self) -> None:
+        self.coefficients = {}
+        for levelvec in self.index_set:
+            self.add_index_to_coefficients(levelvec, self.coefficients)
+        self.scheme_cache = None
+
+    # This method adds the contribution of the index levelvec to the coefficients of the combination scheme. Only the
+    # (at most 2^dim) backward neighbours levelvec + s with s in {0,-1}^dim change, each by (-1)^|s|. Coefficients
+    # that vanish are removed from the dictionary.
+    # The minimum level vector lmin defaults to the one of the adaptive scheme.
+    def add_index_to_coefficients(self, levelvec: Tuple[int, ...], coefficients: Dict[Tuple[int, ...], int], lmin: Sequence[int]=None) -> None:
+        if lmin is None:
+            lmin = self.lmin_vector
+        stencils = []
+        for d in range(self.dim):
+            if levelvec[d] <= lmin[d]:
+                stencils.append([0])
+            else:
+                stencils.append([0, -1])
+        for s in get_cross_product(stencils):
+            neighbour = tuple(map(lambda x, y: x + y, levelvec, s))  # adding tuples
+            update_coefficient = 1 if sum(s) % 2 == 0 else -1
+            coefficient = coefficients.get(neighbour, 0) + update_coefficient
+            if coefficient != 0:
+                coefficients[neighbour] = coefficient
+            else:
+                coefficients.pop(neighbour, None)
 
     def extendable_level(self, levelvec: List[int]) -> Tuple[bool, int]:
         assert self.initialized_adaptive
@@ -53,7 +108,7 @@ class CombiScheme:
     # checks if the component grid is refinable, i.e. it is in the active index set
     def is_refinable(self, levelvec: List[int]) -> bool:
         assert self.initialized_adaptive
-        return tuple(levelvec) in self.active_index_set
+        return levelvec in self.active_index_set
 
     # This method is used to refine the component grid with the specified levelvec.
     # It tries to add all forward neighbours of the grid and adds all of them that can be added.
@@ -65,131 +120,307 @@ class CombiScheme:
             return
         refined_dims = []
         # remove this levelvec from active_index_set and add to old_index_set
-        self.active_index_set.remove(tuple(levelvec))
-        self.old_index_set.add(tuple(levelvec))
+        key = self.index_set.pack(levelvec)
+        self.active_index_set.remove_key(key)
+        self.old_index_set.add_key(key)
         for d in range(self.dim):
-            if self.__refine_scheme(d, levelvec):
+            if self.__refine_scheme(d, levelvec, key):
                 refined_dims.append(d)
         return refined_dims
 
     def has_forward_neighbour(self, levelvec: List[int]) -> bool:
         assert self.initialized_adaptive
-        for d in range(self.dim):
-            temp = list(levelvec)
-            temp[d] += 1
-            if tuple(temp) in self.active_index_set or tuple(temp) in self.old_index_set:
-                return True
-        return False
+        key = self.index_set.pack(levelvec)
+        return any(self.index_set.has_key(key + unit_key) for unit_key in self.index_set.unit_keys)
+
+    # Vectorized version of has_forward_neighbour for an array of level vectors of shape (number of level vectors, dim).
+    def has_forward_neighbours(self, levelvectors: np.ndarray) -> np.ndarray:
+        assert self.initialized_adaptive
+        return self.index_set.has_forward_neighbours(levelvectors)
+
+    # This method checks for an array of level vectors if all their backward neighbours are in the old index set,
+    # i.e. if they can be added to the scheme.
+    def is_backward_closed(self, levelvectors: np.ndarray) -> np.ndarray:
+        assert self.initialized_adaptive
+        return self.old_index_set.is_backward_closed(levelvectors, self.lmin_vector)
 
     # This method tries to add the forward neighbour in dimension d for the grid with the specified levelvector.
     # If the grid was added successfully the return value will be True, otherwise False.
-    def __refine_scheme(self, d: int, levelvec: List[int]) -> Set[Tuple[int, ...]]:
+    # The key of the level vector in the packed index sets can be passed to avoid packing it again.
+    def __refine_scheme(self, d: int, levelvec: List[int], key: int=None) -> bool:
         assert self.initialized_adaptive
-        # print(CombiScheme.old_index_set, CombiScheme.active_index_set, levelvec, CombiScheme.lmin)
-        levelvec = list(levelvec)
-        levelvec[d] += 1
+        if key is None:
+            key = self.index_set.pack(levelvec)
+        unit_keys = self.index_set.unit_keys
+        # key of the forward neighbour; all its backward neighbours have to be in the old index set
+        key_new = key + unit_keys[d]
         for dim in range(self.dim):
-            levelvec_copy = list(levelvec)
-            levelvec_copy[dim] = levelvec[dim] - 1
-            if tuple(levelvec_copy) not in self.old_index_set and not levelvec_copy[dim] < self.lmin:
+            level = levelvec[dim] + 1 if dim == d else levelvec[dim]
+            if level - 1 >= self.lmin_vector[dim] and not self.old_index_set.has_key(key_new - unit_keys[dim]):
                 return False
-        self.active_index_set.add(tuple(levelvec))
-        self.lmax_adaptive = max(self.lmax_adaptive, levelvec[d])
+        if not self.index_set.has_key(key_new):
+            self.add_index_to_coefficients(self.index_set.unpack(key_new), self.coefficients)
+            self.scheme_cache = None
+            self.index_set.add_key(key_new)
+        self.active_index_set.add_key(key_new)
+        self.lmax_adaptive = max(self.lmax_adaptive, levelvec[d] + 1)
         return True
 
     # This method initializes the active index set for the standard combination technique with specified maximum
     # and minimum level. Dim specifies the dimension of the problem.
     @staticmethod
-    def init_active_index_set(lmax: int, lmin: int, dim: int) -> Set[Tuple[int, ...]]:
-        grids = CombiScheme.getGrids(dim, lmax - lmin + 1)
-        grids = [tuple([l + (lmin - 1) for l in g]) for g in grids]
-        return set(grids)
+    def init_active_index_set(lmax: int, lmin: int, dim: int) -> IndexSet:
+        grids = IndexSet(dim)
+        for block in CombiScheme.get_grids_blocks(dim, lmax - lmin + 1):
+            grids.update(block + (lmin - 1))
+        return grids
 
     # This method initializes the old index set for the standard combination technique with specified maximum
     # and minimum level. Dim specifies the dimension of the problem.
     @staticmethod
-    def init_old_index_set(lmax: int, lmin: int, dim: int) -> Set[Tuple[int, ...]]:
-        grid_array = []
+    def init_old_index_set(lmax: int, lmin: int, dim: int) -> IndexSet:
+        grids = IndexSet(dim)
         for q in range(1, lmax - lmin + 1):
-            grids = CombiScheme.getGrids(dim, lmax - lmin + 1 - q)
-            grids = [tuple([l + (lmin - 1) for l in g]) for g in grids]
-            grid_array.extend(grids)
-        return set(grid_array)
+            for block in CombiScheme.get_grids_blocks(dim, lmax - lmin + 1 - q):
+                grids.update(block + (lmin - 1))
+        return grids
 
-    # This method returns the whole index set, i.e. the union of the old and active index set
-    def get_index_set(self) -> Set[Tuple[int, ...]]:
-        return self.old_index_set | self.active_index_set
+    # This method returns the whole index set, i.e. the union of the old and active index set. The union is maintained
+    # during the adaptation, so the returned set must not be modified.
+    def get_index_set(self) -> IndexSet:
+        return self.index_set
 
-    def get_active_indices(self) -> Set[Tuple[int, ...]]:
+    def get_active_indices(self) -> IndexSet:
         return self.active_index_set
 
     # This method returns a list containing the whole combination scheme for the specified minimum and maximum level.
     # In case we have initialized the dimension adaptive scheme (with init_adaptive_combi_scheme) it returns the
     # current adaptive combination scheme. Here only the grids with a non-zero coeficient are returned.
     # In the adaptive case lmin and lmax parameters are not used.
+    # lmin and lmax can also be level vectors and weights can be specified for anisotropic and weighted schemes (see
+    # get_weighted_scheme_parameters).
     # do_print can be set to true of we want to print the combination scheme to standard output.
-    def getCombiScheme(self, lmin: int=1, lmax: int=2, do_print: bool=True) -> List[ComponentGridInfo]:
+    def getCombiScheme(self, lmin: Union[int, Sequence[int]]=1, lmax: Union[int, Sequence[int]]=2, do_print: bool=True, weights: Sequence[float]=None) -> List[ComponentGridInfo]:
         grid_array = []
         if not self.initialized_adaptive:  # use default scheme
-            for q in range(min(self.dim, lmax-lmin+1)):
-                coefficient = (-1)**q * math.factorial(self.dim-1)/(math.factorial(q)*math.factorial(self.dim-1-q))
-                grids = CombiScheme.getGrids(self.dim, lmax - lmin + 1 - q)
-                grid_array.extend([ComponentGridInfo(levelvector=np.array(g, dtype=int)+np.ones(self.dim, dtype=int)*(lmin-1), coefficient=coefficient) for g in grids])
+            if self.is_standard_scheme(lmin, lmax, weights):
+                levelvectors, coefficients = self.get_standard_scheme_arrays(int(np.ravel(lmin)[0]), int(np.ravel(lmax)[0]))
+            else:
+                levelvectors, coefficients = self.get_weighted_scheme_arrays(lmin, lmax, weights)
+            # the level vectors of the component grids are (read only) views into one packed array
+            grid_array = [ComponentGridInfo(levelvector=levelvectors[i], coefficient=coefficients[i]) for i in range(len(levelvectors))]
             for i in range(len(grid_array)):
                 if do_print:
                     print(i, list(grid_array[i].levelvector), grid_array[i].coefficient)
         else:  # use adaptive schem
             assert self.initialized_adaptive
-            grid_array = self.get_coefficients_to_index_set(self.active_index_set | self.old_index_set)
-            # print(grid_dict.items())
+            # the scheme is only rebuilt if the coefficients changed since the last call
+            if self.scheme_cache is None:
+                self.scheme_cache = [ComponentGridInfo(levelvector=levelvec, coefficient=coefficient) for levelvec, coefficient in self.coefficients.items()]
+            grid_array = self.scheme_cache
             for i in range(len(grid_array)):
                 if do_print:
                     print(i, list(grid_array[i].levelvector), grid_array[i].coefficient)
         return grid_array
 
+    # This method returns the level vectors (packed into one integer array of shape (number of grids, dim)) and the
+    # coefficients of the standard combination scheme. If a cache directory is set, the scheme is stored on disk and
+    # loaded from there for the same (dim, lmin, lmax).
+    def get_standard_scheme_arrays(self, lmin: int, lmax: int) -> Tuple[np.ndarray, np.ndarray]:
+        filename = None
+        if self.cache_directory is not None:
+            filename = os.path.join(self.cache_directory, "combi_scheme_%d_%d_%d.npz" % (self.dim, lmin, lmax))
+            if os.path.isfile(filename):
+                with np.load(filename) as data:
+                    levelvectors, coefficients = data["levelvectors"], data["coefficients"]
+                levelvectors.flags.writeable = False
+                return levelvectors, coefficients
+        levelvector_blocks = [np.zeros((0, self.dim), dtype=int)]
+        coefficient_blocks = [np.zeros(0)]
+        for levelvectors, coefficient in self.get_combi_scheme_blocks(lmin, lmax):
+            levelvector_blocks.append(levelvectors)
+            coefficient_blocks.append(np.full(len(levelvectors), coefficient))
+        levelvectors = np.concatenate(levelvector_blocks)
+        coefficients = np.concatenate(coefficient_blocks)
+        if filename is not None:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            # write to a temporary file first so that concurrent readers never see a partial file
+            temporary_filename = filename + ".%d.tmp.npz" % os.getpid()
+            np.savez(temporary_filename, levelvectors=levelvectors, coefficients=coefficients)
+            os.replace(temporary_filename, filename)
+        levelvectors.flags.writeable = False
+        return levelvectors, coefficients
+
+    # This method checks if the parameters describe the standard scheme, i.e. the minimum and maximum levels are equal
+    # in all dimensions and no weights are specified.
+    def is_standard_scheme(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> bool:
+        return weights is None and len(set(np.ravel(lmin).tolist())) == 1 and len(set(np.ravel(lmax).tolist())) == 1
+
+    # This method returns the minimum and maximum level vectors, the weights and the level bound L of the weighted
+    # index set {l : lmin <= l <= lmax, sum_d w_d * (l_d - lmin_d) <= L}. lmin and lmax can be integers or level vectors.
+    # Without weights the (integer) weights are chosen such that the index set reaches lmax_d in each dimension d, i.e.
+    # sum_d (l_d - lmin_d) / (lmax_d - lmin_d) <= 1, which gives the standard index set if lmin and lmax are equal in
+    # all dimensions. With weights the level bound is max_d(lmax_d - lmin_d).
+    def get_weighted_scheme_parameters(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> Tuple[List[int], List[int], List[float], float]:
+        lmin = [int(l) for l in np.broadcast_to(lmin, self.dim)]
+        lmax = [int(l) for l in np.broadcast_to(lmax, self.dim)]
+        assert all(lmax[d] >= lmin[d] >= 0 for d in range(self.dim))
+        if weights is None:
+            level_bound = reduce(lambda x, y: x * y // math.gcd(x, y), [lmax[d] - lmin[d] for d in range(self.dim) if lmax[d] > lmin[d]], 1)
+            weights = [level_bound // (lmax[d] - lmin[d]) if lmax[d] > lmin[d] else 1 for d in range(self.dim)]
+        else:
+            assert len(weights) == self.dim and all(w > 0 for w in weights)
+            weights = list(weights)
+            level_bound = max(lmax[d] - lmin[d] for d in range(self.dim))
+        return lmin, lmax, weights, level_bound
+
+    # This method returns the level vectors of the weighted index set (see get_weighted_scheme_parameters) as one
+    # integer array of shape (number of level vectors, dim).
+    def get_weighted_index_set_array(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> np.ndarray:
+        lmin, lmax, weights, level_bound = self.get_weighted_scheme_parameters(lmin, lmax, weights)
+        return CombiScheme.get_weighted_index_set_recursive(lmin, lmax, weights, level_bound, 1e-12 * max(level_bound, 1))
+
+    # This method recursively computes the level vectors l (of dimension len(lmin)) with lmin <= l <= lmax and
+    # sum_d w_d * (l_d - lmin_d) <= budget.
+    @staticmethod
+    def get_weighted_index_set_recursive(lmin: Sequence[int], lmax: Sequence[int], weights: Sequence[float], budget: float, tolerance: float) -> np.ndarray:
+        if len(lmin) == 0:
+            return np.zeros((1, 0), dtype=int)
+        blocks = [np.zeros((0, len(lmin)), dtype=int)]
+        for level in range(lmin[0], lmax[0] + 1):
+            cost = weights[0] * (level - lmin[0])
+            if cost > budget + tolerance:
+                break
+            block = CombiScheme.get_weighted_index_set_recursive(lmin[1:], lmax[1:], weights[1:], budget - cost, tolerance)
+            blocks.append(np.hstack((np.full((len(block), 1), level, dtype=int), block)))
+        return np.concatenate(blocks)
+
+    # This method returns the level vectors (packed into one read only integer array) and the coefficients of the
+    # anisotropic or weighted combination scheme. The coefficients are obtained from the (downward closed) index set
+    # with the same stencil as in the adaptive scheme; grids with vanishing coefficient are not returned.
+    def get_weighted_scheme_arrays(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> Tuple[np.ndarray, np.ndarray]:
+        lmin_vector = self.get_weighted_scheme_parameters(lmin, lmax, weights)[0]
+        grid_dict = {}
+        for levelvec in self.get_weighted_index_set_array(lmin, lmax, weights).tolist():
+            self.add_index_to_coefficients(tuple(levelvec), grid_dict, lmin_vector)
+        levelvectors = np.array(sorted(grid_dict), dtype=int).reshape(-1, self.dim)
+        coefficients = np.array([grid_dict[levelvec] for levelvec in sorted(grid_dict)], dtype=float)
+        levelvectors.flags.writeable = False
+        return levelvectors, coefficients
+
+    # This method returns the downward closure of the specified level vectors, i.e. all level vectors k with
+    # lmin <= k <= l for one of the level vectors l.
+    def get_downward_closure(self, levelvectors: Sequence[Sequence[int]], lmin: Union[int, Sequence[int]]) -> IndexSet:
+        lmin = [int(l) for l in np.broadcast_to(lmin, self.dim)]
+        index_set = IndexSet(self.dim)
+        for levelvec in levelvectors:
+            if levelvec not in index_set:
+                index_set.update(get_cross_product([range(lmin[d], levelvec[d] + 1) for d in range(self.dim)]))
+        return index_set
+
+    # This method lazily generates the standard combination scheme for the specified minimum and maximum level. It
+    # yields the level vectors of one diagonal (in blocks of at most block_size level vectors) together with their
+    # coefficient; no index set is built.
+    def get_combi_scheme_blocks(self, lmin: int, lmax: int, block_size: int=2**16) -> Generator[Tuple[np.ndarray, float], None, None]:
+        for q in range(min(self.dim, lmax-lmin+1)):
+            coefficient = (-1)**q * math.factorial(self.dim-1)/(math.factorial(q)*math.factorial(self.dim-1-q))
+            for block in CombiScheme.get_grids_blocks(self.dim, lmax - lmin + 1 - q, block_size):
+                yield block + (lmin - 1), coefficient
+
+    # This method returns the number of component grids of the standard combination scheme (closed form). For
+    # anisotropic and weighted schemes the coefficients have to be computed.
+    def get_num_grids_scheme(self, lmin: Union[int, Sequence[int]], lmax: Union[int, Sequence[int]], weights: Sequence[float]=None) -> int:
+        if not self.is_standard_scheme(lmin, lmax, weights):
+            return len(self.get_weighted_scheme_arrays(lmin, lmax, weights)[0])
+        lmin, lmax = int(np.ravel(lmin)[0]), int(np.ravel(lmax)[0])
+        return sum(CombiScheme.get_num_grids(self.dim, lmax - lmin + 1 - q) for q in range(min(self.dim, lmax-lmin+1)))
+
+    # This method returns the number of level vectors of dimension dim with positive entries and an l_1 norm of
+    # values_left + dim - 1, i.e. the number of grids generated by getGrids (closed form).
+    @staticmethod
+    def get_num_grids(dim: int, values_left: int) -> int:
+        if dim == 1:
+            return 1
+        if values_left < 1:
+            return 0
+        return math.factorial(values_left + dim - 2) // (math.factorial(dim - 1) * math.factorial(values_left - 1))
+
+    # This method returns the total number of points of all component grids of one diagonal (the grids of
+    # getGrids(dim, values_left) shifted by lmin - 1) without enumerating the grids. num_points_1D(d, l) specifies the
+    # number of points of level l in dimension d. The sum over all level vectors of the product of the 1D point numbers
+    # is computed by successive convolutions of the 1D point numbers (O(dim * values_left^2) operations).
+    @staticmethod
+    def get_num_points_diagonal(dim: int, values_left: int, lmin: int, num_points_1D: Callable[[int, int], int]) -> int:
+        # num_points_sum[s] = sum of the point numbers of all level vectors of the dimensions so far with
+        # (shifted) l_1 norm s
+        num_points_sum = [0] * (values_left + dim)
+        for l in range(1, values_left + 1):
+            num_points_sum[l] = int(num_points_1D(0, l + lmin - 1))
+        for d in range(1, dim):
+            num_points_1D_d = [0] + [int(num_points_1D(d, l + lmin - 1)) for l in range(1, values_left + 1)]
+            num_points_sum = [sum(num_points_sum[s - l] * num_points_1D_d[l] for l in range(1, min(values_left, s) + 1)) for s in range(values_left + dim)]
+        return num_points_sum[values_left + dim - 1]
+
     # This method computes the coefficient for all component grids (identified by their levelvector)
     # in the specified index set. It returns a list of ComponentGridInfo Structure containing all component grids with
-    # non-zero coefficients.
-    def get_coefficients_to_index_set(self, index_set: Set[Tuple[int, ...]]) -> List[ComponentGridInfo]:
-        grid_array = []
+    # non-zero coefficients. The minimum level defaults to the one of the adaptive scheme.
+    def get_coefficients_to_index_set(self, index_set: Set[Tuple[int, ...]], lmin: Sequence[int]=None) -> List[ComponentGridInfo]:
         grid_dict = {}
         for grid_levelvec in index_set:
-            stencils = []
-            for d in range(self.dim):
-                if grid_levelvec[d] <= self.lmin:
-                    stencils.append([0])
-                else:
-                    stencils.append([0, -1])
-            stencil_elements = get_cross_product(stencils)
-            for s in stencil_elements:
-                levelvec = tuple(map(lambda x, y: x + y, grid_levelvec, s))  # adding tuples
-                update_coefficient = -(abs((sum(s))) % 2) + (abs(((sum(s)) - 1)) % 2)
-                if levelvec in grid_dict:
-                    grid_dict[levelvec] += update_coefficient
-                else:
-                    grid_dict[levelvec] = update_coefficient
-
-        for levelvec, coefficient in grid_dict.items():
-            if coefficient != 0:
-                grid_array.append(ComponentGridInfo(levelvector=levelvec, coefficient=coefficient))
-        return grid_array
+            self.add_index_to_coefficients(tuple(grid_levelvec), grid_dict, lmin)
+        return [ComponentGridInfo(levelvector=levelvec, coefficient=coefficient) for levelvec, coefficient in grid_dict.items()]
 
     # This method checks if the specified levelvector is contained in the old index set.
     def is_old_index(self, levelvec: List[int]) -> bool:
-        return tuple(levelvec) in self.old_index_set
+        return levelvec in self.old_index_set
 
     # This method computes recursively all possible level vectors of dimension dim_left
     # that have an l_1 norm of values_left. This is used to efficiently compute the standard combination scheme.
     @staticmethod
     def getGrids(dim_left: int, values_left: int) -> List[List[int]]:
-        if dim_left == 1:
-            return [[values_left]]
         grids = []
+        for block in CombiScheme.get_grids_blocks(dim_left, values_left):
+            grids.extend(block.tolist())
+        return grids
+
+    # This method lazily generates the level vectors of getGrids (in the same order) as integer arrays of shape
+    # (number of level vectors, dim_left) with at most block_size rows. Only one block is held in memory at a time.
+    @staticmethod
+    def get_grids_blocks(dim_left: int, values_left: int, block_size: int=2**16) -> Generator[np.ndarray, None, None]:
+        buffer = []
+        buffer_size = 0
+        for block in CombiScheme.get_grids_blocks_recursive(dim_left, values_left, block_size):
+            if buffer_size + len(block) > block_size and buffer_size > 0:
+                yield np.concatenate(buffer)
+                buffer = []
+                buffer_size = 0
+            buffer.append(block)
+            buffer_size += len(block)
+        if buffer_size > 0:
+            yield np.concatenate(buffer)
+
+    @staticmethod
+    def get_grids_blocks_recursive(dim_left: int, values_left: int, block_size: int) -> Generator[np.ndarray, None, None]:
+        if CombiScheme.get_num_grids(dim_left, values_left) <= block_size:
+            yield CombiScheme.get_grids_array(dim_left, values_left)
+            return
+        # too many level vectors -> fix the first entry and generate the remaining entries lazily
         for index in range(values_left):
-            levelvector = [index+1]
-            grids.extend([levelvector + g for g in CombiScheme.getGrids(dim_left - 1, values_left - index)])
+            for block in CombiScheme.get_grids_blocks_recursive(dim_left - 1, values_left - index, block_size):
+                yield np.hstack((np.full((len(block), 1), index + 1, dtype=int), block))
+
+    # This method returns all level vectors of getGrids(dim_left, values_left) as one integer array. The arrays are
+    # cached as the arrays of fewer dimensions are reused many times when the level vectors are built up recursively.
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_grids_array(dim_left: int, values_left: int) -> np.ndarray:
+        if dim_left == 1:
+            grids = np.array([[values_left]], dtype=int)
+        else:
+            grids = np.concatenate([np.zeros((0, dim_left), dtype=int)] + [np.hstack((np.full((CombiScheme.get_num_grids(dim_left - 1, values_left - index), 1), index + 1, dtype=int), CombiScheme.get_grids_array(dim_left - 1, values_left - index))) for index in range(values_left)])
+        grids.flags.writeable = False
         return grids
 
     # This method checks if the specified levelvector is contained in the index set.
     def in_index_set(self, levelvec: List[int]) -> bool:
-        return tuple(levelvec) in self.active_index_set or tuple(levelvec) in self.old_index_set
+        return levelvec in self.index_set
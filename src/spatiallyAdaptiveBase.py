@@ -1,5 +1,7 @@
 # Python modules
+import os
 import time
+import zipfile
 from RefinementContainer import *
 from RefinementObject import *
 from ErrorCalculator import *
@@ -7,6 +9,19 @@ from Function import *
 from StandardCombi import *
 from GridOperation import GridOperation
 
+
+# spatially adaptive object and areas used by the worker processes of the parallel area evaluation; they are inherited
+# (copy-on-write) when the worker pool is forked
+_worker_spatially_adaptive = None
+_worker_areas = None
+
+
+def _evaluate_area_task(pairs: Sequence[Tuple[int, int, Sequence[int]]]) -> List[Tuple[Tuple[int, int], object]]:
+    # evaluates the operation for the (component grid index, area index, coarsened level vector) triples and returns
+    # the partial results
+    operation = _worker_spatially_adaptive.operation
+    return [((i, k), operation.evaluate_area_partial(_worker_areas[k], levelvector, _worker_spatially_adaptive.scheme[i])) for i, k, levelvector in pairs]
+
 # This class defines the general interface and functionalties of all spatially adaptive refinement strategies
 class SpatiallyAdaptivBase(StandardCombi):
     def __init__(self, a: Sequence[float], b: Sequence[float], operation: GridOperation, norm: int=np.inf):
@@ -21,8 +36,17 @@ class SpatiallyAdaptivBase(StandardCombi):
         self.norm = norm
         self.margin = 0.9
         self.calculated_solution = None
+        self.set_checkpointing(None)
         assert (len(a) == len(b))
 
+    def prepare_interpolators(self) -> None:
+        # the interpolation on the spatially adaptive grids is not cached
+        pass
+
+    def supports_surrogate_export(self) -> bool:
+        # the component grids consist of several areas and cannot be represented by a single tensor product mesh
+        return False
+
     def get_num_points_component_grid(self, levelvec: Sequence[int], count_multiple_occurrences: bool) -> int:
         array2 = self.get_points_component_grid(levelvec)
         if count_multiple_occurrences:
@@ -118,6 +142,12 @@ class SpatiallyAdaptivBase(StandardCombi):
         :param evaluation_array: Numpy array in which the number of evaluations per area are stored
         :return: None
         """
+        # evaluate the model once at all distinct points of all component grids and areas
+        if getattr(self, "do_evaluation_planning", False) and self.operation.supports_evaluation_planning():
+            self.evaluate_plan_areas(areas)
+        if getattr(self, "do_parallel_operation", False) and self.operation.is_area_operation() and self.supports_parallel_area_evaluation():
+            self.compute_solutions_parallel(areas, evaluation_array)
+            return
         # calculate operation
         for component_grid in self.scheme:  # iterate over component grids
             if self.operation.is_area_operation():
@@ -132,6 +162,117 @@ class SpatiallyAdaptivBase(StandardCombi):
                 self.operation.perform_operation(points)
                 self.compute_evaluations(evaluation_array, points)
 
+    def supports_parallel_area_evaluation(self) -> bool:
+        """This method indicates whether the (component grid, area) pairs can be evaluated in parallel (see
+        compute_solutions_parallel). This requires that evaluate_operation_area is not overwritten and an operation that
+        supports partial area results (see GridOperation.supports_partial_area_results).
+
+        :return: Bool
+        """
+        return self.operation.supports_partial_area_results()
+
+    def compute_solutions_parallel(self, areas, evaluation_array: Sequence[int]) -> None:
+        """This method computes the gridoperation on all component grids like compute_solutions but evaluates the
+        (component grid, area) pairs with a pool of forked worker processes (see set_parallel_operation). Each task
+        returns the partial values of its pairs; they are added to the areas in the order of the serial evaluation so
+        the result is the same as for the serial execution.
+
+        :param areas: The list of all subareas in the refinement (can be RefinementContainer if only one subares)
+        :param evaluation_array: Numpy array in which the number of evaluations per area are stored
+        :return: None
+        """
+        global _worker_spatially_adaptive, _worker_areas
+        areas = list(areas)
+        # the coarsening may store information in the areas so it is computed here in the order of the serial evaluation
+        pairs = []
+        for i, component_grid in enumerate(self.scheme):
+            for k, area in enumerate(areas):
+                modified_levelvec, do_compute = self.coarsen_grid(component_grid.levelvector, area)
+                if do_compute:
+                    pairs.append((i, k, modified_levelvec))
+        tasks = self.get_area_tasks(pairs, self.num_processes_operation)
+        partial_area_results = {}
+        if len(tasks) > 1:
+            _worker_spatially_adaptive = self
+            _worker_areas = areas
+            try:
+                with mp.get_context("fork").Pool(min(self.num_processes_operation, len(tasks))) as pool:
+                    for results in pool.imap_unordered(_evaluate_area_task, tasks):
+                        partial_area_results.update(results)
+            finally:
+                _worker_spatially_adaptive = None
+                _worker_areas = None
+        else:
+            for i, k, modified_levelvec in pairs:
+                partial_area_results[(i, k)] = self.operation.evaluate_area_partial(areas[k], modified_levelvec, self.scheme[i])
+        for i, k, _ in pairs:
+            component_grid = self.scheme[i]
+            evaluations = self.operation.add_partial_area_result(areas[k], component_grid, self.refinement, partial_area_results[(i, k)])
+            if self.grid.isNested() and self.operation.count_unique_points():
+                evaluations *= component_grid.coefficient
+            evaluation_array[k] += evaluations
+
+    def get_area_tasks(self, pairs: Sequence[Tuple[int, int, Sequence[int]]], num_processes: int) -> List[List[Tuple[int, int, Sequence[int]]]]:
+        """Partitions the (component grid, area) pairs into tasks for the parallel evaluation. Consecutive pairs are
+        collected into tasks with about a quarter of the average cost (approximate number of grid points) per process.
+
+        :param pairs: List of (component grid index, area index, coarsened level vector) triples.
+        :param num_processes: Number of worker processes.
+        :return: List of tasks, each a list of triples.
+        """
+        costs = [2 ** int(np.sum(modified_levelvec)) for _, _, modified_levelvec in pairs]
+        target_cost = sum(costs) / (4 * num_processes)
+        tasks = []
+        task = []
+        task_cost = 0
+        for pair, cost in zip(pairs, costs):
+            task.append(pair)
+            task_cost += cost
+            if task_cost >= target_cost:
+                tasks.append(task)
+                task = []
+                task_cost = 0
+        if task:
+            tasks.append(task)
+        return tasks
+
+    def evaluate_plan_areas(self, areas) -> None:
+        """This method plans the model evaluations of the operation on all component grids and areas (see
+        EvaluationPlan) and evaluates the model once at each distinct point. The values are cached in the function so
+        that the following computation of the operation does not call the model again. Nothing is done if the points of
+        an area are not known in advance (see get_points_operation_area).
+
+        :param areas: The list of all subareas in the refinement (can be RefinementContainer if only one subares)
+        :return: None
+        """
+        point_sets = {}
+        for component_grid in self.scheme:
+            for area in areas:
+                planned_points = self.get_points_operation_area(component_grid, area)
+                if planned_points is None:
+                    return
+                key, points = planned_points[0], list(planned_points[1])
+                # areas that are not computed must not replace the points of a computed area with the same key
+                if len(points) > 0 or key not in point_sets:
+                    point_sets[key] = points
+        evaluation_plan = EvaluationPlan(point_sets, self.dim)
+        if self.print_output:
+            print("Number of model calls", self.operation.get_num_model_calls(evaluation_plan))
+        self.operation.evaluate_plan(evaluation_plan, getattr(self, "num_processes_evaluation", 1))
+
+    def get_points_operation_area(self, component_grid: ComponentGridInfo, area) -> Tuple[Hashable, Sequence[Tuple[float, ...]]]:
+        """This method returns the points at which the operation evaluates the model when it is computed on a subarea
+        (see evaluate_operation_area). It must not modify the state of the refinement. Overwrite if the points are
+        known in advance.
+
+        :param component_grid: ComponentGridInfo that defines the component grid
+        :param area: Definition of the subarea. Usually a RefinementObject or the complete RefinementContainer
+        :return: Key under which the operation gathers the values from the EvaluationPlan (see
+                 Integration.get_plan_key) and list of points (ordered like the points of the grid) or None if the
+                 points are not known in advance.
+        """
+        return None
+
     def evaluate_operation_area(self, component_grid: ComponentGridInfo, area, additional_info=None) -> int:
         """Computes the GridOperation on a subarea of the domain
 
@@ -226,34 +367,44 @@ class SpatiallyAdaptivBase(StandardCombi):
         self.calculated_solution = None
         self.solutions_storage = solutions_storage
         self.evaluation_points = evaluation_points
+        # cached exact values and component grid contributions at the evaluation points (see interpolate_evaluation_points)
+        self.evaluation_reference_values = None
+        self.evaluation_contributions = None
+        self.evaluation_interpolation = None
+        self.num_refinement_iterations = 0
         return self.continue_adaptive_refinement(tol=tol, max_time=max_time, max_evaluations=max_evaluations, min_evaluations=min_evaluations)
 
-    def continue_adaptive_refinement(self, tol: float=10 ** -3, max_time: float=None, max_evaluations: int=None, min_evaluations: int=1) -> Tuple[RefinementContainer, Sequence[ComponentGridInfo], Sequence[int], Sequence[float], Sequence[float], Sequence[int], Sequence[float]]:
+    def continue_adaptive_refinement(self, tol: float=10 ** -3, max_time: float=None, max_evaluations: int=None, min_evaluations: int=1,
+                                     elapsed_time: float=0.0) -> Tuple[RefinementContainer, Sequence[ComponentGridInfo], Sequence[int], Sequence[float], Sequence[float], Sequence[int], Sequence[float]]:
         """Continues the adaptive refinement with potentially new limits.
 
         :param tol: Tolerance at which refinement is stopped
         :param max_time: Maximum compute time. The refinement will stop when it exceeds this time.
         :param max_evaluations: Maximum number of points. The refinement will stop when it exceeds this limit.
         :param min_evaluations: Minimum number of points. The refinement will not stop until it exceeds this limit.
+        :param elapsed_time: Compute time that was already spent on this refinement (e.g. before a checkpoint); it
+                             counts towards max_time.
         :return:
         """
-        start_time = time.time()
+        start_time = time.time() - elapsed_time
+        # the limits are stored for resume_from_checkpoint
+        self.refinement_limits = {"tol": tol, "max_time": max_time, "max_evaluations": max_evaluations, "min_evaluations": min_evaluations}
+        last_checkpoint_time = time.time()
         while True:
             error, surplus_error = self.evaluate_operation()
             self.error_array.append(error)
             self.surplus_error_array.append(surplus_error)
-            self.num_point_array.append(self.get_total_num_points(distinct_function_evals=True))
+            num_evaluations = self.get_total_num_points(distinct_function_evals=True)
+            self.num_point_array.append(num_evaluations)
             if self.evaluation_points is not None:
-                interpolated_values = np.asarray(self.__call__(self.evaluation_points))
-                real_values = np.asarray([self.operation.eval_analytic(point) for point in self.evaluation_points])
-                diff = [real_values[i]-interpolated_values[i] for i in range(len(self.evaluation_points))]
+                interpolated_values = self.interpolate_evaluation_points()
+                diff = self.get_reference_values_evaluation_points() - interpolated_values
                 #print(interpolated_values, diff)
                 self.interpolation_error_arrayL2.append(scipy.linalg.norm(diff, 2))
                 self.interpolation_error_arrayMax.append(scipy.linalg.norm(diff, np.inf))
 
             if self.print_output:
                 print("Current error:", error)
-            num_evaluations = self.get_total_num_points()
             if self.solutions_storage is not None:
                 assert not self.reevaluate_at_end, "Solutions are only available in the end"
                 # Remember the solutions for each number of evaluations
@@ -267,6 +418,14 @@ class SpatiallyAdaptivBase(StandardCombi):
                 break
             # refine further
             self.refine()
+            self.num_refinement_iterations = getattr(self, "num_refinement_iterations", 0) + 1
+            # a worker pool of the parallel evaluation holds the old refinement
+            self.close_pool()
+            if getattr(self, "checkpoint_filename", None) is not None and \
+                    ((self.checkpoint_every_iterations is not None and self.num_refinement_iterations % self.checkpoint_every_iterations == 0) or
+                     (self.checkpoint_every_seconds is not None and time.time() - last_checkpoint_time >= self.checkpoint_every_seconds)):
+                self.write_checkpoint(time.time() - start_time)
+                last_checkpoint_time = time.time()
             if self.do_plot:
                 print("Refinement Graph:")
                 self.draw_refinement()
@@ -292,6 +451,140 @@ class SpatiallyAdaptivBase(StandardCombi):
         self.calculated_solution = combi_result
         return self.refinement, self.scheme, self.lmax, combi_result, number_of_evaluations, self.error_array, self.num_point_array, self.surplus_error_array, self.interpolation_error_arrayL2, self.interpolation_error_arrayMax
 
+    def get_reference_values_evaluation_points(self) -> Sequence[Sequence[float]]:
+        """This method returns the exact values (see GridOperation.eval_analytic) at the evaluation points of the
+        convergence analysis. They are computed once and cached.
+
+        :return: Exact values (one row per evaluation point)
+        """
+        if getattr(self, "evaluation_reference_values", None) is None:
+            real_values = np.asarray([self.operation.eval_analytic(point) for point in self.evaluation_points])
+            self.evaluation_reference_values = real_values.reshape(len(self.evaluation_points), -1)
+        return self.evaluation_reference_values
+
+    def get_component_grid_signature(self, component_grid: ComponentGridInfo) -> Hashable:
+        """This method returns a hashable description of the component grid (e.g. level vector and point coordinates)
+        that determines its interpolant, i.e. the interpolant did not change as long as the signature is the same.
+        Overwrite to enable the incremental update in interpolate_evaluation_points.
+
+        :param component_grid: ComponentGridInfo that defines the component grid
+        :return: Signature or None if the interpolant has to be recomputed every time.
+        """
+        return None
+
+    def interpolate_evaluation_points(self) -> Sequence[Sequence[float]]:
+        """This method evaluates the combination at the evaluation points of the convergence analysis. The values of
+        each component grid are cached with its signature and coefficient (see get_component_grid_signature). Only new
+        component grids and grids with a changed signature are interpolated again; the combination is updated with the
+        differences of the weighted contributions. Schemes without signatures or with their own interpolation (that
+        overwrite __call__) are interpolated from scratch.
+
+        :return: Interpolated values (one row per evaluation point)
+        """
+        signatures = [self.get_component_grid_signature(component_grid) for component_grid in self.scheme]
+        if type(self).__call__ is not StandardCombi.__call__ or any(signature is None for signature in signatures):
+            self.evaluation_interpolation = np.asarray(self(self.evaluation_points)).reshape(len(self.evaluation_points), -1)
+            self.evaluation_contributions = None
+            return self.evaluation_interpolation
+        if getattr(self, "evaluation_contributions", None) is None:
+            self.evaluation_interpolation = np.zeros((len(self.evaluation_points), self.operation.point_output_length()))
+            self.evaluation_contributions = {}
+        previous_contributions = self.evaluation_contributions
+        self.evaluation_contributions = {}
+        for component_grid, signature in zip(self.scheme, signatures):
+            levelvector = tuple(component_grid.levelvector)
+            previous_contribution = previous_contributions.pop(levelvector, None)
+            if previous_contribution is not None and previous_contribution[0] == signature:
+                _, previous_coefficient, values = previous_contribution
+                if component_grid.coefficient != previous_coefficient:
+                    self.evaluation_interpolation += (component_grid.coefficient - previous_coefficient) * values
+            else:
+                if previous_contribution is not None:
+                    self.evaluation_interpolation -= previous_contribution[1] * previous_contribution[2]
+                values = np.asarray(self.interpolate_points(self.evaluation_points, component_grid)).reshape(self.evaluation_interpolation.shape)
+                self.evaluation_interpolation += component_grid.coefficient * values
+            self.evaluation_contributions[levelvector] = (signature, component_grid.coefficient, values)
+        # component grids that were removed from the scheme
+        for _, previous_coefficient, values in previous_contributions.values():
+            self.evaluation_interpolation -= previous_coefficient * values
+        return self.evaluation_interpolation
+
+    def set_checkpointing(self, filename: str=None, every_iterations: int=None, every_seconds: float=None, num_checkpoints: int=2) -> None:
+        """Configures the automatic checkpoints of the adaptive refinement. After a refinement step a checkpoint is
+        written if every_iterations refinement steps were performed or every_seconds passed since the last checkpoint.
+        The latest checkpoint is stored in filename, the older ones in filename.1, filename.2, ... The refinement can be
+        continued from the latest checkpoint with resume_from_checkpoint.
+
+        :param filename: Specifies filename of the latest checkpoint (None disables the checkpoints).
+        :param every_iterations: Number of refinement steps between two checkpoints (None: no limit).
+        :param every_seconds: Time in seconds between two checkpoints (None: no limit).
+        :param num_checkpoints: Number of checkpoints that are kept.
+        :return: None
+        """
+        assert filename is None or every_iterations is not None or every_seconds is not None
+        assert num_checkpoints > 0
+        self.checkpoint_filename = filename
+        self.checkpoint_every_iterations = every_iterations
+        self.checkpoint_every_seconds = every_seconds
+        self.num_checkpoints = num_checkpoints
+
+    @staticmethod
+    def get_checkpoint_filenames(filename: str, num_checkpoints: int) -> List[str]:
+        """Returns the filenames of the rotated checkpoints (latest first).
+
+        :param filename: Specifies filename of the latest checkpoint.
+        :param num_checkpoints: Number of checkpoints that are kept.
+        :return: List of filenames.
+        """
+        return [filename] + [filename + "." + str(k) for k in range(1, num_checkpoints)]
+
+    def write_checkpoint(self, elapsed_time: float) -> None:
+        """Writes a checkpoint of the current state of the refinement and rotates the older checkpoints.
+
+        :param elapsed_time: Compute time that was spent on the refinement so far.
+        :return: None
+        """
+        self.refinement_elapsed_time = elapsed_time
+        filenames = self.get_checkpoint_filenames(self.checkpoint_filename, self.num_checkpoints)
+        for k in reversed(range(1, len(filenames))):
+            if os.path.exists(filenames[k - 1]):
+                os.replace(filenames[k - 1], filenames[k])
+        Checkpoint.save(self, self.checkpoint_filename)
+        if self.print_output:
+            print("Wrote checkpoint", self.checkpoint_filename, "after", self.num_refinement_iterations, "refinement steps")
+
+    @staticmethod
+    def resume_from_checkpoint(filename: str) -> Tuple['SpatiallyAdaptivBase', Tuple]:
+        """Restores the refinement (including scheme, counters and function cache) from the latest valid checkpoint and
+        continues the adaptive refinement with the limits of the interrupted run.
+
+        :param filename: Specifies filename of the latest checkpoint (see set_checkpointing). If this file is missing or
+                         incomplete, the older checkpoints filename.1, filename.2, ... are used.
+        :return: Restored object and the result of continue_adaptive_refinement (FileNotFoundError if there is no
+                 valid checkpoint)
+        """
+        filenames = [filename]
+        while os.path.exists(filename + "." + str(len(filenames))):
+            filenames.append(filename + "." + str(len(filenames)))
+        for checkpoint_filename in filenames:
+            if not os.path.exists(checkpoint_filename) or not Checkpoint.is_checkpoint(checkpoint_filename):
+                continue
+            try:
+                checkpoint = Checkpoint(checkpoint_filename)
+                try:
+                    combi = checkpoint.restore()
+                finally:
+                    checkpoint.close()
+            except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile) as exception:
+                logging.getLogger(__name__).warning("Checkpoint %s could not be restored: %s", checkpoint_filename, exception)
+                continue
+            if not isinstance(combi, SpatiallyAdaptivBase) or not hasattr(combi, "refinement_limits"):
+                raise ValueError("Checkpoint " + checkpoint_filename + " was not written during an adaptive refinement")
+            if combi.print_output:
+                print("Resuming from checkpoint", checkpoint_filename, "after", combi.num_refinement_iterations, "refinement steps")
+            return combi, combi.continue_adaptive_refinement(elapsed_time=combi.refinement_elapsed_time, **combi.refinement_limits)
+        raise FileNotFoundError("No valid checkpoint found for " + filename)
+
     @abc.abstractmethod
     def initialize_refinement(self):
         """This method initializes the refinement container. This is specific to the indivudal strategy.
@@ -12,7 +12,7 @@ class SpatiallyAdaptiveCellScheme(SpatiallyAdaptivBase):
         self.max_level = np.ones(self.dim)
         self.full_interaction_size = 1
         self.refinements_for_recalculate = 1000000
-        self.cell_dict = {}
+        self.cell_dict = CellIndex(self.a, self.b)
         self.margin = 0.9
         for d in range(1, self.dim+1):
             self.full_interaction_size += math.factorial(self.dim)/(math.factorial(d)*math.factorial(self.dim - d)) * 2**d
@@ -59,6 +59,7 @@ class SpatiallyAdaptiveCellScheme(SpatiallyAdaptivBase):
         CombiScheme.dim = self.dim
         CombiScheme.lmin = self.lmin[0]
         #CombiScheme.init_adaptive_combi_scheme(self.dim, self.lmax, self.lmin)
+        self.cell_dict = CellIndex(self.a, self.b)
         # define root cell that spans the domain
         self.rootCell = RefinementObjectCell(np.array(self.a), np.array(self.b), np.zeros(self.dim), self.a, self.b, self.lmin, cell_dict=self.cell_dict)
         initial_objects = [self.rootCell]
@@ -74,23 +75,12 @@ class SpatiallyAdaptiveCellScheme(SpatiallyAdaptivBase):
         if self.errorEstimator is None:
             self.errorEstimator = ErrorCalculatorSurplusCell()
 
+    def supports_parallel_area_evaluation(self):
+        # the surplus of a cell is computed from its parents and stored in the refinement directly
+        return False
+
     def evaluate_operation_area(self, component_grid, area, additional_info=None):
-        relevant_parents_of_cell = [(area.get_key(), area.levelvec, 1)]
-        subareas_fused = {}
-        subareas_fused[area.get_key()] = 1
-        for d in range(self.dim):
-            new_parents = []
-            for subarea in relevant_parents_of_cell:
-                levelvec_parent = list(subarea[1])
-                levelvec_parent[d] -= 1
-                start_subarea = subarea[0][0]
-                end_subarea = subarea[0][1]
-                coefficient = subarea[2]
-                parent_area = RefinementObjectCell.parent_cell_arbitrary_dim(d, list(subarea[1]), start_subarea, end_subarea, self.a, self.b, self.lmin)
-                assert((parent_area is not None) or (subarea[1][d] == self.lmin[d]))
-                if parent_area is not None:
-                    new_parents.append((parent_area, levelvec_parent, coefficient*-1))
-            relevant_parents_of_cell.extend(new_parents)
+        relevant_parents_of_cell = self.get_relevant_parents_of_cell(area)
         assert(len(relevant_parents_of_cell) <= 2**self.dim)
 
         # calculate the operation value surplus of this cell by subtracting the parent contribution for this cell area
@@ -100,13 +90,24 @@ class SpatiallyAdaptiveCellScheme(SpatiallyAdaptivBase):
         # "Dimension–Adaptive Tensor–Product Quadrature" from Gerstner and Griebel)
         evaluations = 0
         #print(len(relevant_parents_of_cell))
-        for (parent_cell_key, levelvec, coefficient) in relevant_parents_of_cell:
+        for (parent_cell, coefficient) in relevant_parents_of_cell:
             if coefficient != 0:
-                parent_cell = self.cell_dict[parent_cell_key]
                 self.operation.compute_subcell_with_interpolation(parent_cell, area, coefficient, self.refinement)
                 evaluations += 2**self.dim
         return evaluations
 
+    # returns the cell itself and all its (transitive) parents with the coefficients of the surplus of the cell, i.e.
+    # the surplus is the sum of the interpolants of these cells multiplied with the coefficients
+    def get_relevant_parents_of_cell(self, area):
+        relevant_parents_of_cell = [(area.get_index(), 1)]
+        for d in range(self.dim):
+            new_parents = []
+            for (cell_index, coefficient) in relevant_parents_of_cell:
+                if cell_index[0][d] > self.lmin[d]:
+                    new_parents.append((CellIndex.get_parent_index(cell_index, d), coefficient*-1))
+            relevant_parents_of_cell.extend(new_parents)
+        return [(self.cell_dict.get_cell(*cell_index), coefficient) for (cell_index, coefficient) in relevant_parents_of_cell]
+
     '''
     def evaluate_area2(self, f, area, levelvec):  # area is a cell here
         subareas_in_cell = [(area.get_key(), area.levelvec, 1)]
@@ -221,23 +222,37 @@ class SpatiallyAdaptiveCellScheme(SpatiallyAdaptivBase):
         #return self.refinement.get_objects()
         return self.refinement.get_new_objects()
 
+    def __call__(self, interpolation_points):
+        """This method evaluates the interpolant of the cell scheme (the sum of the surplus interpolants of all cells)
+        at the specified points. The points are assigned to the cells of each level vector at once using the cell index.
+
+        :param interpolation_points: Points at which we want to evaluate/interpolate.
+        :return: Numpy array with one row per point
+        """
+        points = np.asarray(interpolation_points, dtype=float).reshape(-1, self.dim)
+        result = np.zeros((len(points), self.operation.point_output_length()))
+        areas = set(id(area) for area in self.get_areas())
+        for levelvec, (labels, cells) in self.cell_dict.get_cells_to_points(points).items():
+            order = np.argsort(labels, kind='stable')
+            boundaries = np.searchsorted(labels[order], np.arange(len(cells) + 1))
+            for label, cell in enumerate(cells):
+                indices = order[boundaries[label]:boundaries[label + 1]]
+                if len(indices) == 0 or id(cell) not in areas:
+                    continue
+                for parent_cell, coefficient in self.get_relevant_parents_of_cell(cell):
+                    corner_points_grid = [[parent_cell.start[d], parent_cell.end[d]] for d in range(self.dim)]
+                    result[indices] += coefficient * self.operation.interpolate_points(self.operation.get_mesh_values(corner_points_grid), corner_points_grid, points[indices])
+        return result
+
     # returns all cells that contain the defined point (if it is on a edge it is still inside cell)
     def get_cells_to_point(self, point):
         return self.get_children_with_point(self.rootCell, point)
 
-    #returns all children of current cell including itself that contain the defined point
+    #returns all children of current cell including itself that contain the defined point and the level vector of the
+    #coarsest of these cells that has the point as a corner
     def get_children_with_point(self, cell, point):
-        #print("cell:", cell.get_key(),"children:", cell.children)
-        cell_list = set()
-        cell_list.add(tuple((cell.get_key(), tuple(cell.levelvec))))
-        if cell.is_corner(point):
-            levelvec = cell.levelvec
-        else:
-            levelvec = None
-        for child in cell.children:
-            if child.contains(point):
-                cell_list_new, levelvecNew = self.get_children_with_point(child, point)
-                cell_list = cell_list | cell_list_new
-                if levelvec is None or (levelvecNew is not None and levelvecNew <= levelvec):
-                    levelvec = levelvecNew
+        cells = [c for c in self.cell_dict.get_cells_to_point(point) if np.all(c.levelvec >= cell.levelvec) and cell.contains(c.start) and cell.contains(c.end)]
+        cell_list = set(tuple((c.get_key(), tuple(c.levelvec))) for c in cells)
+        corner_cells = [c for c in cells if c.is_corner(point)]
+        levelvec = min(corner_cells, key=lambda c: sum(c.levelvec)).levelvec if corner_cells else None
         return cell_list, levelvec
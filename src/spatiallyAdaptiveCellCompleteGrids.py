@@ -53,13 +53,13 @@ class SpatiallyAdaptivCellSchemeGrid(SpatiallyAdaptivBase):
         return fig
 
     def initialize_refinement(self):
-        RefinementObjectCell.cell_dict = {}
+        self.cell_dict = CellIndex(self.a, self.b)
         CombiScheme.initialized_adaptive(self.dim, self.lmin[0], self.lmax[0])
         CombiScheme.dim = self.dim
         CombiScheme.lmin = self.lmin[0]
         assert self.lmin == self.lmax
         #CombiScheme.init_adaptive_combi_scheme(self.dim, self.lmax, self.lmin)
-        self.rootCell = RefinementObjectCell(np.array(self.a), np.array(self.b), np.zeros(self.dim), self.a, self.b, self.lmin)
+        self.rootCell = RefinementObjectCell(np.array(self.a), np.array(self.b), np.zeros(self.dim), self.a, self.b, self.lmin, cell_dict=self.cell_dict)
         initial_objects = [self.rootCell]
         for d in range(self.dim):
             for l in range(self.lmin[d]):
@@ -106,7 +106,7 @@ class SpatiallyAdaptivCellSchemeGrid(SpatiallyAdaptivBase):
             #print(area.get_key(), parentcell, coefficient)
             if coefficient != 0:
                 sub_integral = self.integrate_subcell_with_interpolation(parentcell, area.get_key())
-                RefinementObjectCell.cell_dict[area.get_key()].sub_integrals.append((sub_integral, coefficient))
+                self.cell_dict[area.get_key()].sub_integrals.append((sub_integral, coefficient))
                 #integral += sub_integral * coefficient
                 #print(self.integrate_subcell_with_interpolation(area.get_key(), subcell) * coefficient)
                 #evaluations += 2**self.dim
@@ -240,18 +240,11 @@ class SpatiallyAdaptivCellSchemeGrid(SpatiallyAdaptivBase):
     def get_cells_to_point(self, point):
         return self.get_children_with_point(self.rootCell, point)
 
+    #returns all children of current cell including itself that contain the defined point and the level vector of the
+    #coarsest of these cells that has the point as a corner
     def get_children_with_point(self, cell, point):
-        #print("cell:", cell.get_key(),"children:", cell.children)
-        cell_list = set()
-        cell_list.add(tuple((cell.get_key(), tuple(cell.levelvec))))
-        if cell.is_corner(point):
-            levelvec = cell.levelvec
-        else:
-            levelvec = None
-        for child in cell.children:
-            if child.contains(point):
-                cell_list_new, levelvecNew = self.get_children_with_point(child, point)
-                cell_list = cell_list | cell_list_new
-                if levelvec is None or (levelvecNew is not None and levelvecNew <= levelvec):
-                    levelvec = levelvecNew
+        cells = [c for c in self.cell_dict.get_cells_to_point(point) if np.all(c.levelvec >= cell.levelvec) and cell.contains(c.start) and cell.contains(c.end)]
+        cell_list = set(tuple((c.get_key(), tuple(c.levelvec))) for c in cells)
+        corner_cells = [c for c in cells if c.is_corner(point)]
+        levelvec = min(corner_cells, key=lambda c: sum(c.levelvec)).levelvec if corner_cells else None
         return cell_list, levelvec
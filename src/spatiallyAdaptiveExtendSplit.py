@@ -20,49 +20,90 @@ class SpatiallyAdaptiveExtendScheme(SpatiallyAdaptivBase):
         self.margin = 0.9
 
     def interpolate_points(self, interpolation_points, component_grid):
-        point_assignements = self.get_points_assignement_to_areas(interpolation_points)
-        dict_point_interpolation_values = {}
+        return self.interpolate_points_in_areas(interpolation_points, component_grid, 0)
+
+    def interpolate_points_derivative(self, interpolation_points, component_grid, derivative):
+        return self.interpolate_points_in_areas(interpolation_points, component_grid, derivative)
+
+    def interpolate_points_in_areas(self, interpolation_points, component_grid, derivative):
+        """This method evaluates the interpolant of the component grid (derivative=0) or its partial derivatives of the
+        given order at the points. The points are assigned to the areas and each area is interpolated separately.
+
+        :param interpolation_points: Points at which we want to evaluate/interpolate.
+        :param component_grid: ComponentGridInfo of the specified component grid.
+        :param derivative: Order of the partial derivatives (0: interpolation, 1: gradient, 2: diagonal of the Hessian).
+        :return: Array of shape (number of points, output length) for derivative=0 and
+                 (number of points, output length, dim) otherwise.
+        """
+        interpolation_points = np.asarray(interpolation_points, dtype=float).reshape(-1, self.dim)
+        labels, areas = self.get_area_labels(interpolation_points)
+        assert np.all(labels >= 0), "Interpolation points have to lie inside the domain"
         f_value_array_length = self.operation.point_output_length()
-        for area, contained_points in point_assignements:
+        final_integrals = np.zeros((len(interpolation_points),f_value_array_length) + ((self.dim,) if derivative > 0 else ()))
+        # sort the points by area so that the points of each area form a contiguous range
+        order = np.argsort(labels, kind='stable')
+        boundaries = np.searchsorted(labels[order], np.arange(len(areas) + 1))
+        for label, area in enumerate(areas):
+            indices = order[boundaries[label]:boundaries[label + 1]]
+            contained_points = interpolation_points[indices]
             coarsened_levelvector, do_compute  = self.coarsen_grid(component_grid.levelvector, area)
             if do_compute:
                 # check if dedicated interpolation routine is present in grid
                 interpolation_op = getattr(self.grid, "interpolate", None)
                 if callable(interpolation_op):
                     self.grid.setCurrentArea(start=area.start, end=area.end, levelvec=coarsened_levelvector)
-                    interpolated_values = self.grid.interpolate(contained_points, area.start, area.end, coarsened_levelvector)
+                    interpolation_op = [self.grid.interpolate, self.grid.gradient, self.grid.hessian_diag][derivative]
+                    interpolated_values = interpolation_op(contained_points, area.start, area.end, coarsened_levelvector)
                 else:
                     # call default d-linear interpolation based on points in grid
                     # Attention: This only works if we interpolate in between the grid points -> extrapolation not supported
                     self.grid.setCurrentArea(start=area.start, end=area.end, levelvec=coarsened_levelvector)
-                    interpolated_values = self.operation.interpolate_points(self.operation.get_component_grid_values(component_grid, self.grid.coordinate_array), self.grid.coordinate_array, contained_points)
-                for p, value in zip(contained_points, interpolated_values):
-                    dict_point_interpolation_values[tuple(p)] = value
-            else:
-                for p in contained_points:
-                    dict_point_interpolation_values[tuple(p)] = np.zeros(f_value_array_length)
-
-        final_integrals = np.zeros((len(interpolation_points),f_value_array_length))
-        for i, p in enumerate(interpolation_points):
-            final_integrals[i] = dict_point_interpolation_values[tuple(p)]
+                    values = self.operation.get_component_grid_values(component_grid, self.grid.coordinate_array)
+                    if derivative == 0:
+                        interpolated_values = self.operation.interpolate_points(values, self.grid.coordinate_array, contained_points)
+                    else:
+                        interpolator = self.operation.get_interpolator(values, self.grid.coordinate_array)
+                        interpolated_values = [interpolator.gradient, interpolator.hessian_diag][derivative - 1](contained_points)
+                final_integrals[indices] = interpolated_values
         return final_integrals
 
     def get_points_assignement_to_areas(self, points):
-        #print(points)
-        return self.get_points_in_areas_recursive(self.root_cell, points)
-
-    def get_points_in_areas_recursive(self, area, points):
-        if area.children != []:
-            point_assignements = []
-            for sub_area in area.children:
-                contained_points = sub_area.subset_of_contained_points(points)
-                point_assignements.extend(self.get_points_in_areas_recursive(sub_area, contained_points))
-                points = set(points) - set(contained_points)
-                if len(points) == 0:
+        """This method assigns the points to the leaf areas of the refinement tree.
+
+        :param points: Points that should be assigned.
+        :return: List of tuples (area, contained points) for all leaf areas that contain points.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, self.dim)
+        labels, areas = self.get_area_labels(points)
+        return [(area, points[labels == label]) for label, area in enumerate(areas)]
+
+    def get_area_labels(self, points):
+        """This method assigns the points to the leaf areas of the refinement tree. All points are moved down the tree at
+        once; in each node they are split among the children with array masks. Points on a common boundary of
+        several children belong to the first of these children.
+
+        :param points: Array of shape (number of points, dim).
+        :return: Integer array with the index of the area of each point (-1 if the point is not in the domain) and the
+                 list of leaf areas that contain points.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, self.dim)
+        labels = np.full(len(points), -1, dtype=int)
+        areas = []
+        self.assign_points_to_areas_recursive(self.root_cell, points, np.arange(len(points)), labels, areas)
+        return labels, areas
+
+    def assign_points_to_areas_recursive(self, area, points, indices, labels, areas):
+        if area.children == []:
+            labels[indices] = len(areas)
+            areas.append(area)
+            return
+        for sub_area in area.children:
+            contained = sub_area.contains_points(points[indices])
+            if np.any(contained):
+                self.assign_points_to_areas_recursive(sub_area, points, indices[contained], labels, areas)
+                indices = indices[~contained]
+                if len(indices) == 0:
                     break
-            return point_assignements
-        else:
-            return [(area, points)]
 
     # draw a visual representation of refinement tree
     def draw_refinement(self, filename=None):
@@ -499,6 +540,24 @@ class SpatiallyAdaptiveExtendScheme(SpatiallyAdaptivBase):
         area.coarseningValue = coarsening_save
         return num_points
 
+    def get_component_grid_signature(self, component_grid):
+        # the coarsening of version 0 depends on the levels stored in the areas; otherwise the interpolant is defined
+        # by the leaf areas and their coarsening
+        if self.version == 0:
+            return None
+        return tuple(component_grid.levelvector), tuple(self.lmax), tuple((tuple(area.start), tuple(area.end), area.coarseningValue) for area in self.refinement.get_objects())
+
+    def get_points_operation_area(self, component_grid, area):
+        # the coarsening of version 0 stores the computed levels in the area so it cannot be planned
+        if self.version == 0 or not self.grid.integrator.supports_value_integration():
+            return None
+        modified_levelvec, do_compute = self.coarsen_grid(component_grid.levelvector, area)
+        key = Integration.get_plan_key(modified_levelvec, area.start, area.end)
+        if not do_compute:
+            return key, []
+        self.grid.setCurrentArea(area.start, area.end, modified_levelvec)
+        return key, self.grid.getPoints()
+
     def evaluate_operation_area(self, component_grid, area, additional_info=None):
         if additional_info is None:
             return super().evaluate_operation_area(component_grid, area)
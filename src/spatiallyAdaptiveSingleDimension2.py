@@ -58,6 +58,30 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
             gridPointCoordsAsStripes, grid_point_levels, children_indices = self.get_point_coord_for_each_dim(component_grid.levelvector)
             return self.operation.interpolate_points(self.operation.get_component_grid_values(component_grid, gridPointCoordsAsStripes), gridPointCoordsAsStripes, interpolation_points)
 
+    def interpolate_points_derivative(self, interpolation_points: Sequence[Tuple[float, ...]], component_grid: ComponentGridInfo, derivative: int) -> Sequence[Sequence[Sequence[float]]]:
+        gridPointCoordsAsStripes, grid_point_levels, children_indices = self.get_point_coord_for_each_dim(component_grid.levelvector)
+        # check if dedicated interpolation routine is present in grid
+        if callable(getattr(self.grid, "gradient", None)):
+            self.grid.set_grid(gridPointCoordsAsStripes, grid_point_levels)
+            if derivative == 1:
+                return self.grid.gradient(interpolation_points, component_grid)
+            return self.grid.hessian_diag(interpolation_points, component_grid)
+        else:
+            # derivatives of the default d-linear interpolation
+            interpolator = self.operation.get_interpolator(self.operation.get_component_grid_values(component_grid, gridPointCoordsAsStripes), gridPointCoordsAsStripes)
+            if derivative == 1:
+                return interpolator.gradient(interpolation_points)
+            return interpolator.hessian_diag(interpolation_points)
+
+    def supports_surrogate_export(self) -> bool:
+        # the component grids are tensor product meshes; grids with a dedicated interpolation routine (basis functions)
+        # are not d-linear
+        return not callable(getattr(self.grid, "interpolate", None))
+
+    def get_component_grid_mesh_and_values(self, component_grid: ComponentGridInfo) -> Tuple[Sequence[Sequence[float]], Sequence[Sequence[float]]]:
+        gridPointCoordsAsStripes, grid_point_levels, children_indices = self.get_point_coord_for_each_dim(component_grid.levelvector)
+        return gridPointCoordsAsStripes, self.operation.get_component_grid_values(component_grid, gridPointCoordsAsStripes)
+
     def interpolate_grid_component(self, grid_coordinates: Sequence[Sequence[float]], component_grid: ComponentGridInfo) -> Sequence[Sequence[float]]:
         # check if dedicated interpolation routine is present in grid
         interpolation_op = getattr(self.grid, "interpolate_grid", None)
@@ -570,6 +594,22 @@ class SpatiallyAdaptiveSingleDimensions2(SpatiallyAdaptivBase):
     def init_evaluation_operation(self, areas):
         self.operation.initialize_evaluation_dimension_wise(areas[0])
 
+    def get_component_grid_signature(self, component_grid: ComponentGridInfo) -> Hashable:
+        # the component grid is the tensor product of the 1D points (and levels) of the refinement in each dimension
+        gridPointCoordsAsStripes, grid_point_levels, _ = self.get_point_coord_for_each_dim(component_grid.levelvector)
+        return tuple(component_grid.levelvector), tuple(tuple(coords) for coords in gridPointCoordsAsStripes), tuple(tuple(levels) for levels in grid_point_levels)
+
+    def supports_parallel_area_evaluation(self) -> bool:
+        # the operation is computed dimension wise and updates the refinement directly
+        return False
+
+    def get_points_operation_area(self, component_grid: ComponentGridInfo, area) -> Tuple[Hashable, Sequence[Tuple[float, ...]]]:
+        if not self.grid.is_global() or not self.grid.integrator.supports_value_integration():
+            return None
+        points, _ = self.get_points_and_weights_component_grid(component_grid.levelvector)
+        # the operation integrates the component grids on the whole domain
+        return Integration.get_plan_key(component_grid.levelvector, self.a, self.b), points
+
     def evaluate_operation_area(self, component_grid:ComponentGridInfo, area, additional_info=None):
         if self.grid.is_global():
             # get 1d coordinates of the grid points that define the grid; they are calculated based on the levelvector
@@ -5,6 +5,7 @@ python3 test_Integration_UQ.py
 python3 test_Integrator.py
 python3 test_RefinementContainer.py
 python3 test_RefinementObject.py
+python3 test_spatiallyAdaptiveCell.py
 python3 test_spatiallyAdaptiveExtendSplit.py
 python3 test_spatiallyAdaptiveSingleDimension2.py
 python3 test_StandardCombi.py
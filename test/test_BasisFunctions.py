@@ -54,6 +54,99 @@ class TestBasisFunctions(unittest.TestCase):
                     if points2[j] < points[max(i - 1, 0)] or points2[j] > points[min(i+1, len(points) - 1)]:
                         self.assertEqual(basis(points2[j]), 0.0)
 
+    def test_vectorized_evaluation(self):
+        # evaluating an array of points has to give the same result as the scalar (recursive) evaluation
+        points = np.linspace(0, 1, 97)
+        for p in [1, 3, 5]:
+            for level in range(1, 6):
+                h = 1.0 / 2**level
+                # not-a-knot knot vector as constructed in GlobalBSplineGrid
+                if level < log2(p + 1):
+                    knots = np.linspace(0, 1, 2**level + 1)
+                else:
+                    knots = np.array([i * h for i in range(-p, 2**level + p + 1) if
+                                      i <= 0 or (p + 1) / 2 <= i <= 2**level - (p + 1) / 2 or i >= 2**level])
+                splines = []
+                for index in range(1, 2**level, 2):
+                    splines.append(HierarchicalNotAKnotBSpline(p, index, level, knots))
+                    splines.append(HierarchicalNotAKnotBSplineModified(p, index, level, knots, 0, 1))
+                for spline in splines:
+                    for function in [spline, spline.get_first_derivative, spline.get_second_derivative]:
+                        values = function(points)
+                        self.assertEqual(np.shape(values), np.shape(points))
+                        for j, point in enumerate(points):
+                            self.assertAlmostEqual(values[j], function(point), places=8)
+            knots = np.linspace(-1, 2, 2 * p + 8)
+            for index in range(len(knots) - p - 1):
+                spline = BSpline(p, index, knots)
+                for function in [spline, spline.get_first_derivative, spline.get_second_derivative]:
+                    values = function(points)
+                    for j, point in enumerate(points):
+                        self.assertAlmostEqual(values[j], function(point), places=8)
+        for n in range(2, 8):
+            knots = np.linspace(0, 1, n)
+            for i in range(n):
+                basis = LagrangeBasisRestricted(p=n - 1, index=i, knots=knots)
+                values = basis(points)
+                for j, point in enumerate(points):
+                    self.assertAlmostEqual(values[j], basis(point))
+
+    def test_barycentric_evaluation(self):
+        points = np.linspace(-0.1, 1.1, 53)
+        for n in range(1, 12):
+            knots = np.linspace(0, 1, n)
+            bases = [LagrangeBasis(p=n - 1, index=i, knots=knots) for i in range(n)]
+            evaluation_matrix = get_lagrange_evaluation_matrix(knots, points)
+            first_derivatives = get_lagrange_evaluation_matrix(knots, points, derivative=1)
+            second_derivatives = get_lagrange_evaluation_matrix(knots, points, derivative=2)
+            # Lagrange polynomials form a partition of unity
+            self.assertTrue(np.allclose(np.sum(evaluation_matrix, axis=1), 1.0))
+            self.assertTrue(np.allclose(np.sum(first_derivatives, axis=1), 0.0))
+            for i, basis in enumerate(bases):
+                # closed form L_i(x) = prod_{k != i} (x - x_k) / (x_i - x_k) in monomial form (which limits the accuracy
+                # of the reference for larger n)
+                polynomial = np.poly1d(np.delete(knots, i), r=True) / np.prod(knots[i] - np.delete(knots, i))
+                self.assertTrue(np.allclose(evaluation_matrix[:, i], polynomial(points), rtol=1e-8, atol=1e-8))
+                self.assertTrue(np.allclose(first_derivatives[:, i], polynomial.deriv(1)(points), rtol=1e-8, atol=1e-8))
+                self.assertTrue(np.allclose(second_derivatives[:, i], polynomial.deriv(2)(points), rtol=1e-7, atol=1e-7))
+                self.assertTrue(np.allclose(basis(points), evaluation_matrix[:, i], rtol=1e-14, atol=1e-14))
+                for j, point in enumerate(points):
+                    self.assertAlmostEqual(evaluation_matrix[j, i], basis(point), places=12)
+                    # scalar derivatives give the same values as the vectorized ones
+                    self.assertTrue(np.isclose(basis.get_first_derivative(point), first_derivatives[j, i], rtol=1e-12, atol=1e-12))
+                    self.assertTrue(np.isclose(basis.get_second_derivative(point), second_derivatives[j, i], rtol=1e-12, atol=1e-12))
+            # the polynomials are exactly 1 at their own knot and 0 at the other knots
+            self.assertTrue(np.array_equal(get_lagrange_evaluation_matrix(knots, knots), np.identity(n)))
+        for n in range(2, 10):
+            knots = np.linspace(0, 1, n + 2)
+            for i in range(1, n + 1):
+                basis = LagrangeBasisRestrictedModified(p=n + 1, index=i, knots=knots, a=0, b=1, level=n)
+                values = basis(points)
+                for j, point in enumerate(points):
+                    self.assertAlmostEqual(values[j], basis(point))
+                if basis.is_left_border and n > 1:
+                    # modified basis has vanishing second derivative at the boundary
+                    self.assertAlmostEqual(basis.get_second_derivative(0.0) / basis.basis2.get_second_derivative(0.0), 0.0, places=6)
+
+    def test_sparse_evaluation_matrix(self):
+        np.random.seed(2)
+        points = np.random.rand(200)
+        for p in [1, 3, 5]:
+            knots = np.linspace(-1, 2, 2 * p + 20)
+            splines = [BSpline(p, index, knots) for index in range(len(knots) - p - 1)]
+            knots_lagrange = np.linspace(0, 1, 9)
+            lagrange_bases = [LagrangeBasisRestricted(p, i, knots_lagrange) for i in range(len(knots_lagrange))]
+            for bases in [splines, lagrange_bases]:
+                matrix = get_basis_evaluation_matrix(bases, points)
+                dense = np.array([[basis(point) for basis in bases] for point in points])
+                self.assertTrue(np.allclose(matrix.toarray(), dense))
+                # only the bases with the point in their support are stored
+                self.assertTrue(matrix.nnz <= len(points) * (p + 1) * 2)
+                for derivative, evaluate in [(1, lambda basis, x: basis.get_first_derivative(x)), (2, lambda basis, x: basis.get_second_derivative(x))]:
+                    matrix = get_basis_evaluation_matrix(bases, points, derivative)
+                    dense = np.array([[evaluate(basis, point) for basis in bases] for point in points])
+                    self.assertTrue(np.allclose(matrix.toarray(), dense))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -52,6 +52,62 @@ class TestHierarchization(unittest.TestCase):
                 for i, p in enumerate(grid_points):
                     factor = abs(f(p)[0] if f(p)[0] != 0 else 1)
                     self.assertAlmostEqual((f(p)[0] - f_values[i][0]) / factor, 0, 11)
+    def test_sparse_hierarchization(self):
+        a = -1
+        b = 2
+        d = 2
+        for p in [1, 3, 5]:
+            grid = GlobalBSplineGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=p)
+            levels = [6, 2]
+            grid_points = [list(np.linspace(a, b, 2 ** levels[i] + 1)) for i in range(d)]
+            grid_levels = [np.zeros(2 ** levels[i] + 1, dtype=int) for i in range(d)]
+            for i in range(d):
+                for l2 in range(1, levels[i] + 1):
+                    offset = 2 ** (levels[i] - l2)
+                    for j in range(offset, len(grid_levels[i]), 2 * offset):
+                        grid_levels[i][j] = l2
+            grid.set_grid(grid_points, grid_levels)
+            hierarchization = HierarchizationLSG(grid)
+            # the matrix of the fine dimension is assembled in sparse format, the coarse one densely
+            matrix = hierarchization.get_basis_matrix(0, grid.numPoints[0])
+            self.assertTrue(issparse(matrix))
+            self.assertFalse(issparse(hierarchization.get_basis_matrix(1, grid.numPoints[1])))
+            dense_matrix = np.array([[grid.get_basis(0, j)(x) for j in range(grid.numPoints[0])] for x in grid_points[0]])
+            self.assertAlmostEqual(np.max(abs(matrix.toarray() - dense_matrix)), 0.0, 14)
+            grid_values = np.random.rand(2, int(np.prod(grid.numPoints)))
+            surplusses = hierarchization(np.array(grid_values), grid.numPoints, grid)
+            # evaluating the surplusses with the tensor product basis has to reproduce the values at the grid points
+            index_list = get_cross_product_range_list(grid.numPoints)
+            for n, index in enumerate(index_list):
+                value = np.zeros(2)
+                for i, basis_index in enumerate(index_list):
+                    value += surplusses[:, i] * np.prod([grid.get_basis(k, basis_index[k])(grid_points[k][index[k]]) for k in range(d)])
+                self.assertAlmostEqual(np.max(abs(value - grid_values[:, n])), 0.0, 9)
+
+    def test_tensor_product_interpolation(self):
+        a = 0
+        b = 1
+        d = 3
+        levels = [3, 1, 2]
+        for p in [1, 3]:
+            grid = GlobalBSplineGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=p)
+            grid_points = [list(np.linspace(a, b, 2 ** levels[i] + 1)) for i in range(d)]
+            grid_levels = [np.zeros(2 ** levels[i] + 1, dtype=int) for i in range(d)]
+            for i in range(d):
+                for l2 in range(1, levels[i] + 1):
+                    offset = 2 ** (levels[i] - l2)
+                    for j in range(offset, len(grid_levels[i]), 2 * offset):
+                        grid_levels[i][j] = l2
+            grid.set_grid(grid_points, grid_levels)
+            grid_values = np.random.rand(2, int(np.prod(grid.numPoints)))
+            grid.surplus_values[tuple(levels)] = HierarchizationLSG(grid)(np.array(grid_values), grid.numPoints, grid)
+            component_grid = ComponentGridInfo(levels, 1)
+            # the interpolant reproduces the values at the grid points (grid-structured and scattered queries)
+            self.assertTrue(np.allclose(grid.interpolate_grid(grid_points, component_grid), grid_values.T))
+            self.assertTrue(np.allclose(grid.interpolate(get_cross_product_list(grid_points), component_grid), grid_values.T))
+            evaluation_grid = [np.random.rand(n) for n in [4, 3, 5]]
+            self.assertTrue(np.allclose(grid.interpolate_grid(evaluation_grid, component_grid),
+                                        grid.interpolate(get_cross_product_list(evaluation_grid), component_grid)))
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
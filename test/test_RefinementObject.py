@@ -135,5 +135,40 @@ class TestRefinementObject(unittest.TestCase):
         self.assertEqual(update, None)
 
 
+    def test_cell_index(self):
+        a = -3
+        b = 6
+        np.random.seed(5)
+        for d in range(2, 4):
+            lmin = [1] * d
+            cell_index = CellIndex(a * np.ones(d), b * np.ones(d))
+            root_cell = RefinementObjectCell(a * np.ones(d), b * np.ones(d), np.zeros(d), a * np.ones(d), b * np.ones(d), lmin, cell_dict=cell_index)
+            cells = [root_cell]
+            for dim in range(d):
+                cells = [child for cell in cells for child in cell.split_cell_arbitrary_dim(dim)]
+            for _ in range(15):
+                active_cells = [cell for cell in cells if cell.isActive()]
+                cells.extend(active_cells[np.random.randint(len(active_cells))].refine()[0])
+            for cell in cell_index.values():
+                self.assertEqual(cell_index.get_cell(*cell.get_index()), cell)
+                self.assertTrue(cell.get_key() in cell_index)
+                self.assertEqual(cell_index[cell.get_key()], cell)
+                start, end = cell_index.get_start_end(*cell.get_index())
+                self.assertTrue(np.allclose(start, cell.start) and np.allclose(end, cell.end))
+            # random points and points on the boundaries of the cells
+            points = np.vstack([np.random.uniform(a, b, (200, d)), get_cross_product_list([np.linspace(a, b, 9) for _ in range(d)])])
+            cells_to_points = cell_index.get_cells_to_points(points)
+            for i, p in enumerate(points):
+                cells_with_point = set(id(cell) for cell in cell_index.values() if cell.contains(p))
+                self.assertEqual(set(id(cell) for cell in cell_index.get_cells_to_point(p)), cells_with_point)
+                for levelvec, (labels, cells_level) in cells_to_points.items():
+                    if labels[i] == -1:
+                        self.assertFalse(any(tuple(cell.levelvec) == levelvec and cell.contains(p) for cell in cell_index.values()))
+                    else:
+                        self.assertEqual(tuple(cells_level[labels[i]].levelvec), levelvec)
+                        self.assertTrue(cells_level[labels[i]].contains(p))
+            self.assertEqual(cell_index.get_cells_to_point(b * np.ones(d) + 1), [])
+
+
 if __name__ == '__main__':
     unittest.main()
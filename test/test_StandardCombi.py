@@ -76,6 +76,405 @@ class TestStandardCombi(unittest.TestCase):
                         self.assertEqual(len(points), np.prod(standardCombi.grid.levelToNumPoints(component_grid.levelvector)))
                         self.assertEqual(standardCombi.get_num_points_component_grid(component_grid.levelvector, False), np.prod(standardCombi.grid.levelToNumPoints(component_grid.levelvector)))
 
+    def test_multilinear_interpolator(self):
+        from scipy.interpolate import interpn
+        np.random.seed(4)
+        for d in range(1, 5):
+            mesh_points_grid = [np.sort(np.random.rand(n)) for n in [5, 3, 4, 2][:d]]
+            values = np.random.rand(int(np.prod([len(mesh_points_1D) for mesh_points_1D in mesh_points_grid])), 3)
+            evaluation_points = [tuple(np.random.uniform(mesh_points_1D[0], mesh_points_1D[-1]) for mesh_points_1D in mesh_points_grid) for _ in range(50)]
+            # mesh points themselves and the boundary of the mesh
+            evaluation_points += get_cross_product_list(mesh_points_grid)
+            interpolator = MultilinearInterpolator(mesh_points_grid, values)
+            interpolated_values = interpolator(evaluation_points)
+            for component in range(3):
+                values_component = values[:, component].reshape([len(mesh_points_1D) for mesh_points_1D in mesh_points_grid])
+                expected = interpn(mesh_points_grid, values_component, evaluation_points, method='linear')
+                self.assertTrue(np.allclose(interpolated_values[:, component], expected))
+            outside_point = [tuple(mesh_points_1D[-1] + 1 for mesh_points_1D in mesh_points_grid)]
+            self.assertRaises(ValueError, interpolator, outside_point)
+
+    def test_parallel_evaluation(self):
+        a = 0
+        b = 1
+        d = 3
+        f = FunctionExpVar()
+        operation = Interpolation(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=None)
+        standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+        standardCombi.set_combi_parameters(1, 4)
+        points = np.random.uniform(a, b, (1000, d))
+        serial_result = standardCombi(points)
+        standardCombi.set_combi_parameters(1, 5)
+        serial_result_finer = standardCombi(points)
+        for chunk_size in [100, 700]:
+            standardCombi.set_combi_parameters(1, 4)
+            standardCombi.set_parallel_evaluation(True, num_processes=2, chunk_size=chunk_size)
+            parallel_result = standardCombi(points)
+            self.assertTrue(np.allclose(parallel_result, serial_result))
+            # the pool is reused and the reduction order is fixed
+            self.assertTrue(np.array_equal(standardCombi(points), parallel_result))
+            # a changed scheme is picked up by a new pool
+            standardCombi.set_combi_parameters(1, 5)
+            self.assertTrue(np.allclose(standardCombi(points), serial_result_finer))
+        standardCombi.close_pool()
+
+    def test_surrogate(self):
+        import tempfile, os
+        a = 0
+        b = 2
+        for d in range(2, 4):
+            f = FunctionLinear([10 * (i+1) for i in range(d)])
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=None)
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            standardCombi.set_combi_parameters(1, 4)
+            points = np.random.uniform(a, b, (200, d))
+            surrogate = standardCombi.export_surrogate()
+            self.assertTrue(np.allclose(surrogate.predict(points), standardCombi(points)))
+            # the surrogate is immutable
+            self.assertRaises(ValueError, surrogate.buffer.__setitem__, 0, 1.0)
+            with tempfile.TemporaryDirectory() as directory:
+                filename = os.path.join(directory, "surrogate.bin")
+                surrogate.save(filename)
+                for mmap in [True, False]:
+                    loaded_surrogate = CombiSurrogate.load(filename, mmap=mmap)
+                    self.assertEqual(loaded_surrogate.levelvectors, surrogate.levelvectors)
+                    self.assertEqual(loaded_surrogate.coefficients, surrogate.coefficients)
+                    self.assertTrue(np.array_equal(loaded_surrogate.predict(points), surrogate.predict(points)))
+                    del loaded_surrogate
+
+    def test_chunked_evaluation(self):
+        import tempfile, os
+        a = 0
+        b = 2
+        d = 3
+        f = FunctionLinear([10 * (i+1) for i in range(d)])
+        operation = Interpolation(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=None)
+        standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+        standardCombi.set_combi_parameters(1, 4)
+        points = np.random.uniform(a, b, (250, d))
+        result = standardCombi(points)
+        for chunk_size in [1, 7, 100, 1000]:
+            chunks = list(standardCombi.evaluate_in_chunks(points, chunk_size=chunk_size))
+            self.assertEqual(len(chunks), -(-len(points) // chunk_size))
+            self.assertTrue(np.allclose(np.vstack(chunks), result))
+            # points can also be streamed from a generator
+            values = standardCombi.evaluate_to_array((tuple(p) for p in points), out=np.zeros(result.shape), chunk_size=chunk_size)
+            self.assertTrue(np.allclose(values, result))
+        grid_coordinates = [np.linspace(a, b, n) for n in [4, 5, 3]]
+        grid_points = get_cross_product_list(grid_coordinates)
+        grid_result = standardCombi(grid_points)
+        with tempfile.TemporaryDirectory() as directory:
+            out = np.memmap(os.path.join(directory, "values.bin"), dtype=float, mode='w+', shape=grid_result.shape)
+            for chunk_size in [1, 4, 7, 15, 16, 1000]:
+                out[:] = 0
+                standardCombi.interpolate_grid(grid_coordinates, out=out, chunk_size=chunk_size)
+                self.assertTrue(np.allclose(out, grid_result))
+            # memory mapped points are evaluated chunk by chunk as well
+            points_file = np.memmap(os.path.join(directory, "points.bin"), dtype=float, mode='w+', shape=(len(grid_points), d))
+            points_file[:] = grid_points
+            self.assertTrue(np.allclose(standardCombi.evaluate_to_array(points_file, chunk_size=9), grid_result))
+            del out, points_file
+
+
+    def test_gradient(self):
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            f = FunctionLinear([10 * (i+1) for i in range(d)])
+            operation = Interpolation(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=None)
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            standardCombi.set_combi_parameters(1, 4)
+            points = np.random.uniform(a + 0.01, b, (100, d))
+            gradient = standardCombi.gradient(points)
+            self.assertEqual(gradient.shape, (100, 1, d))
+            # f is the product of the (scaled) coordinates and linear in each coordinate
+            self.assertTrue(np.allclose(gradient[:, 0, :], np.array([f(p)[0] / p for p in points])))
+            self.assertTrue(np.all(standardCombi.hessian_diag(points) == 0))
+        # compare with finite differences of the (piecewise multilinear) interpolant
+        f = FunctionExpVar()
+        operation = Interpolation(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=None)
+        standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+        standardCombi.set_combi_parameters(1, 4)
+        points = np.random.uniform(a + 0.01, b - 0.01, (100, d))
+        gradient = standardCombi.gradient(points)
+        h = 1e-7
+        for i in range(d):
+            finite_differences = (standardCombi(points + h * np.eye(d)[i]) - standardCombi(points - h * np.eye(d)[i])) / (2 * h)
+            self.assertTrue(np.allclose(gradient[:, :, i], finite_differences, rtol=1e-5, atol=1e-5))
+        self.assertTrue(np.allclose(standardCombi.export_surrogate().gradient(points), gradient))
+
+    def test_parallel_operation(self):
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            f = FunctionExpVar()
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b))
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            scheme, error, integral = standardCombi.perform_operation(1, 5)
+            integral = np.array(integral)
+            num_points = standardCombi.get_total_num_points()
+            standardCombi.set_parallel_operation(True, num_processes=3)
+            tasks = standardCombi.get_operation_tasks(3)
+            # every component grid is in exactly one task and expensive grids are scheduled first
+            self.assertEqual(sorted(i for task in tasks for i in task), list(range(len(scheme))))
+            task_costs = [standardCombi.get_component_grid_cost(scheme[task[0]]) for task in tasks]
+            self.assertEqual(task_costs, sorted(task_costs, reverse=True))
+            for _ in range(2):
+                scheme_parallel, error_parallel, integral_parallel = standardCombi.perform_operation(1, 5)
+                # the partial results are reduced in the order of the scheme -> identical result
+                self.assertTrue(np.array_equal(integral_parallel, integral))
+                self.assertEqual(error_parallel, error)
+                self.assertEqual(standardCombi.get_total_num_points(), num_points)
+        # operation with a dictionary of partial results
+        data = np.random.RandomState(3).rand(50, 2)
+        results = []
+        for do_parallel in [False, True]:
+            operation = DensityEstimation(data, 2, print_output=False)
+            standardCombi = StandardCombi(np.zeros(2), np.ones(2), print_output=False, operation=operation)
+            standardCombi.set_parallel_operation(do_parallel, num_processes=2)
+            standardCombi.perform_operation(1, 3)
+            results.append(operation.get_result())
+        self.assertEqual(results[0].keys(), results[1].keys())
+        for levelvector in results[0]:
+            self.assertTrue(np.array_equal(results[0][levelvector], results[1][levelvector]))
+
+    def test_evaluation_planning(self):
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            results = []
+            for do_plan in [False, True]:
+                f = FunctionExpVar()
+                operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d)
+                standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+                evaluation_plan = standardCombi.plan_operation(1, 5)
+                # the plan predicts the number of model calls without evaluating the model
+                self.assertEqual(operation.get_num_model_calls(evaluation_plan), evaluation_plan.get_num_points())
+                self.assertEqual(operation.get_distinct_points(), 0)
+                self.assertEqual(evaluation_plan.get_num_occurrences(), sum(np.prod(standardCombi.grid.levelToNumPoints(component_grid.levelvector)) for component_grid in standardCombi.scheme))
+                standardCombi.set_evaluation_planning(do_plan)
+                _, _, integral = standardCombi.perform_operation(1, 5)
+                self.assertEqual(operation.get_distinct_points(), evaluation_plan.get_num_points())
+                results.append(integral)
+                # all points are cached now
+                self.assertEqual(operation.get_num_model_calls(standardCombi.get_evaluation_plan()), 0)
+            self.assertTrue(np.array_equal(results[0], results[1]))
+
+    def test_incremental_operation(self):
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            f = FunctionExpVar()
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b))
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            standardCombi.set_incremental_operation()
+            evaluated_grids = []
+            evaluate_levelvec_partial = operation.evaluate_levelvec_partial
+            operation.evaluate_levelvec_partial = lambda component_grid: evaluated_grids.append(tuple(component_grid.levelvector)) or evaluate_levelvec_partial(component_grid)
+            levelvectors = set()
+            for do_parallel in [False, True]:
+                standardCombi.set_parallel_operation(do_parallel, num_processes=2)
+                for lmax in range(2, 6):
+                    scheme, error, integral = standardCombi.perform_operation(1, lmax)
+                    levelvectors.update(tuple(component_grid.levelvector) for component_grid in scheme)
+                    if not do_parallel:
+                        # every component grid is evaluated only once (the workers of the parallel run are not traced)
+                        self.assertEqual(sorted(evaluated_grids), sorted(levelvectors))
+                    f_reference = FunctionExpVar()
+                    operation_reference = Integration(f_reference, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=operation.reference_solution)
+                    standardCombi_reference = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation_reference)
+                    _, error_reference, integral_reference = standardCombi_reference.perform_operation(1, lmax)
+                    self.assertTrue(np.array_equal(integral, integral_reference))
+                    self.assertEqual(error, error_reference)
+                    self.assertEqual(standardCombi.get_total_num_points(), standardCombi_reference.get_total_num_points())
+                    # the stored results do not duplicate the function values of the cache
+                    self.assertTrue(all(len(function_values) == 0 for _, function_values in standardCombi.partial_results.values()))
+                standardCombi.set_incremental_operation()
+                evaluated_grids.clear()
+                levelvectors.clear()
+
+    def test_distributed_operation(self):
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            f = FunctionExpVar()
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b))
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            scheme, error, integral = standardCombi.perform_operation(1, 5)
+            num_points = operation.get_distinct_points()
+            num_ranks = 3
+            partition = standardCombi.get_rank_partition(num_ranks)
+            # every component grid is assigned to exactly one rank and the loads are balanced
+            self.assertEqual(sorted(i for indices in partition for i in indices), list(range(len(scheme))))
+            loads = [sum(standardCombi.get_component_grid_cost(scheme[i]) for i in indices) for indices in partition]
+            self.assertTrue(max(loads) - min(loads) <= max(standardCombi.get_component_grid_cost(component_grid) for component_grid in scheme))
+            standardCombi.set_executor(LocalExecutor(num_ranks))
+            for _ in range(2):
+                scheme_distributed, error_distributed, integral_distributed = standardCombi.perform_operation(1, 5)
+                self.assertEqual(len(scheme_distributed), len(scheme))
+                self.assertTrue(np.allclose(integral_distributed, integral, rtol=1e-14))
+                self.assertAlmostEqual(error_distributed, error, places=12)
+            # the function values are cached on the ranks (shared points are cached on multiple ranks)
+            self.assertEqual(operation.get_distinct_points(), 0)
+            rank_distinct_points = standardCombi.get_rank_distinct_points()
+            self.assertEqual(len(rank_distinct_points), num_ranks)
+            self.assertTrue(all(0 < n <= num_points for n in rank_distinct_points))
+            self.assertTrue(sum(rank_distinct_points) >= num_points)
+            # the distinct points of all ranks are the points of the serial run
+            self.assertEqual(standardCombi.get_total_num_points(distinct_function_evals=True), num_points)
+            standardCombi.set_executor(None)
+            self.assertEqual(standardCombi.get_rank_distinct_points(), [])
+        # operation with a dictionary of partial results
+        data = np.random.RandomState(3).rand(50, 2)
+        results = []
+        for executor in [None, LocalExecutor(2)]:
+            operation = DensityEstimation(data, 2, print_output=False)
+            standardCombi = StandardCombi(np.zeros(2), np.ones(2), print_output=False, operation=operation)
+            standardCombi.set_executor(executor)
+            standardCombi.perform_operation(1, 3)
+            standardCombi.set_executor(None)
+            results.append(operation.get_result())
+        self.assertEqual(results[0].keys(), results[1].keys())
+        for levelvector in results[0]:
+            self.assertTrue(np.array_equal(results[0][levelvector], results[1][levelvector]))
+
+    def test_fault_tolerance(self):
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            f = FunctionExpVar()
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b))
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            _, error_lower_level, _ = standardCombi.perform_operation(1, 4)
+            scheme, error, integral = standardCombi.perform_operation(1, 5)
+            failing_levelvector = tuple(scheme[0].levelvector)
+            standardCombi.set_fault_tolerance(timeout=2)
+            evaluate_levelvec_partial = operation.evaluate_levelvec_partial
+
+            def failing_evaluate_levelvec_partial(component_grid, delay):
+                if tuple(component_grid.levelvector) == failing_levelvector:
+                    if delay:
+                        time.sleep(60)
+                    else:
+                        raise RuntimeError("simulation crashed")
+                return evaluate_levelvec_partial(component_grid)
+
+            # nothing fails -> same result
+            scheme_ft, error_ft, integral_ft = standardCombi.perform_operation(1, 5)
+            self.assertEqual(standardCombi.skipped_component_grids, {})
+            self.assertTrue(np.array_equal(integral_ft, integral))
+            # a crashing grid (serial) and a straggler (parallel)
+            for do_parallel in [False, True]:
+                standardCombi.set_parallel_operation(do_parallel, num_processes=2)
+                operation.evaluate_levelvec_partial = lambda component_grid: failing_evaluate_levelvec_partial(component_grid, do_parallel)
+                start = time.time()
+                scheme_ft, error_ft, integral_ft = standardCombi.perform_operation(1, 5)
+                self.assertTrue(time.time() - start < 30)
+                self.assertEqual(list(standardCombi.skipped_component_grids), [failing_levelvector])
+                self.assertTrue(all(tuple(component_grid.levelvector) != failing_levelvector for component_grid in scheme_ft))
+                self.assertAlmostEqual(sum(component_grid.coefficient for component_grid in scheme_ft), 1.0)
+                # result is the combination of the remaining downward closed index set
+                integral_reference = sum(component_grid.coefficient * operation.integrate_levelvec(component_grid.levelvector) for component_grid in scheme_ft)
+                self.assertTrue(np.allclose(integral_ft, integral_reference, rtol=1e-12))
+                self.assertTrue(error_ft <= error_lower_level)
+            standardCombi.set_parallel_operation(False)
+            # all grids fail -> there is no remaining scheme
+            def crashing_evaluate_levelvec_partial(component_grid):
+                raise RuntimeError("simulation crashed")
+
+            operation.evaluate_levelvec_partial = crashing_evaluate_levelvec_partial
+            self.assertRaises(RuntimeError, standardCombi.perform_operation, 1, 5)
+            self.assertTrue(all(tuple(component_grid.levelvector) in standardCombi.skipped_component_grids for component_grid in scheme))
+            standardCombi.set_fault_tolerance(False)
+            operation.evaluate_levelvec_partial = evaluate_levelvec_partial
+
+    def test_anisotropic_scheme(self):
+        a = -1
+        b = 2
+        for d in range(2, 5):
+            f = FunctionLinear([10 * (i+1) for i in range(d)])
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b))
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            combischeme = CombiScheme(d)
+            # unit weights and equal levels give the standard scheme
+            standard_scheme = combischeme.getCombiScheme(1, 4, do_print=False)
+            weighted_scheme = combischeme.getCombiScheme(1, 4, do_print=False, weights=[1] * d)
+            self.assertEqual(sorted((tuple(g.levelvector), g.coefficient) for g in standard_scheme), sorted((tuple(g.levelvector), g.coefficient) for g in weighted_scheme))
+            for lmin, lmax, weights in [([1] * d, [5] + [2] * (d - 1), None), (1, [4, 2] + [1] * (d - 2), None), ([2] + [1] * (d - 1), 4, None), (1, 5, [1] + [2.5] * (d - 1))]:
+                scheme, error, integral = standardCombi.perform_operation(lmin, lmax, weights=weights)
+                self.assertEqual(standardCombi.lmax, [int(l) for l in np.broadcast_to(lmax, d)])
+                self.assertAlmostEqual(sum(component_grid.coefficient for component_grid in scheme), 1.0)
+                self.assertEqual(len(scheme), combischeme.get_num_grids_scheme(lmin, lmax, weights))
+                standardCombi.check_combi_scheme()
+                self.assertAlmostEqual(error / abs(f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b)), 0.0, 12)
+                # the index set is downward closed and reaches lmax in every dimension
+                index_set = combischeme.get_downward_closure([component_grid.levelvector for component_grid in scheme], standardCombi.lmin)
+                self.assertTrue(index_set.is_downward_closed(standardCombi.lmin))
+                if weights is None:
+                    self.assertEqual(np.max(index_set.get_levelvectors(), axis=0).tolist(), standardCombi.lmax)
+                    # the adaptive scheme can start from the same index set
+                    combischeme_adaptive = CombiScheme(d)
+                    combischeme_adaptive.init_adaptive_combi_scheme(lmax, lmin)
+                    self.assertEqual(set(combischeme_adaptive.get_index_set()), set(index_set))
+                    self.assertEqual(sorted((tuple(g.levelvector), g.coefficient) for g in combischeme_adaptive.getCombiScheme(do_print=False)),
+                                     sorted((tuple(g.levelvector), g.coefficient) for g in scheme))
+            # the weighted scheme only refines the first dimension to the maximum level and needs fewer points
+            standardCombi.set_combi_parameters(1, 5)
+            num_points_standard = standardCombi.get_total_num_points(distinct_function_evals=False)
+            standardCombi.set_combi_parameters(1, 5, weights=[1] + [2.5] * (d - 1))
+            self.assertLess(standardCombi.get_total_num_points(distinct_function_evals=False), num_points_standard)
+
+    def test_save_restore(self):
+        import tempfile, os
+        a = 0
+        b = 1
+        for d in range(2, 4):
+            f = FunctionExpVar()
+            operation = Integration(f, grid=TrapezoidalGrid(np.ones(d)*a, np.ones(d)*b, d), dim=d, reference_solution=f.getAnalyticSolutionIntegral(np.ones(d)*a, np.ones(d)*b))
+            standardCombi = StandardCombi(np.ones(d)*a, np.ones(d)*b, print_output=False, operation=operation)
+            scheme, error, integral = standardCombi.perform_operation(1, 4)
+            f.reset_dictionary()
+            _, _, integral = standardCombi.perform_operation(1, 5)
+            f_dict_keys, old_f_dict_keys = set(f.f_dict), set(f.old_f_dict)
+            points = np.random.rand(50, d) * (b - a) + a
+            with tempfile.TemporaryDirectory() as directory:
+                filename = os.path.join(directory, "combi.npz")
+                standardCombi.save_to_file(filename)
+                self.assertTrue(Checkpoint.is_checkpoint(filename))
+                # the arrays can be read without restoring the object
+                checkpoint = Checkpoint(filename)
+                self.assertEqual(checkpoint.metadata["class"][1], "StandardCombi")
+                self.assertEqual(checkpoint.metadata["lmax"], [5] * d)
+                levelvectors, coefficients = checkpoint.get_scheme()
+                self.assertEqual([tuple(l) for l in levelvectors], [tuple(component_grid.levelvector) for component_grid in standardCombi.scheme])
+                self.assertEqual(list(coefficients), [component_grid.coefficient for component_grid in standardCombi.scheme])
+                cache_points, cache_values = checkpoint.get_function_cache("f")
+                self.assertEqual(len(cache_points), len(f.f_dict))
+                self.assertEqual(len(checkpoint.get_function_cache("f", old=True)[0]), len(f.old_f_dict))
+                self.assertEqual([np.ravel(f(point)).tolist() for point in cache_points[:10]], cache_values[:10].tolist())
+                # restore without caches and load them afterwards
+                standardCombi_restored = checkpoint.restore(load_function_caches=False)
+                self.assertEqual(standardCombi_restored.operation.f.get_f_dict_size(), 0)
+                checkpoint.load_function_caches(standardCombi_restored)
+                checkpoint.close()
+                for standardCombi_restored in [standardCombi_restored, StandardCombi.restore_from_file(filename)]:
+                    f_restored = standardCombi_restored.operation.f
+                    self.assertEqual(set(f_restored.f_dict), f_dict_keys)
+                    self.assertEqual(set(f_restored.old_f_dict), old_f_dict_keys)
+                    self.assertTrue(np.array_equal(standardCombi_restored(points), standardCombi(points)))
+                    # the restored object continues without new function evaluations
+                    _, _, integral_restored = standardCombi_restored.perform_operation(1, 5)
+                    self.assertEqual(set(f_restored.f_dict) | set(f_restored.old_f_dict), f_dict_keys | old_f_dict_keys)
+                    self.assertTrue(np.allclose(integral_restored, integral, rtol=1e-14))
+                # files of older versions (pickled objects) can still be restored
+                if importlib.util.find_spec("dill") is not None:
+                    import dill
+                    filename_pickle = os.path.join(directory, "combi.pickle")
+                    with open(filename_pickle, 'wb') as file:
+                        dill.dump(standardCombi, file)
+                    self.assertFalse(Checkpoint.is_checkpoint(filename_pickle))
+                    self.assertTrue(np.array_equal(StandardCombi.restore_from_file(filename_pickle)(points), standardCombi(points)))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -61,6 +61,56 @@ class TestUtils(unittest.TestCase):
                         self.assertTrue(tuple(other_values) not in sets[d][arrays[d].index(entry[d])])
                         sets[d][arrays[d].index(entry[d])].add(tuple(other_values))
 
+    def test_row_wise_khatri_rao_product(self):
+        np.random.seed(1)
+        num_rows = 20
+        for dim in range(1, 5):
+            sizes = [3 + d for d in range(dim)]
+            factors = []
+            for d in range(dim):
+                factor = np.random.rand(num_rows, sizes[d])
+                factor[factor < 0.5] = 0.0
+                factors.append(factor)
+            product = get_row_wise_khatri_rao_product([csr_matrix(factor) for factor in factors]).toarray()
+            self.assertEqual(np.shape(product), (num_rows, np.prod(sizes)))
+            for i, index in enumerate(get_cross_product_range(sizes)):
+                expected = np.prod([factors[d][:, index[d]] for d in range(dim)], axis=0)
+                self.assertTrue(np.allclose(product[:, i], expected))
+
+    def test_tensor_product_contractions(self):
+        np.random.seed(3)
+        for dim in range(1, 5):
+            sizes = [2 + d for d in range(dim)]
+            num_points = [4, 1, 3, 2][:dim]
+            values = np.random.rand(2, int(np.prod(sizes)))
+            factors = [np.random.rand(num_points[d], sizes[d]) for d in range(dim)]
+            expected = np.zeros((int(np.prod(num_points)), 2))
+            for n, point_index in enumerate(get_cross_product_range(num_points)):
+                for i, index in enumerate(get_cross_product_range(sizes)):
+                    expected[n] += values[:, i] * np.prod([factors[d][point_index[d], index[d]] for d in range(dim)])
+            self.assertTrue(np.allclose(get_mode_n_product(values, factors), expected))
+            self.assertTrue(np.allclose(get_mode_n_product(values, [csr_matrix(factor) for factor in factors]), expected))
+            # scattered evaluation of the same points (small batches to test the batching)
+            scattered_factors = [csr_matrix(np.array([factors[d][point_index[d]] for point_index in get_cross_product_range(num_points)])) for d in range(dim)]
+            self.assertTrue(np.allclose(get_khatri_rao_contraction(scattered_factors, values, max_entries=7), expected))
+
+    def test_grid_blocks(self):
+        grid_coordinates = [np.linspace(0, 1, n) for n in [3, 4, 5]]
+        all_points = get_cross_product_array(grid_coordinates)
+        self.assertTrue(np.array_equal(all_points, np.array(get_cross_product_list(grid_coordinates))))
+        for max_points in [1, 3, 7, 20, 21, 60, 100]:
+            offset_expected = 0
+            for offset, block in get_grid_blocks(grid_coordinates, max_points):
+                block_points = get_cross_product_array(block)
+                self.assertEqual(offset, offset_expected)
+                self.assertLessEqual(len(block_points), max_points)
+                self.assertTrue(np.array_equal(block_points, all_points[offset:offset + len(block_points)]))
+                offset_expected += len(block_points)
+            self.assertEqual(offset_expected, len(all_points))
+        chunks = list(get_point_chunks((tuple(p) for p in all_points), 25))
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 25, 10])
+        self.assertTrue(np.array_equal(np.vstack(chunks), all_points))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -73,6 +73,82 @@ class TestCombiScheme(unittest.TestCase):
                         combi_grids = combi_scheme.getCombiScheme(lmin=l2, lmax=l, do_print=False)
                         self.assertTrue(self.is_downward_closed(combi_scheme, combi_grids, l, l2))
 
+    def test_lazy_enumeration(self):
+        for d in range(1, 7):
+            for values_left in range(1, 8):
+                grids = CombiScheme.getGrids(d, values_left)
+                self.assertEqual(len(grids), CombiScheme.get_num_grids(d, values_left))
+                self.assertTrue(all(min(g) >= 1 and sum(g) == values_left + d - 1 for g in grids))
+                self.assertEqual(len(set(map(tuple, grids))), len(grids))
+                # small blocks enforce the lazy (recursive) generation
+                blocks = list(CombiScheme.get_grids_blocks(d, values_left, block_size=5))
+                self.assertTrue(all(len(block) <= 5 for block in blocks))
+                self.assertEqual(np.concatenate(blocks).tolist() if blocks else [], grids)
+                # closed form number of points of the diagonal
+                num_points_1D = lambda dim, l: 2**l + 1 + dim
+                for lmin in range(3):
+                    expected = sum(np.prod([num_points_1D(dim, l + lmin - 1) for dim, l in enumerate(g)]) for g in grids)
+                    self.assertEqual(CombiScheme.get_num_points_diagonal(d, values_left, lmin, num_points_1D), expected)
+
+    def test_cached_scheme(self):
+        import tempfile, os
+        with tempfile.TemporaryDirectory() as directory:
+            for d in range(2, 5):
+                for lmin, lmax in [(1, 4), (2, 6)]:
+                    expected = CombiScheme(dim=d).getCombiScheme(lmin=lmin, lmax=lmax, do_print=False)
+                    self.assertEqual(len(expected), CombiScheme(dim=d).get_num_grids_scheme(lmin, lmax))
+                    for _ in range(2):
+                        combi_grids = CombiScheme(dim=d, cache_directory=directory).getCombiScheme(lmin=lmin, lmax=lmax, do_print=False)
+                        self.assertTrue(os.path.isfile(os.path.join(directory, "combi_scheme_%d_%d_%d.npz" % (d, lmin, lmax))))
+                        self.assertEqual([(list(g.levelvector), g.coefficient) for g in combi_grids], [(list(g.levelvector), g.coefficient) for g in expected])
+
+    def test_incremental_coefficients(self):
+        np.random.seed(5)
+        for d in range(2, 5):
+            for lmin in [1, 2]:
+                combi_scheme = CombiScheme(dim=d)
+                combi_scheme.init_adaptive_combi_scheme(lmax=lmin + 2, lmin=lmin)
+                for _ in range(20):
+                    combi_grids = combi_scheme.getCombiScheme(do_print=False)
+                    # nothing changed so the cached scheme is returned
+                    self.assertIs(combi_scheme.getCombiScheme(do_print=False), combi_grids)
+                    expected = combi_scheme.get_coefficients_to_index_set(combi_scheme.active_index_set | combi_scheme.old_index_set)
+                    self.assertEqual(sorted((tuple(g.levelvector), g.coefficient) for g in combi_grids),
+                                     sorted((tuple(g.levelvector), g.coefficient) for g in expected))
+                    self.assertEqual(sum(g.coefficient for g in combi_grids), 1)
+                    active_indices = sorted(combi_scheme.get_active_indices())
+                    combi_scheme.update_adaptive_combi(active_indices[np.random.randint(len(active_indices))])
+
+    def test_index_set(self):
+        np.random.seed(7)
+        for d in [2, 5, 20]:
+            levelvectors = np.random.randint(1, 5, size=(300, d))
+            index_set = IndexSet(d, levelvectors[:150])
+            reference = set(map(tuple, levelvectors[:150].tolist()))
+            self.assertEqual(len(index_set), len(reference))
+            self.assertEqual(set(index_set), reference)
+            for levelvec in levelvectors[100:200].tolist():
+                index_set.add(levelvec)
+                reference.add(tuple(levelvec))
+            for levelvec in levelvectors[::7].tolist():
+                index_set.discard(levelvec)
+                reference.discard(tuple(levelvec))
+            self.assertEqual(set(index_set), reference)
+            self.assertEqual(index_set.contains(levelvectors).tolist(), [tuple(l) in reference for l in levelvectors.tolist()])
+            self.assertEqual([tuple(l) in index_set for l in levelvectors.tolist()], [tuple(l) in reference for l in levelvectors.tolist()])
+            forward = [any(tuple(l[:i] + [l[i] + 1] + l[i+1:]) in reference for i in range(d)) for l in levelvectors.tolist()]
+            self.assertEqual(index_set.has_forward_neighbours(levelvectors).tolist(), forward)
+            # level vectors are returned in lexicographic order
+            self.assertEqual(list(map(tuple, index_set.get_levelvectors().tolist())), sorted(reference))
+        combi_scheme = CombiScheme(dim=3)
+        combi_scheme.init_adaptive_combi_scheme(lmax=4, lmin=1)
+        for _ in range(10):
+            combi_scheme.update_adaptive_combi(sorted(combi_scheme.get_active_indices())[0])
+            self.assertTrue(combi_scheme.get_index_set().is_downward_closed(1))
+            active_indices = np.array(sorted(combi_scheme.get_active_indices()))
+            self.assertEqual(combi_scheme.has_forward_neighbours(active_indices).tolist(), [combi_scheme.has_forward_neighbour(l) for l in active_indices.tolist()])
+        self.assertFalse(IndexSet(2, [(1, 1), (1, 3)]).is_downward_closed(1))
+
     def is_downward_closed(self, combi_scheme: CombiScheme, combi_grids: Sequence[ComponentGridInfo], lmax: int, lmin: int) -> bool:
         downward_closed = True
         for component_grid in combi_grids:
@@ -0,0 +1,36 @@
+import unittest
+from sys import path
+
+path.append('../src/')
+from StandardCombi import *
+from Grid import *
+from Function import *
+from spatiallyAdaptiveCell import *
+
+
+class TestSpatiallyAdaptiveCell(unittest.TestCase):
+    def test_convergence_tracking(self):
+        a = 0
+        b = 1
+        d = 2
+        np.random.seed(1)
+        evaluation_points = np.random.rand(50, d)
+        f = FunctionExpVar()
+        operation = Integration(f, grid=TrapezoidalGrid(a * np.ones(d), b * np.ones(d)), dim=d)
+        spatiallyAdaptive = SpatiallyAdaptiveCellScheme(a * np.ones(d), b * np.ones(d), operation=operation)
+        result = spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=2, errorOperator=ErrorCalculatorSurplusCell(), tol=-1,
+                                                           max_evaluations=100, print_output=False, evaluation_points=evaluation_points)
+        # the cell scheme has its own interpolation so the evaluation points are interpolated with the whole scheme
+        real_values = np.asarray([operation.eval_analytic(point) for point in evaluation_points]).reshape(len(evaluation_points), -1)
+        diff = real_values - spatiallyAdaptive(evaluation_points)
+        self.assertEqual(len(result[8]), len(result[6]))
+        self.assertAlmostEqual(result[8][-1], np.linalg.norm(diff, 2), places=12)
+        self.assertAlmostEqual(result[9][-1], np.linalg.norm(diff, np.inf), places=12)
+        self.assertLess(result[8][-1], result[8][0])
+        # the cell interpolants cannot be represented by a single tensor product mesh per component grid
+        self.assertFalse(spatiallyAdaptive.supports_surrogate_export())
+        self.assertRaises(NotImplementedError, spatiallyAdaptive.export_surrogate)
+
+
+if __name__ == '__main__':
+    unittest.main()
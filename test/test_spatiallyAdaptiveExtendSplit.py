@@ -232,5 +232,79 @@ class TestSpatiallyAdaptiveExtendSplit(unittest.TestCase):
                         factor = abs(f(points[i])[0]) if abs(f(points[i])[0]) != 0 else 1
                         self.assertAlmostEqual((value[0] - f(points[i])[0]) / factor, 0.0, places=11)
 
+    def test_area_labels(self):
+        a = -1
+        b = 3
+        d = 2
+        grid = TrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False)
+        f = FunctionLinear([10 * (i + 1) for i in range(d)])
+        operation = Integration(f, grid=grid, dim=d)
+        spatiallyAdaptive = SpatiallyAdaptiveExtendScheme(a * np.ones(d), b * np.ones(d), operation=operation, split_single_dim=False)
+        spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=2, errorOperator=ErrorCalculatorExtendSplit(), tol=-1,
+                                                  max_evaluations=300, print_output=False)
+        # random points and the points of a grid which contains the boundaries of the areas
+        points = np.vstack([np.random.uniform(a, b, (500, d)), get_cross_product_list([np.linspace(a, b, 9) for _ in range(d)])])
+        labels, areas = spatiallyAdaptive.get_area_labels(points)
+        self.assertTrue(np.all(labels >= 0))
+        for i, p in enumerate(points):
+            area = areas[labels[i]]
+            self.assertEqual(area.children, [])
+            self.assertTrue(area.contains(p))
+        self.assertTrue(np.all(spatiallyAdaptive.get_area_labels([[b + 1, a]])[0] == -1))
+        f_values = spatiallyAdaptive(points)
+        for i, value in enumerate(f_values):
+            factor = abs(f(points[i])[0]) if abs(f(points[i])[0]) != 0 else 1
+            self.assertAlmostEqual((value[0] - f(points[i])[0]) / factor, 0.0, places=10)
+        # f is the product of the (scaled) coordinates and linear in each coordinate
+        random_points = points[:500]
+        gradient = spatiallyAdaptive.gradient(random_points)
+        self.assertTrue(np.allclose(gradient[:, 0, :], np.array([f(p)[0] / p for p in random_points])))
+        self.assertTrue(np.allclose(spatiallyAdaptive.hessian_diag(random_points), 0.0))
+
+    def test_evaluation_planning(self):
+        a = 0
+        b = 1
+        d = 2
+        for version in [0, 2]:
+            results = []
+            for do_plan in [False, True]:
+                grid = TrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False)
+                f = FunctionExpVar()
+                operation = Integration(f, grid=grid, dim=d)
+                spatiallyAdaptive = SpatiallyAdaptiveExtendScheme(a * np.ones(d), b * np.ones(d), operation=operation, version=version)
+                spatiallyAdaptive.set_evaluation_planning(do_plan)
+                _, _, _, combiintegral, _, error_array, _, _, _, _ = spatiallyAdaptive.performSpatiallyAdaptiv(
+                    lmin=1, lmax=2, errorOperator=ErrorCalculatorExtendSplit(), tol=-1, max_evaluations=400, print_output=False)
+                results.append((combiintegral, error_array, operation.get_distinct_points()))
+            # planning only changes the order of the model calls (version 0 is not planned at all)
+            self.assertTrue(np.array_equal(results[0][0], results[1][0]))
+            self.assertEqual(results[0][1], results[1][1])
+            self.assertEqual(results[0][2], results[1][2])
+
+    def test_parallel_area_evaluation(self):
+        a = 0
+        b = 1
+        d = 2
+        for version in [0, 2]:
+            results = []
+            for do_parallel in [False, True]:
+                grid = TrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False)
+                f = FunctionExpVar()
+                operation = Integration(f, grid=grid, dim=d)
+                spatiallyAdaptive = SpatiallyAdaptiveExtendScheme(a * np.ones(d), b * np.ones(d), operation=operation, version=version)
+                spatiallyAdaptive.set_parallel_operation(do_parallel, num_processes=3)
+                _, _, _, combiintegral, number_of_evaluations, error_array, num_point_array, _, _, _ = spatiallyAdaptive.performSpatiallyAdaptiv(
+                    lmin=1, lmax=2, errorOperator=ErrorCalculatorExtendSplit(), tol=-1, max_evaluations=400, print_output=False)
+                results.append((combiintegral, number_of_evaluations, error_array, num_point_array, set(f.f_dict) | set(f.old_f_dict),
+                                [(area.value, area.evaluations) for area in spatiallyAdaptive.refinement.get_objects()]))
+            # the partial results are reduced in the order of the serial evaluation
+            self.assertTrue(np.array_equal(results[0][0], results[1][0]))
+            for i in range(1, 5):
+                self.assertEqual(results[0][i], results[1][i])
+            self.assertEqual(len(results[0][5]), len(results[1][5]))
+            for (value, evaluations), (value_parallel, evaluations_parallel) in zip(results[0][5], results[1][5]):
+                self.assertTrue(np.array_equal(value, value_parallel))
+                self.assertEqual(evaluations, evaluations_parallel)
+
 if __name__ == '__main__':
     unittest.main()
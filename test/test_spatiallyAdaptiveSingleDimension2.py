@@ -123,5 +123,210 @@ class TestSpatiallyAdaptiveSingleDimension2(unittest.TestCase):
                         factor = abs(f(points[i])[0]) if abs(f(points[i])[0]) != 0 else 1
                         self.assertAlmostEqual((value[0] - f(points[i])[0]) / factor, 0.0, places=10)
 
+    def test_gradient(self):
+        a = -1
+        b = 6
+        d = 2
+        for grid, f in [(GlobalTrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False), FunctionLinear([10 * (i + 1) for i in range(d)])),
+                        (GlobalLagrangeGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False, p=2), FunctionPolynomial([(i + 1) for i in range(d)], degree=2))]:
+            operation = Integration(f, grid=grid, dim=d, reference_solution=f.getAnalyticSolutionIntegral(a * np.ones(d), b * np.ones(d)))
+            spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+            spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=3, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1,
+                                                      max_evaluations=300, print_output=False)
+            points = np.random.uniform(a, b, (50, d))
+            gradient = spatiallyAdaptive.gradient(points)
+            hessian_diag = spatiallyAdaptive.hessian_diag(points)
+            # the interpolant reproduces f so the derivatives of f are obtained (finite differences are exact up to
+            # rounding for these polynomials)
+            h = 1e-3
+            for i in range(d):
+                shift = h * np.eye(d)[i]
+                f_values = [np.array([f(p)[0] for p in points + k * shift]) for k in [-1, 0, 1]]
+                self.assertTrue(np.allclose(gradient[:, 0, i], (f_values[2] - f_values[0]) / (2 * h), rtol=1e-6))
+                self.assertTrue(np.allclose(hessian_diag[:, 0, i], (f_values[2] - 2 * f_values[1] + f_values[0]) / h**2, rtol=1e-4, atol=1e-4))
+
+    def test_save_restore(self):
+        import tempfile, os
+        a = -1
+        b = 6
+        d = 2
+        f = FunctionLinear([10 * (i + 1) for i in range(d)])
+        operation = Integration(f, grid=GlobalTrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False), dim=d, reference_solution=f.getAnalyticSolutionIntegral(a * np.ones(d), b * np.ones(d)))
+        spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+        spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=3, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1,
+                                                  max_evaluations=300, print_output=False)
+        points = np.random.uniform(a, b, (50, d))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "combi.npz")
+            spatiallyAdaptive.save_to_file(filename)
+            checkpoint = Checkpoint(filename)
+            self.assertEqual(checkpoint.metadata["num_refinement_containers"], d)
+            # one row per refinement object of each dimension
+            for k in range(d):
+                refinement_objects = spatiallyAdaptive.refinement.get_refinement_container_for_dim(k).get_objects()
+                refinement_arrays = checkpoint.get_refinement_arrays(k)
+                self.assertEqual(refinement_arrays["starts"].tolist(), [refinement_object.start for refinement_object in refinement_objects])
+                self.assertEqual(refinement_arrays["ends"].tolist(), [refinement_object.end for refinement_object in refinement_objects])
+                self.assertEqual(refinement_arrays["levels"].tolist(), [list(refinement_object.levels) for refinement_object in refinement_objects])
+            checkpoint.close()
+            spatiallyAdaptive_restored = StandardCombi.restore_from_file(filename)
+            self.assertEqual(type(spatiallyAdaptive_restored), SpatiallyAdaptiveSingleDimensions2)
+            self.assertTrue(np.array_equal(spatiallyAdaptive_restored(points), spatiallyAdaptive(points)))
+            self.assertEqual(spatiallyAdaptive_restored.operation.f.f_dict.keys(), f.f_dict.keys())
+            # the attributes of the refinement objects are restored from the columns
+            for k in range(d):
+                refinement_objects = spatiallyAdaptive.refinement.get_refinement_container_for_dim(k).get_objects()
+                refinement_objects_restored = spatiallyAdaptive_restored.refinement.get_refinement_container_for_dim(k).get_objects()
+                for refinement_object, refinement_object_restored in zip(refinement_objects, refinement_objects_restored):
+                    for attribute_name in ["start", "end", "levels", "coarsening_level", "evaluations", "value"]:
+                        self.assertEqual(type(getattr(refinement_object_restored, attribute_name)), type(getattr(refinement_object, attribute_name)))
+                        self.assertTrue(np.array_equal(getattr(refinement_object_restored, attribute_name), getattr(refinement_object, attribute_name)))
+            # transient caches are not stored
+            self.assertEqual(spatiallyAdaptive_restored.interpolators, {})
+            self.assertIsNone(spatiallyAdaptive_restored.operation.evaluation_plan)
+
+    def test_surrogate(self):
+        a = -1
+        b = 6
+        d = 2
+        f = FunctionLinear([10 * (i + 1) for i in range(d)])
+        operation = Integration(f, grid=GlobalTrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False), dim=d)
+        spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+        spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=3, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1,
+                                                  max_evaluations=300, print_output=False)
+        self.assertTrue(spatiallyAdaptive.supports_surrogate_export())
+        points = np.random.uniform(a, b, (100, d))
+        self.assertTrue(np.allclose(spatiallyAdaptive.export_surrogate().predict(points), spatiallyAdaptive(points)))
+        # grids with basis functions are not interpolated d-linearly
+        operation = Integration(f, grid=GlobalBSplineGrid(a * np.ones(d), b * np.ones(d), p=3), dim=d)
+        spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+        self.assertFalse(spatiallyAdaptive.supports_surrogate_export())
+        self.assertRaises(NotImplementedError, spatiallyAdaptive.export_surrogate)
+
+    def test_evaluation_planning(self):
+        a = -1
+        b = 6
+        d = 2
+        f = FunctionPolynomial([10 * (i + 1) for i in range(d)], degree=2)
+        for grid_type in [GlobalTrapezoidalGrid, GlobalLagrangeGrid]:
+            results = []
+            for do_plan in [False, True]:
+                grid = grid_type(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False)
+                f.reset_dictionary()
+                operation = Integration(f, grid=grid, dim=d)
+                spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+                spatiallyAdaptive.set_evaluation_planning(do_plan)
+                _, _, _, combiintegral, _, error_array, _, _, _, _ = spatiallyAdaptive.performSpatiallyAdaptiv(
+                    lmin=1, lmax=2, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1, max_evaluations=200, print_output=False)
+                results.append((combiintegral, error_array, operation.get_distinct_points()))
+            # the planned values are integrated by the integrator of the grid so the results do not change
+            self.assertTrue(np.allclose(results[0][0], results[1][0], rtol=1e-14))
+            self.assertTrue(np.allclose(results[0][1], results[1][1], rtol=1e-12, atol=1e-12))
+            self.assertEqual(results[0][2], results[1][2])
+
+    def test_checkpoint_resume(self):
+        import tempfile, os
+        a = 0
+        b = 1
+        d = 2
+        results = []
+        for interrupt in [False, True]:
+            f = FunctionExpVar()
+            operation = Integration(f, grid=GlobalTrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False), dim=d, reference_solution=f.getAnalyticSolutionIntegral(a * np.ones(d), b * np.ones(d)))
+            spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+            if not interrupt:
+                result = spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=2, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1,
+                                                                   max_evaluations=400, print_output=False)
+                results.append((spatiallyAdaptive, result))
+                continue
+            with tempfile.TemporaryDirectory() as directory:
+                filename = os.path.join(directory, "refinement.npz")
+                spatiallyAdaptive.set_checkpointing(filename, every_iterations=1, num_checkpoints=2)
+                refine = SpatiallyAdaptivBase.refine
+                num_refinements = [0]
+
+                def crashing_refine(self):
+                    num_refinements[0] += 1
+                    if num_refinements[0] == 4:
+                        raise RuntimeError("crash")
+                    refine(self)
+
+                # the run crashes in the fourth refinement step
+                SpatiallyAdaptiveSingleDimensions2.refine = crashing_refine
+                try:
+                    with self.assertRaises(RuntimeError):
+                        spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=2, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1,
+                                                                  max_evaluations=400, print_output=False)
+                finally:
+                    del SpatiallyAdaptiveSingleDimensions2.refine
+                self.assertEqual(sorted(os.listdir(directory)), ["refinement.npz", "refinement.npz.1"])
+                # a missing latest checkpoint falls back to the older one
+                os.rename(filename, filename + ".2")
+                spatiallyAdaptive_resumed, result = SpatiallyAdaptivBase.resume_from_checkpoint(filename)
+                self.assertEqual(spatiallyAdaptive_resumed.num_refinement_iterations, results[0][0].num_refinement_iterations)
+                # a latest checkpoint with a newer format version is rejected and the older one is used
+                Checkpoint.format_version += 1
+                try:
+                    Checkpoint.save(spatiallyAdaptive, filename)
+                finally:
+                    Checkpoint.format_version -= 1
+                self.assertRaises(ValueError, Checkpoint, filename)
+                spatiallyAdaptive_resumed, result = SpatiallyAdaptivBase.resume_from_checkpoint(filename)
+                self.assertEqual(spatiallyAdaptive_resumed.num_refinement_iterations, results[0][0].num_refinement_iterations)
+                os.replace(filename + ".2", filename)
+                spatiallyAdaptive_resumed, result = SpatiallyAdaptivBase.resume_from_checkpoint(filename)
+                results.append((spatiallyAdaptive_resumed, result))
+                with self.assertRaises(FileNotFoundError):
+                    SpatiallyAdaptivBase.resume_from_checkpoint(os.path.join(directory, "missing.npz"))
+        # the resumed run continues exactly where it stopped
+        (spatiallyAdaptive, result), (spatiallyAdaptive_resumed, result_resumed) = results
+        self.assertEqual(result_resumed[3], result[3])
+        self.assertEqual(result_resumed[4], result[4])
+        self.assertEqual(result_resumed[5], result[5])
+        self.assertEqual(result_resumed[6], result[6])
+        self.assertEqual(spatiallyAdaptive_resumed.refinements, spatiallyAdaptive.refinements)
+        self.assertEqual([(tuple(g.levelvector), g.coefficient) for g in result_resumed[1]], [(tuple(g.levelvector), g.coefficient) for g in result[1]])
+        self.assertEqual(set(spatiallyAdaptive_resumed.operation.f.f_dict) | set(spatiallyAdaptive_resumed.operation.f.old_f_dict),
+                         set(spatiallyAdaptive.operation.f.f_dict) | set(spatiallyAdaptive.operation.f.old_f_dict))
+
+    def test_convergence_tracking(self):
+        a = 0
+        b = 1
+        d = 2
+        evaluation_points = np.random.rand(200, d)
+        results = []
+        for do_incremental in [True, False]:
+            f = FunctionExpVar()
+            operation = Integration(f, grid=GlobalTrapezoidalGrid(a * np.ones(d), b * np.ones(d), boundary=True, modified_basis=False), dim=d)
+            spatiallyAdaptive = SpatiallyAdaptiveSingleDimensions2(a * np.ones(d), b * np.ones(d), version=3, operation=operation)
+            num_calls = {"eval_analytic": 0, "interpolate_points": 0}
+            eval_analytic = operation.eval_analytic
+            interpolate_points = spatiallyAdaptive.interpolate_points
+
+            def counting_eval_analytic(coordinate):
+                num_calls["eval_analytic"] += 1
+                return eval_analytic(coordinate)
+
+            def counting_interpolate_points(interpolation_points, component_grid):
+                num_calls["interpolate_points"] += 1
+                return interpolate_points(interpolation_points, component_grid)
+
+            operation.eval_analytic = counting_eval_analytic
+            spatiallyAdaptive.interpolate_points = counting_interpolate_points
+            if not do_incremental:
+                # every component grid is interpolated again in every iteration
+                spatiallyAdaptive.get_component_grid_signature = lambda component_grid: None
+            result = spatiallyAdaptive.performSpatiallyAdaptiv(lmin=1, lmax=2, errorOperator=ErrorCalculatorSingleDimVolumeGuided(), tol=-1,
+                                                               max_evaluations=1000, print_output=False, evaluation_points=evaluation_points)
+            # the exact values are computed once
+            self.assertEqual(num_calls["eval_analytic"], len(evaluation_points))
+            self.assertTrue(np.allclose(spatiallyAdaptive.evaluation_interpolation, spatiallyAdaptive(evaluation_points), rtol=1e-12, atol=1e-14))
+            results.append((result, num_calls["interpolate_points"]))
+        (result, num_interpolations), (result_full, num_interpolations_full) = results
+        self.assertLess(num_interpolations, num_interpolations_full)
+        self.assertEqual(result[6], result_full[6])
+        self.assertTrue(np.allclose(result[8], result_full[8], rtol=1e-12))
+        self.assertTrue(np.allclose(result[9], result_full[9], rtol=1e-12))
+
 if __name__ == '__main__':
     unittest.main()